@@ -0,0 +1,68 @@
+"""
+Benchmark: monthly totals by category computed from get_all() in Python
+vs aggregate() (GROUP BY in SQLite, one pass in MemoryRepository,
+columns without objects in ColumnarRepository).
+
+Run from the project root:
+    python -m benchmarks.bench_aggregate [number_of_rows]
+"""
+import os
+import sys
+import tempfile
+from time import perf_counter
+from typing import Any, Callable
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.columnar_repository import ColumnarRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Between
+from bookkeeper.repository.raw_sqlite_repository import RawSQLiteRepository
+
+N_ROWS = 300_000
+WHERE = {'expense_date': Between('2023-01-01', '2023-12-31')}
+
+
+def timed(func: Callable[[], Any]) -> tuple[Any, float]:
+    """ Run func once, return result and time in seconds """
+    start = perf_counter()
+    result = func()
+    return result, perf_counter() - start
+
+
+def totals_in_python(repo: AbstractRepository[Expense]) -> list[tuple[Any, ...]]:
+    """ The way totals were computed before aggregate() """
+    sums: dict[tuple[int, str], float] = {}
+    for exp in repo.get_all(WHERE):
+        key = (exp.category, exp.expense_date[:7])
+        sums[key] = sums.get(key, 0.0) + exp.amount
+    return [(*key, total) for key, total in sorted(sums.items())]
+
+
+def main() -> None:
+    """ Run benchmark and print timings """
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else N_ROWS
+    RawSQLiteRepository.bind_database(os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    repos: dict[str, AbstractRepository[Expense]] = {
+        'RawSQLiteRepository': RawSQLiteRepository[Expense](Expense, 'Expense'),
+        'MemoryRepository': MemoryRepository[Expense](),
+        'ColumnarRepository': ColumnarRepository[Expense](Expense),
+    }
+    for repo in repos.values():
+        repo.add_many(Expense(amount=float(i % 1000), category=i % 20,
+                              expense_date=f'{2020 + i % 4}-{1 + i % 12:02}'
+                                           f'-{1 + i % 28:02}')
+                      for i in range(n_rows))
+
+    print(f'{n_rows} expenses, sums by category and month of 2023')
+    print(f'{"":>20} {"get_all + python, s":>20} {"aggregate, s":>13}')
+    for name, repo in repos.items():
+        expected, python_time = timed(lambda: totals_in_python(repo))
+        rows, aggregate_time = timed(lambda: repo.aggregate(
+            'amount', ['category', 'expense_date:month'], WHERE))
+        assert rows == expected
+        print(f'{name:>20} {python_time:20.3f} {aggregate_time:13.3f}')
+
+
+if __name__ == '__main__':
+    main()
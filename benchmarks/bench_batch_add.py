@@ -0,0 +1,47 @@
+"""
+Benchmark: per-row cost of SQLiteRepository.add vs SQLiteRepository.add_many
+
+Run from the project root:
+    python -m benchmarks.bench_batch_add
+"""
+import os
+import tempfile
+from time import perf_counter
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+SIZES = [100, 1_000, 10_000]
+
+
+def make_expenses(n: int) -> list[Expense]:
+    """ Create n unsaved expenses """
+    return [Expense(amount=float(i % 1000), category=i % 10, comment=f'#{i}')
+            for i in range(n)]
+
+
+def main() -> None:
+    """ Run benchmark and print per-row timings """
+    db_file = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    SQLiteRepository.bind_database(db_file)
+    repo = SQLiteRepository[Expense](Expense, Expense.__name__)
+
+    print(f'{"rows":>8} {"add, us/row":>14} {"add_many, us/row":>18} {"speed-up":>10}')
+    for n in SIZES:
+        objs = make_expenses(n)
+        start = perf_counter()
+        for obj in objs:
+            repo.add(obj)
+        single = (perf_counter() - start) / n
+
+        objs = make_expenses(n)
+        start = perf_counter()
+        repo.add_many(objs)
+        batch = (perf_counter() - start) / n
+
+        print(f'{n:>8} {single * 1e6:>14.1f} {batch * 1e6:>18.1f} '
+              f'{single / batch:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark: memory and aggregation speed of ColumnarRepository vs
+MemoryRepository holding Expense objects. Aggregates of columns are
+timed with numpy (if it is installed) and with the python fallback.
+
+Run from the project root:
+    python -m benchmarks.bench_columnar [number_of_rows]
+"""
+import gc
+import sys
+import tracemalloc
+from time import perf_counter
+from typing import Any, Callable
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository import columnar_repository
+from bookkeeper.repository.columnar_repository import ColumnarRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Between
+
+N_ROWS = 1_000_000
+
+
+def expenses(start: int, stop: int) -> list[Expense]:
+    """ Test expenses, dates and comments repeat like in a real ledger """
+    return [Expense(amount=float(i % 1000), category=i % 20, comment=f'#{i % 500}',
+                    expense_date=f'{2000 + i % 24}-{1 + i % 12:02}-{1 + i % 28:02}')
+            for i in range(start, stop)]
+
+
+def measure(build: Callable[[], Any]) -> tuple[Any, float]:
+    """ Build repository, return it and allocated memory in MB """
+    gc.collect()
+    tracemalloc.start()
+    repo = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return repo, size / 2 ** 20
+
+
+def timed(func: Callable[[], Any]) -> float:
+    """ Run func once, return time in seconds """
+    start = perf_counter()
+    func()
+    return perf_counter() - start
+
+
+def main() -> None:
+    """ Run benchmark and print results """
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else N_ROWS
+
+    def build_memory() -> MemoryRepository[Expense]:
+        repo = MemoryRepository[Expense]()
+        repo.add_many(expenses(0, n_rows))
+        return repo
+
+    def build_columnar() -> ColumnarRepository[Expense]:
+        repo = ColumnarRepository[Expense](Expense)
+        for start in range(0, n_rows, 100_000):  # do not hold all objects at once
+            repo.add_many(expenses(start, min(start + 100_000, n_rows)))
+        return repo
+
+    memory, memory_mb = measure(build_memory)
+    columnar, columnar_mb = measure(build_columnar)
+    print(f'memory for {n_rows} expenses: objects {memory_mb:.1f} MB, '
+          f'columns {columnar_mb:.1f} MB ({memory_mb / columnar_mb:.1f}x less)')
+
+    period = {'expense_date': Between('2010-01-01', '2010-12-31')}
+
+    def objects_total() -> float:
+        return sum(e.amount for e in memory.get_all())
+
+    def objects_sum_by() -> dict[int, float]:
+        sums: dict[int, float] = {}
+        for e in memory.get_all(period):
+            sums[e.category] = sums.get(e.category, 0) + e.amount
+        return sums
+
+    numpy = columnar_repository.np
+
+    def without_numpy(func: Callable[[], Any]) -> Any:
+        columnar_repository.np = None
+        try:
+            return func()
+        finally:
+            columnar_repository.np = numpy
+
+    print(f'{"aggregate":>26} {"objects, s":>11} {"columns, s":>11} '
+          f'{"numpy, s":>11}')
+    for name, by_objects, by_columns in [
+            ('total amount', objects_total, lambda: columnar.total('amount')),
+            ('sum by category, 1 year', objects_sum_by,
+             lambda: columnar.sum_by('amount', 'category', period))]:
+        assert by_objects() == by_columns() == without_numpy(by_columns)
+        python_time = without_numpy(lambda func=by_columns: timed(func))
+        numpy_time = f'{timed(by_columns):11.3f}' if numpy is not None else f'{"-":>11}'
+        print(f'{name:>26} {timed(by_objects):11.3f} {python_time:11.3f} {numpy_time}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark: SQLiteRepository.get_all with a multi-field condition,
+the whole condition compiled to SQL vs the former implementation which
+sent only the first condition to SQLite and filtered the rest in Python.
+
+Run from the project root:
+    python -m benchmarks.bench_get_all_where
+"""
+import os
+import tempfile
+from time import perf_counter
+from typing import Any
+
+from pony import orm
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+N_ROWS = 100_000
+REPEAT = 20
+
+
+@orm.db_session
+def legacy_get_all(repo: SQLiteRepository[Expense],
+                   where: dict[str, Any]) -> list[Expense]:
+    """ get_all as it was before the whole condition went to SQL """
+    attr1, value1 = list(where.items())[0]
+    db_objs_lst = orm.select(p for p in repo.table_cls
+                             if getattr(p, attr1) == value1)[:]
+    db_objs_lst = [p for p in db_objs_lst
+                   if all(getattr(p, attr) == value for (attr, value) in where.items())]
+    return [repo.data_cls(**db_obj.get_data()) for db_obj in db_objs_lst]
+
+
+def main() -> None:
+    """ Run benchmark and print timings """
+    db_file = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    SQLiteRepository.bind_database(db_file)
+    repo = SQLiteRepository[Expense](Expense, Expense.__name__)
+    repo.add_many(Expense(amount=float(i % 100), category=i % 10, comment=f'#{i % 50}')
+                  for i in range(N_ROWS))
+
+    where = {'category': 3, 'amount': 13.0, 'comment': '#13'}
+    assert legacy_get_all(repo, where) == repo.get_all(where)
+
+    for name, func in [('legacy', lambda: legacy_get_all(repo, where)),
+                       ('sql', lambda: repo.get_all(where))]:
+        start = perf_counter()
+        for _ in range(REPEAT):
+            func()
+        print(f'{name:>8}: {(perf_counter() - start) / REPEAT * 1e3:8.2f} ms per query')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: reading the whole expense table newest first with get_all(),
+with OFFSET pages and with iter_all() (keyset pages): time and peak memory.
+
+Run from the project root:
+    python -m benchmarks.bench_iter_all [number_of_rows]
+"""
+import os
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+from typing import Any, Callable, Iterator
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.raw_sqlite_repository import RawSQLiteRepository
+
+N_ROWS = 500_000
+BATCH_SIZE = 1000
+ORDER_BY = ['-expense_date', '-pk']
+
+
+def timed(func: Callable[[], Any]) -> tuple[Any, float]:
+    """ Run func once, return result and time in seconds """
+    start = perf_counter()
+    result = func()
+    return result, perf_counter() - start
+
+
+def offset_pages(repo: RawSQLiteRepository[Expense]) -> Iterator[Expense]:
+    """ The way pages were read before iter_all() """
+    offset = 0
+    while True:
+        page = repo.get_all(order_by=ORDER_BY, limit=BATCH_SIZE, offset=offset)
+        yield from page
+        if len(page) < BATCH_SIZE:
+            return
+        offset += BATCH_SIZE
+
+
+def consume(objs: Any) -> tuple[int, float]:
+    """ Go through objects, return their number and total amount """
+    n_objs, total = 0, 0.0
+    for obj in objs:
+        n_objs += 1
+        total += obj.amount
+    return n_objs, total
+
+
+def main() -> None:
+    """ Run benchmark and print timings """
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else N_ROWS
+    RawSQLiteRepository.bind_database(os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    repo = RawSQLiteRepository[Expense](Expense, 'Expense')
+    repo.add_many(Expense(amount=float(i % 1000), category=i % 20, comment=f'#{i % 500}',
+                          expense_date=f'{2000 + i % 24}-{1 + i % 12:02}-{1 + i % 28:02}')
+                  for i in range(n_rows))
+
+    print(f'{n_rows} expenses, order by {ORDER_BY}, pages of {BATCH_SIZE}')
+    print(f'{"":>20} {"time, s":>8} {"peak, MiB":>10}')
+    variants: dict[str, Callable[[], Any]] = {
+        'get_all': lambda: repo.get_all(order_by=ORDER_BY),
+        'OFFSET pages': lambda: offset_pages(repo),
+        'iter_all': lambda: repo.iter_all(order_by=ORDER_BY, batch_size=BATCH_SIZE),
+    }
+    expected = None
+    for name, make in variants.items():
+        tracemalloc.start()
+        # pylint: disable-next=cell-var-from-loop
+        result, elapsed = timed(lambda: consume(make()))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert expected is None or result == expected
+        expected = result
+        print(f'{name:>20} {elapsed:8.2f} {peak / 2 ** 20:10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: latency of JournalRepository.add while the dataset grows
+(with background compaction), and durable group commit throughput.
+
+Run from the project root:
+    python -m benchmarks.bench_journal [number_of_rows]
+"""
+import os
+import sys
+import tempfile
+import threading
+from statistics import quantiles
+from time import perf_counter
+from typing import Any, Callable
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.journal_repository import JournalRepository
+
+N_ROWS = 500_000
+N_BUCKETS = 5
+
+
+def timed(func: Callable[[], Any]) -> tuple[Any, float]:
+    """ Run func once, return result and time in seconds """
+    start = perf_counter()
+    result = func()
+    return result, perf_counter() - start
+
+
+def expense(i: int) -> Expense:
+    """ i-th test expense """
+    return Expense(amount=float(i % 1000), category=i % 20, comment=f'#{i % 500}',
+                   expense_date=f'{2000 + i % 24}-{1 + i % 12:02}-{1 + i % 28:02}')
+
+
+def main() -> None:
+    """ Run benchmark and print timings """
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else N_ROWS
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'expenses.log')
+
+    print(f'{"rows":>16} {"p50, us":>8} {"p99, us":>8} {"max, ms":>8}')
+    with JournalRepository[Expense](path, Expense, compact_size=8 * 2 ** 20) as repo:
+        bucket = n_rows // N_BUCKETS
+        for start in range(0, n_rows, bucket):
+            latencies = []
+            for i in range(start, start + bucket):
+                obj = expense(i)
+                t = perf_counter()
+                repo.add(obj)
+                latencies.append(perf_counter() - t)
+            percentiles = quantiles(latencies, n=100)
+            print(f'{start:>7}-{start + bucket:<8} {percentiles[49] * 1e6:8.1f} '
+                  f'{percentiles[98] * 1e6:8.1f} {max(latencies) * 1e3:8.2f}')
+    _, open_time = timed(lambda: JournalRepository[Expense](path, Expense).close())
+    print(f'reopen (snapshot + log replay): {open_time:.2f} s')
+
+    durable_path = os.path.join(directory, 'durable.log')
+    n_threads, n_adds = 8, 200
+    with JournalRepository[Expense](durable_path, Expense, durable=True) as repo:
+        def writer() -> None:
+            for i in range(n_adds):
+                repo.add(expense(i))
+
+        threads = [threading.Thread(target=writer) for _ in range(n_threads)]
+        start_time = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = perf_counter() - start_time
+    print(f'durable adds from {n_threads} threads: '
+          f'{n_threads * n_adds / elapsed:.0f} adds/s (group commit)')
+
+
+if __name__ == '__main__':
+    main()
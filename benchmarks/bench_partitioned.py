@@ -0,0 +1,63 @@
+"""
+Benchmark: current-period queries over 10 years of expenses in one table
+(RawSQLiteRepository) vs year partitions (PartitionedRepository).
+
+Run from the project root:
+    python -m benchmarks.bench_partitioned [number_of_rows]
+"""
+import os
+import sys
+import tempfile
+from time import perf_counter
+from typing import Any, Callable
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.partitioned_repository import PartitionedRepository
+from bookkeeper.repository.query import Between, Prefix
+from bookkeeper.repository.raw_sqlite_repository import RawSQLiteRepository
+
+N_ROWS = 1_000_000
+N_REPEATS = 20
+
+
+def timed(func: Callable[[], Any], repeats: int = N_REPEATS) -> float:
+    """ Mean time of func in milliseconds """
+    start = perf_counter()
+    for _ in range(repeats):
+        func()
+    return (perf_counter() - start) / repeats * 1e3
+
+
+def main() -> None:
+    """ Run benchmark and print timings """
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else N_ROWS
+    RawSQLiteRepository.bind_database(os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    plain = RawSQLiteRepository[Expense](Expense, 'Expense')
+    partitioned = PartitionedRepository[Expense](Expense, 'Expense')
+    for repo in (plain, partitioned):
+        repo.add_many(Expense(amount=float(i % 1000), category=i % 20,
+                              comment=f'#{i % 500}',
+                              expense_date=f'{2014 + i * 10 // n_rows}-'
+                                           f'{1 + i % 12:02}-{1 + i % 28:02}')
+                      for i in range(n_rows))
+    print(f'{n_rows} expenses over 10 years, '
+          f'partitions: {list(partitioned.partitions())}')
+
+    queries = {
+        'month, date range': lambda repo: repo.get_all(
+            {'expense_date': Between('2023-05-01', '2023-05-31')}),
+        'year, category': lambda repo: repo.get_all(
+            {'expense_date': Prefix('2023'), 'category': 3}),
+        'latest page of 50': lambda repo: repo.get_all(
+            order_by=['-expense_date', '-pk'], limit=50),
+        'category, all years': lambda repo: repo.get_all({'category': 3}, limit=1000),
+    }
+    print(f'{"query":>20} {"one table, ms":>14} {"partitioned, ms":>16}')
+    for name, query in queries.items():
+        assert query(plain) == [*query(partitioned)], name
+        print(f'{name:>20} {timed(lambda: query(plain)):14.2f} '
+              f'{timed(lambda: query(partitioned)):16.2f}')
+
+
+if __name__ == '__main__':
+    main()
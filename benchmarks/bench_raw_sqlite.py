@@ -0,0 +1,117 @@
+"""
+Benchmark: RawSQLiteRepository (stdlib sqlite3 connection pool) vs
+SQLiteRepository (pony connections and transactions, rows converted by
+the row codec) vs pony entities, the way SQLiteRepository read and
+wrote rows before the row codecs, on 1M expenses.
+
+The repositories work with their own database files, so add_many of
+both inserts into an empty table. Rows added by entities to the pony
+database are rolled back.
+
+Run from the project root:
+    python -m benchmarks.bench_raw_sqlite [number_of_rows]
+"""
+import os
+import sys
+import tempfile
+from time import perf_counter
+from typing import Any, Callable
+
+from pony import orm
+
+import bookkeeper.repository.databases as my_dbs
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.query import Between
+from bookkeeper.repository.raw_sqlite_repository import RawSQLiteRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+N_ROWS = 1_000_000
+N_GET = 10_000
+
+
+def timed(func: Callable[[], Any]) -> float:
+    """ Run func once, return time in seconds """
+    start = perf_counter()
+    func()
+    return perf_counter() - start
+
+
+class PonyEntities:
+    """ Expenses read and written through pony entities """
+
+    @orm.db_session
+    def add_many(self, objs: list[Expense]) -> None:
+        """
+        Insert objects by creating entities. The transaction is rolled
+        back, the table stays empty for SQLiteRepository.
+        """
+        for obj in objs:
+            my_dbs.Expense(amount=obj.amount, category=obj.category,
+                           expense_date=obj.expense_date, comment=obj.comment)
+        orm.flush()
+        orm.rollback()
+
+    @orm.db_session
+    def get(self, pk: int) -> Expense:
+        """ Object by pk """
+        return Expense(**my_dbs.Expense[pk].get_data())
+
+    @orm.db_session
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: list[str] | None = None,
+                limit: int | None = None, offset: int = 0) -> list[Expense]:
+        """ Objects of the queries of the benchmark """
+        query = orm.select(e for e in my_dbs.Expense)
+        if where:
+            low, high = where['expense_date'].params()
+            query = query.filter(
+                lambda e: e.expense_date >= low and e.expense_date <= high)
+        if order_by:
+            query = query.order_by(lambda e: (orm.desc(e.expense_date), orm.desc(e.pk)))
+        else:
+            query = query.order_by(lambda e: e.pk)
+        entities = query[offset:offset + limit] if limit is not None else query[:]
+        return [Expense(**e.get_data()) for e in entities]
+
+
+def main() -> None:
+    """ Run benchmark and print timings """
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else N_ROWS
+    db_dir = tempfile.mkdtemp()
+    SQLiteRepository.bind_database(os.path.join(db_dir, 'pony.db'))
+    RawSQLiteRepository.bind_database(os.path.join(db_dir, 'raw.db'))
+    engines: dict[str, Any] = {
+        'entities': PonyEntities(),
+        'pony': SQLiteRepository[Expense](Expense, Expense.__name__),
+        'raw': RawSQLiteRepository[Expense](Expense, Expense.__name__),
+    }
+
+    def expenses() -> list[Expense]:
+        return [Expense(amount=float(i % 1000), category=i % 20, comment=f'#{i % 50}',
+                        expense_date=f'{2000 + i % 24}-{1 + i % 12:02}-{1 + i % 28:02}')
+                for i in range(n_rows)]
+
+    print(f'{"operation":>24}' + ''.join(f'{name + ", s":>12}' for name in engines))
+
+    def report(name: str, run: Callable[[Any], Any]) -> None:
+        print(f'{name:>24}' + ''.join(f'{timed(lambda e=engine: run(e)):12.3f}'
+                                      for engine in engines.values()))
+
+    report(f'add_many {n_rows}', lambda e: e.add_many(expenses()))
+
+    first = [e.get_all(limit=1000) for e in engines.values()]
+    assert first[0] == first[1] == first[2]
+    for name, query in [
+            (f'get_all() {n_rows}', {}),
+            ('get_all(date range)', {'where': {'expense_date': Between('2010-01-01',
+                                                                       '2010-12-31')}}),
+            ('get_all(order, limit)', {'order_by': ['-expense_date', '-pk'],
+                                       'limit': 200, 'offset': n_rows // 100})]:
+        report(name, lambda e, query=query: e.get_all(**query))
+
+    pks = range(1, n_rows + 1, max(1, n_rows // N_GET))
+    report(f'get x {len(pks)}', lambda e: [e.get(pk) for pk in pks])
+
+
+if __name__ == '__main__':
+    main()
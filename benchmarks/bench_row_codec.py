@@ -0,0 +1,86 @@
+"""
+Benchmark: converting expenses into sqlite3 rows and back with
+py2sqlite_type_converter and dicts of get_data() vs the precompiled
+RowCodec of the model, and the round trip through SQLiteRepository.
+
+Run from the project root:
+    python -m benchmarks.bench_row_codec [number_of_rows]
+"""
+import os
+import sys
+import tempfile
+from time import perf_counter
+from typing import Any, Callable
+
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.row_codec import RowCodec
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.utils import NONE_2_INT_CHANGER, py2sqlite_type_converter
+
+N_ROWS = 500_000
+
+
+def timed(func: Callable[[], Any]) -> tuple[Any, float]:
+    """ Run func once, return result and time in seconds """
+    start = perf_counter()
+    result = func()
+    return result, perf_counter() - start
+
+
+def encode_by_dispatch(objs: list[Any], fields: list[str]) -> list[list[Any]]:
+    """ The way rows were built before RowCodec """
+    return [[py2sqlite_type_converter(getattr(obj, f)) for f in fields] for obj in objs]
+
+
+def decode_by_dict(data_cls: type, rows: list[Any], fields: list[str],
+                   nullable: set[str]) -> list[Any]:
+    """ The way objects were built before RowCodec: a get_data() dict per row """
+    objs = []
+    for row in rows:
+        data = dict(zip(fields, row))
+        for field in nullable:
+            if data[field] == NONE_2_INT_CHANGER:
+                data[field] = None
+        objs.append(data_cls(**data))
+    return objs
+
+
+def main() -> None:
+    """ Run benchmark and print timings """
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else N_ROWS
+    models: dict[type, list[Any]] = {
+        Expense: [Expense(amount=float(i % 1000), category=i % 20, comment=f'#{i % 500}',
+                          expense_date=f'{2000 + i % 24}-{1 + i % 12:02}-{1 + i % 28:02}')
+                  for i in range(n_rows)],
+        Category: [Category(name=f'c{i}', parent=None if i % 2 else i, pk=i + 1)
+                   for i in range(n_rows)],
+    }
+    print(f'{n_rows} objects')
+    print(f'{"":>20} {"dispatch, s":>12} {"codec, s":>9}')
+    for data_cls, objs in models.items():
+        codec: RowCodec[Any] = RowCodec(data_cls)
+        old_rows, old_encode = timed(lambda: encode_by_dispatch(objs, codec.columns))
+        rows, new_encode = timed(lambda: list(map(codec.encode, objs)))
+        assert [list(row) for row in rows] == old_rows
+        print(f'{data_cls.__name__ + " encode":>20} {old_encode:12.3f} {new_encode:9.3f}')
+
+        full_rows = [[*row, obj.pk] for row, obj in zip(rows, objs)]
+        nullable = {f for f in codec.columns if f == 'parent'}
+        old_objs, old_decode = timed(lambda: decode_by_dict(
+            data_cls, full_rows, codec.fields, nullable))
+        new_objs, new_decode = timed(lambda: list(map(codec.decode, full_rows)))
+        assert old_objs == new_objs == objs
+        print(f'{data_cls.__name__ + " decode":>20} {old_decode:12.3f} {new_decode:9.3f}')
+
+    SQLiteRepository.bind_database(os.path.join(tempfile.mkdtemp(), 'bench.db'))
+    repo = SQLiteRepository[Expense](Expense, Expense.__name__)
+    expenses = [Expense(amount=o.amount, category=o.category, comment=o.comment,
+                        expense_date=o.expense_date) for o in models[Expense]]
+    _, add_time = timed(lambda: repo.add_many(expenses))
+    _, get_time = timed(repo.get_all)
+    print(f'SQLiteRepository: add_many {add_time:.3f} s, get_all {get_time:.3f} s')
+
+
+if __name__ == '__main__':
+    main()
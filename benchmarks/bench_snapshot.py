@@ -0,0 +1,80 @@
+"""
+Benchmark: opening a MemoryRepository snapshot (mmap, lazy rows) vs
+unpickling all objects, for 1M expenses. The last line shows the memory
+the snapshot repository keeps after a full get_all().
+
+Run from the project root:
+    python -m benchmarks.bench_snapshot [number_of_rows]
+"""
+import gc
+import os
+import pickle
+import sys
+import tempfile
+import tracemalloc
+from time import perf_counter
+from typing import Any, Callable
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+
+N_ROWS = 1_000_000
+
+
+def timed(func: Callable[[], Any]) -> tuple[Any, float]:
+    """ Run func once, return result and time in seconds """
+    start = perf_counter()
+    result = func()
+    return result, perf_counter() - start
+
+
+def main() -> None:
+    """ Run benchmark and print timings """
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else N_ROWS
+    directory = tempfile.mkdtemp()
+    snap_path = os.path.join(directory, 'expenses.snap')
+    pickle_path = os.path.join(directory, 'expenses.pickle')
+
+    repo = MemoryRepository[Expense]()
+    repo.add_many(Expense(amount=float(i % 1000), category=i % 20, comment=f'#{i % 500}',
+                          expense_date=f'{2000 + i % 24}-{1 + i % 12:02}-{1 + i % 28:02}')
+                  for i in range(n_rows))
+    _, save_time = timed(lambda: repo.save_snapshot(snap_path))
+    with open(pickle_path, 'wb') as file:
+        pickle.dump(repo.get_all(), file, protocol=pickle.HIGHEST_PROTOCOL)
+    snap_mb = os.path.getsize(snap_path) / 2 ** 20
+    pickle_mb = os.path.getsize(pickle_path) / 2 ** 20
+    print(f'{n_rows} expenses: snapshot {snap_mb:.1f} MB '
+          f'(saved in {save_time:.2f} s), pickle {pickle_mb:.1f} MB')
+
+    def load_pickle() -> MemoryRepository[Expense]:
+        with open(pickle_path, 'rb') as file:
+            objs = pickle.load(file)
+        loaded = MemoryRepository[Expense]()
+        for obj in objs:
+            obj.pk = 0
+        loaded.add_many(objs)
+        return loaded
+
+    pickled, pickle_time = timed(load_pickle)
+    snapshot, snap_time = timed(lambda: MemoryRepository.load_snapshot(snap_path))
+    print(f'{"":>22} {"pickle, s":>10} {"snapshot, s":>12}')
+    print(f'{"open":>22} {pickle_time:10.3f} {snap_time:12.4f}')
+    pks = range(1, n_rows, max(1, n_rows // 1000))
+    print(f'{"1000 x get after open":>22} '
+          f'{timed(lambda: [pickled.get(pk) for pk in pks])[1]:10.3f} '
+          f'{timed(lambda: [snapshot.get(pk) for pk in pks])[1]:12.4f}')
+    print(f'{"get_all() of all rows":>22} {timed(pickled.get_all)[1]:10.3f} '
+          f'{timed(snapshot.get_all)[1]:12.3f}')
+
+    gc.collect()
+    tracemalloc.start()
+    snapshot.get_all()
+    gc.collect()
+    kept = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f'memory kept by the snapshot after get_all(): {kept / 2 ** 20:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: throughput of RawSQLiteRepository with sqlite default settings
+(rollback journal, synchronous FULL) vs the tuned profile (WAL,
+synchronous NORMAL, bigger cache, mmap, memory temp store).
+
+Workloads:
+    single adds -- one transaction per added expense
+    mixed -- one writer thread adding expenses and reader threads
+             querying a date range at the same time; the writer adds
+             expenses after the range, so every read returns the same
+             rows
+
+Every workload is run N_RUNS times, the median is printed.
+
+Run from the project root:
+    python -m benchmarks.bench_sqlite_tuning
+"""
+import os
+import tempfile
+import threading
+from statistics import median
+from time import perf_counter
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.query import Between
+from bookkeeper.repository.raw_sqlite_repository import RawSQLiteRepository
+from bookkeeper.repository.sqlite_connection import NO_TUNING, SQLiteTuning
+
+N_ROWS = 100_000
+N_SINGLE = 2_000
+N_READERS = 3
+DURATION = 3.0
+N_RUNS = 3
+READ_RANGE = Between('2010-06-01', '2010-06-30')
+WRITTEN_DATE = '2030-01-01'  # after all dates of the read range
+
+
+def make_repo(tuning: SQLiteTuning) -> RawSQLiteRepository[Expense]:
+    """ Repository on a new database with N_ROWS expenses """
+    db_filename = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    RawSQLiteRepository.bind_database(db_filename, tuning)
+    repo = RawSQLiteRepository[Expense](Expense, Expense.__name__)
+    repo.add_many(Expense(amount=float(i % 1000), category=i % 20,
+                          expense_date=f'{2000 + i % 24}-{1 + i % 12:02}-{1 + i % 28:02}')
+                  for i in range(N_ROWS))
+    return repo
+
+
+def single_adds(repo: RawSQLiteRepository[Expense]) -> float:
+    """ Added expenses per second, one transaction each """
+    start = perf_counter()
+    for i in range(N_SINGLE):
+        repo.add(Expense(amount=float(i), category=1, expense_date=WRITTEN_DATE))
+    return N_SINGLE / (perf_counter() - start)
+
+
+def mixed(repo: RawSQLiteRepository[Expense]) -> tuple[float, float]:
+    """ Writes and reads per second with concurrent threads """
+    stop = threading.Event()
+    counts = [0] * (N_READERS + 1)
+
+    def writer() -> None:
+        while not stop.is_set():
+            repo.add(Expense(amount=1.0, category=1, expense_date=WRITTEN_DATE))
+            counts[0] += 1
+
+    def reader(i: int) -> None:
+        where = {'expense_date': READ_RANGE}
+        while not stop.is_set():
+            repo.get_all(where)
+            counts[i] += 1
+
+    threads = [threading.Thread(target=writer)] + [
+        threading.Thread(target=reader, args=(i + 1,)) for i in range(N_READERS)]
+    for thread in threads:
+        thread.start()
+    stop.wait(DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return counts[0] / DURATION, sum(counts[1:]) / DURATION
+
+
+def main() -> None:
+    """ Run benchmark and print throughput """
+    print(f'{"profile":>10} {"single adds/s":>14} '
+          f'{"mixed writes/s":>15} {"mixed reads/s":>14}')
+    for name, tuning in [('default', NO_TUNING), ('tuned', SQLiteTuning())]:
+        runs = []
+        for _ in range(N_RUNS):
+            repo = make_repo(tuning)
+            runs.append((single_adds(repo), *mixed(repo)))
+        adds, writes, reads = (median(values) for values in zip(*runs))
+        print(f'{name:>10} {adds:14.0f} {writes:15.0f} {reads:14.0f}')
+
+
+if __name__ == '__main__':
+    main()
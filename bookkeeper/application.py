@@ -10,4 +10,5 @@ if __name__ == '__main__':
     app = QApplication(sys.argv)
     view = PyQtView()
     bookkeeper = Bookkeeper(view, SQLiteRepository)
+    app.aboutToQuit.connect(bookkeeper.close)
     app.exec()
\ No newline at end of file
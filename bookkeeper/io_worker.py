@@ -0,0 +1,120 @@
+""" Background worker running repository operations outside of the GUI thread"""
+import logging
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from PySide6 import QtCore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Task:
+    """ Operation submitted to the worker"""
+    func: Callable[..., Any]
+    args: tuple[Any, ...]
+    callback: Callable[[Any], None] | None
+    on_error: Callable[[Exception], None] | None
+    key: str | None
+    generation: int
+
+
+class RepositoryWorker(QtCore.QObject):
+    """
+    Runs repository operations in one background thread, strictly in the
+    order of submission, so writes are applied in order and reads see all
+    writes submitted before them. Results are passed to callbacks in the
+    thread of the worker object (GUI thread) through a queued Qt signal.
+
+    Operations submitted with a key supersede earlier ones with the same
+    key: a stale operation is skipped if it has not started yet, and its
+    result is dropped otherwise.
+
+    Repository methods open their own pony db_session, so each operation
+    gets a session of the worker thread. Operations must return plain
+    model objects, not ORM entities.
+
+    Exceptions never leave the Qt slot delivering results: errors of
+    operations submitted without on_error go to the on_error handler of
+    the worker (logging by default), exceptions of callbacks are logged.
+    """
+    _done = QtCore.Signal(object, object, object)  # task, result, error
+
+    def __init__(self, parent: QtCore.QObject | None = None,
+                 on_error: Callable[[Exception], None] | None = None) -> None:
+        super().__init__(parent)
+        self.on_error = on_error if on_error is not None else log_error
+        self._queue: queue.Queue[_Task | None] = queue.Queue()
+        self._generations: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._done.connect(self._deliver)
+        self._thread = threading.Thread(target=self._run, name='repository-worker',
+                                        daemon=True)
+        self._thread.start()
+
+    def submit(self, func: Callable[..., Any], *args: Any,
+               callback: Callable[[Any], None] | None = None,
+               on_error: Callable[[Exception], None] | None = None,
+               key: str | None = None) -> None:
+        """
+        Run func(*args) in the worker thread and pass the result to callback
+        (exception to on_error) in the GUI thread.
+        Without on_error exceptions are passed to the handler of the worker.
+        """
+        generation = 0
+        if key is not None:
+            with self._lock:
+                generation = self._generations.get(key, 0) + 1
+                self._generations[key] = generation
+        self._queue.put(_Task(func, args, callback, on_error, key, generation))
+
+    def wait(self) -> None:
+        """ Block until all submitted operations are executed"""
+        self._queue.join()
+
+    def stop(self) -> None:
+        """ Execute submitted operations and stop the thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _is_stale(self, task: _Task) -> bool:
+        if task.key is None:
+            return False
+        with self._lock:
+            return self._generations[task.key] != task.generation
+
+    def _run(self) -> None:
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    return
+                if self._is_stale(task):
+                    continue
+                try:
+                    result = task.func(*task.args)
+                except Exception as error:  # pylint: disable=broad-except
+                    self._done.emit(task, None, error)
+                else:
+                    self._done.emit(task, result, None)
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, task: _Task, result: Any, error: Exception | None) -> None:
+        if self._is_stale(task):
+            return
+        try:
+            if error is not None:
+                (task.on_error or self.on_error)(error)
+            elif task.callback is not None:
+                task.callback(result)
+        except Exception as callback_error:  # pylint: disable=broad-except
+            log_error(callback_error)
+
+
+def log_error(error: Exception) -> None:
+    """ Default handler of errors: log them with the traceback"""
+    logger.error('worker operation failed', exc_info=error)
@@ -2,7 +2,10 @@
 Budget class
 """
 
+from calendar import monthrange
 from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Iterable
 
 
 @dataclass(slots=True)
@@ -25,4 +28,88 @@ class Budget:
         self.period = period
         self.limit = limit
         self.spent = spent
-        self.pk = pk
\ No newline at end of file
+        self.pk = pk
+
+
+class SpentTracker:
+    """
+    Incremental totals of expenses for budget periods.
+    Keeps sum and count of expenses per day, so that day, week and month
+    totals are calculated from at most 38 days without rescanning all
+    expenses. Days before the start of the current week and month can not
+    get into any period again and are dropped when the date changes.
+    """
+
+    def __init__(self) -> None:
+        self._daily: dict[str, tuple[float, int]] = {}
+        self._today = date.today()
+
+    @staticmethod
+    def window_start(today: date) -> date:
+        """ The earliest day counted in budget periods of today """
+        return min(today - timedelta(days=today.weekday()), today.replace(day=1))
+
+    def reset(self, expenses: Iterable[tuple[str, float]],
+              today: date | None = None) -> None:
+        """ Recompute totals from pairs (expense_date, amount) """
+        self._daily = {}
+        self._today = today or date.today()
+        for expense_date, amount in expenses:
+            self.add(expense_date, amount)
+
+    def reset_daily(self, daily: Iterable[tuple[str, float, int]],
+                    today: date | None = None) -> None:
+        """ Recompute totals from daily aggregates (expense_date, sum, count) """
+        self._daily = {}
+        self._today = today or date.today()
+        first_day = self._first_day
+        for expense_date, total, count in daily:
+            if expense_date is not None and expense_date >= first_day:
+                self._daily[expense_date] = (total, count)
+
+    def add(self, expense_date: str, amount: float) -> None:
+        """ Count expense with ISO date """
+        if expense_date < self._first_day:
+            return
+        total, count = self._daily.get(expense_date, (0.0, 0))
+        self._daily[expense_date] = (total + amount, count + 1)
+
+    def remove(self, expense_date: str, amount: float) -> None:
+        """ Discount expense with ISO date """
+        if expense_date not in self._daily:
+            return
+        total, count = self._daily[expense_date]
+        if count <= 1:
+            del self._daily[expense_date]
+        else:
+            self._daily[expense_date] = (total - amount, count - 1)
+
+    def totals(self, today: date | None = None) -> dict[str, float]:
+        """ Spent money for each budget period containing today """
+        today = today or date.today()
+        if today != self._today:
+            self._roll_over(today)
+
+        monday = today - timedelta(days=today.weekday())
+        week = [(monday + timedelta(days=i)).isoformat() for i in range(7)]
+        first = today.replace(day=1)
+        month = [(first + timedelta(days=i)).isoformat()
+                 for i in range(monthrange(today.year, today.month)[1])]
+        return {
+            'День': self._sum([today.isoformat()]),
+            'Неделя': self._sum(week),
+            'Месяц': self._sum(month),
+        }
+
+    @property
+    def _first_day(self) -> str:
+        return self.window_start(self._today).isoformat()
+
+    def _roll_over(self, today: date) -> None:
+        """ Move to a new current date and drop days out of all periods """
+        self._today = today
+        first_day = self._first_day
+        self._daily = {d: v for d, v in self._daily.items() if d >= first_day}
+
+    def _sum(self, days: Iterable[str]) -> float:
+        return round(sum(self._daily.get(d, (0.0, 0))[0] for d in days), 2)
@@ -111,8 +111,14 @@ class Category:
         Список созданных объектов Category
         """
         created: dict[str, Category] = {}
+        batch: list[Category] = []
         for child, parent in tree:
+            if parent is not None and created[parent].pk == 0:
+                # parent is not saved yet, flush the batch to get its pk
+                repo.add_many(batch)
+                batch = []
             cat = cls(child, created[parent].pk if parent is not None else None)
-            repo.add(cat)
+            batch.append(cat)
             created[child] = cat
+        repo.add_many(batch)
         return list(created.values())
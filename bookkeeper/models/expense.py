@@ -3,7 +3,7 @@
 """
 
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import date, datetime
 
 
 @dataclass(slots=True)
@@ -12,14 +12,17 @@ class Expense:
     Расходная операция.
     amount - сумма
     category - id категории расходов
-    expense_date - дата расхода
+    expense_date - дата расхода в формате ISO (YYYY-MM-DD)
     added_date - дата добавления в бд
     comment - комментарий
     pk - id записи в базе данных
+    По полям category и expense_date в базе данных строятся индексы
+    (metadata полей, см. bookkeeper.repository.schema).
     """
     amount: float
-    category: int
-    expense_date: str = datetime.now().strftime("%d-%m-%Y")
+    category: int = field(metadata={'index': True})
+    expense_date: str = field(default_factory=lambda: date.today().isoformat(),
+                              metadata={'index': True})
     added_date: str = datetime.now().strftime("%d-%m-%Y %H:%M")
     comment: str = ''
     pk: int = 0
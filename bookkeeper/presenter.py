@@ -1,43 +1,87 @@
 """ Presenter module. Interacts with models, repositories and views."""
-from datetime import date, datetime, timedelta
-import calendar
+from datetime import date
+from typing import Any
 
+from bookkeeper.io_worker import RepositoryWorker, log_error
 from bookkeeper.view.pyqt6_view import PyQtView
-from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.query import Ge, In
 from bookkeeper.models.category import Category
 from bookkeeper.models.expense import Expense
-from bookkeeper.models.budget import Budget
+from bookkeeper.models.budget import Budget, SpentTracker
+
+
+# expense fields shown in the table, in the order of its columns
+EXPENSE_FIELDS = ('pk', 'expense_date', 'amount', 'category', 'comment')
+
+
+def date_to_view(iso_date: str) -> str:
+    """ Convert stored date YYYY-MM-DD into displayed dd-mm-YYYY """
+    return f'{iso_date[8:10]}-{iso_date[5:7]}-{iso_date[0:4]}'
+
+
+def date_from_view(view_date: str) -> str:
+    """ Convert displayed date dd-mm-YYYY into stored YYYY-MM-DD """
+    return f'{view_date[6:10]}-{view_date[3:5]}-{view_date[0:2]}'
 
 
 class Bookkeeper():
+    """
+    Presenter. Startup data is read synchronously before the main window
+    is shown, after that repository operations run in a background worker
+    and the view is updated from worker callbacks in the GUI thread.
+    Presenter state (category maps, spent totals) is used only in the GUI
+    thread, worker operations work only with repositories.
+    """
     def __init__(self, view: PyQtView, repo_cls: type):
         self.view = view
 
         repo_cls.bind_database('database.db')
         self.cat_repo = repo_cls(Category, Category.__name__)
         self.exp_repo = repo_cls(Expense, Expense.__name__)
-        self.budget_repo = repo_cls(Budget, Budget.__name__)
+        # budget records are read on every change of expenses
+        self.budget_repo = CachedRepository(repo_cls(Budget, Budget.__name__))
+        self.worker = RepositoryWorker(on_error=self.show_error)
+
+        self.spent = SpentTracker()
+        self.recompute_spent()
 
         self.view.register_budget_update_callback(self.budget_update_callback)
         self.add_default_budget()
         self.set_budget_data()
 
+        self.ctg_names: dict[int, str] = {}  # category pk -> name
+        self.ctg_pks: dict[str, int] = {}  # category name -> pk
         self.view.register_category_add_callback(self.category_add_callback)
         self.view.register_category_del_callback(self.category_del_callback)
+        self.load_categories()
         self.add_default_categories()
         self.set_category_data()
 
         self.view.register_expense_add_callback(self.expense_add_callback)
         self.view.register_expense_del_callback(self.expense_del_callback)
         self.view.register_expense_update_callback(self.expense_update_callback)
+        self.view.register_expense_fetch_callback(self.request_expense_page)
         self.set_expense_data()
 
         self.view.window.show()
 
+    def close(self) -> None:
+        """ Finish pending repository operations and stop the worker"""
+        self.worker.stop()
+
+    def show_error(self, error: Exception) -> None:
+        """ Log error of a worker operation and report it in the view"""
+        log_error(error)
+        self.view.show_error(f'Операция не выполнена: {error}')
+
     def set_budget_data(self) -> None:
-        """ Take data from repository and pass it to view"""
-        self.update_budget_spent_column()
-        budget_lst: list[Budget] = self.budget_repo.get_all()
+        """ Store spent money in repository and pass budget to view"""
+        self.worker.submit(self.update_budget_spent_column, self.spent.totals(),
+                           callback=self.show_budget_data, key='budget')
+
+    def show_budget_data(self, budget_lst: list[Budget]) -> None:
+        """ Pass budget records to view"""
         budget_data = [
             [f'{b.pk}', f'{b.period}', f'{b.spent}', f'{b.limit}', f'{b.limit-b.spent}']
             for b in budget_lst
@@ -45,49 +89,41 @@ class Bookkeeper():
 
         self.view.set_budget_data(budget_data)
 
-    def update_budget_spent_column(self) -> None:
-        """ Updates budget spent column based on expenses"""
-        all_expenses: list[Expense] = self.exp_repo.get_all()
-
-        day = date.today().day
-        month = date.today().month
-        year = date.today().year
-        today = datetime(year=year, month=month, day=day)
-
-        spent_day, spent_week, spent_month = 0.0, 0.0, 0.0
-
-        for expense in all_expenses:
-            # day
-            if datetime.strptime(expense.expense_date, "%d-%m-%Y") == today:
-                spent_day += expense.amount
-            # month
-            if (datetime(year=year, month=month, day=1) <= datetime.strptime(expense.expense_date, "%d-%m-%Y")
-                    <= datetime(year=year, month=month, day=calendar.monthrange(year, month)[1])):
-                spent_month += expense.amount
-            # week
-            monday = today - timedelta(days=today.weekday())
-            if (monday <= datetime.strptime(expense.expense_date, "%d-%m-%Y") <= monday + timedelta(days=6)):
-                spent_week += expense.amount
-
-        for spent_prd, prd in zip([spent_day, spent_week, spent_month], ['День', 'Неделя', 'Месяц']):
-            period_record: Budget = self.budget_repo.get_all(where={'period': prd})[0]
+    def recompute_spent(self) -> None:
+        """ Recompute spent money from expenses of current budget periods"""
+        today = date.today()
+        first_day = SpentTracker.window_start(today).isoformat()
+        daily = self.exp_repo.aggregate('amount', by='expense_date:day',
+                                        where={'expense_date': Ge(first_day)},
+                                        functions=('sum', 'count'))
+        self.spent.reset_daily(daily, today)
+
+    def update_budget_spent_column(self, totals: dict[str, float]) -> list[Budget]:
+        """ Updates budget spent column by totals, returns budget records"""
+        budget_lst: list[Budget] = self.budget_repo.get_all()
+        for period_record in budget_lst:
+            spent_prd = totals[period_record.period]
             if period_record.spent != spent_prd:
                 period_record.spent = spent_prd
                 self.budget_repo.update(period_record)
+        return budget_lst
 
     def budget_update_callback(self, pk_str: str, new_limit_str: str) -> None:
         """ Callback for budget update"""
-        record: Budget = self.budget_repo.get(int(pk_str))
-        record.limit = float(new_limit_str)
-        self.budget_repo.update(record)
-
+        self.worker.submit(self.update_budget_limit, int(pk_str), float(new_limit_str))
         self.set_budget_data()
 
+    def update_budget_limit(self, pk: int, limit: float) -> None:
+        """ Set new limit of budget record"""
+        record: Budget = self.budget_repo.get(pk)
+        record.limit = limit
+        self.budget_repo.update(record)
+
     def add_default_budget(self) -> None:
         """ Add default records in repository if it is empty"""
-        if len(self.budget_repo.get_all()) == 0:
+        if not self.budget_repo.exists():
             for period in 'День Неделя Месяц'.split(' '):
-                budget = Budget(period=period, limit=0, spent=0)
+                budget = Budget(period=period, limit=0.0, spent=0.0)
                 self.budget_repo.add(budget)
 
     def add_default_categories(self) -> None:
@@ -109,63 +145,146 @@ class Bookkeeper():
             'Путешествия'
         ]
 
-        if len(self.cat_repo.get_all()) == 0:
-            for ctg in lst:
-                self.category_add_callback(ctg)
+        if not self.cat_repo.exists():
+            ctgs = [Category(name=ctg, parent=None) for ctg in lst]
+            self.cat_repo.add_many(ctgs)
+            for ctg in ctgs:
+                self.remember_category(ctg)
+
+    def request_expense_page(self, offset: int, limit: int) -> None:
+        """ Read a page of expenses in the worker and pass it to view"""
+        self.worker.submit(
+            self.get_expense_page, offset, limit, key='expense_page',
+            callback=lambda page: self.view.append_expense_rows(
+                offset, [self.format_expense_row(*values) for values in page]))
+
+    def get_expense_page(self, offset: int, limit: int) -> list[tuple[Any, ...]]:
+        """ Take a page of expenses, newest first, as EXPENSE_FIELDS values"""
+        page: list[tuple[Any, ...]] = self.exp_repo.get_columns(
+            EXPENSE_FIELDS, order_by=['-expense_date', '-pk'], limit=limit, offset=offset)
+        return page
+
+    def expense_row(self, exp: Expense) -> list[str]:
+        """ Expense in view format"""
+        return self.format_expense_row(exp.pk, exp.expense_date, exp.amount,
+                                       exp.category, exp.comment)
+
+    def format_expense_row(self, pk: int,  # pylint: disable=too-many-arguments
+                           expense_date: str, amount: float,
+                           category: int, comment: str) -> list[str]:
+        """ Values of EXPENSE_FIELDS in view format"""
+        return [f'{pk}', date_to_view(expense_date), f'{amount}',
+                self.ctg_names.get(category, ''), f'{comment}']
+
+    def expense_from_view(self, data: dict[str, str], pk: int = 0) -> Expense:
+        """ Expense from data in view format"""
+        return Expense(amount=float(data['amount']),
+                       category=self.ctg_pks[data['category']],
+                       expense_date=date_from_view(data['expense_date']),
+                       comment=data['comment'],
+                       pk=pk)
 
     def set_expense_data(self) -> None:
-        """ Take data from repository and pass it to view"""
-        exp_lst: list[Expense] = self.exp_repo.get_all()
-        exp_data = [
-            [f'{exp.pk}', exp.expense_date, f'{exp.amount}',
-             # check it is not none
-             f'{self.cat_repo.get(exp.category).name}',
-             f'{exp.comment}']
-            for exp in exp_lst]
-
-        exp_data = sorted(exp_data, key=lambda row: datetime.strptime(
-            row[1], "%d-%m-%Y"), reverse=True)
-
-#        for exp in exp_data:
-#            exp[1] = f'{exp[1].strftime("%d-%m-%Y")}'
-
-        self.view.set_expense_data(exp_data)
+        """ Make view reload expenses from repository page by page"""
+        self.view.reload_expense_data()
         self.set_budget_data()
 
     def expense_add_callback(self, data: dict[str, str]) -> None:
         """ Callback for expense add procedure"""
-        data['category'] = self.cat_repo.get_all(where={'name': data['category']})[0].pk
-        new_exp = Expense(**data)
-        self.exp_repo.add(new_exp)
-        self.set_expense_data()
+        new_exp = self.expense_from_view(data)
+        self.worker.submit(self.exp_repo.add, new_exp,
+                           callback=lambda _: self.on_expense_added(new_exp))
+
+    def on_expense_added(self, new_exp: Expense) -> None:
+        """ Show added expense"""
+        self.spent.add(new_exp.expense_date, new_exp.amount)
+        self.view.add_expense_row(self.expense_row(new_exp))
+        self.set_budget_data()
 
     def expense_update_callback(self, pk: str, data: dict[str, str]) -> None:
         """ Callback for expense update procedure"""
-        data['category'] = self.cat_repo.get_all(where={'name': data['category']})[0].pk
-        upd_exp = Expense(pk=int(pk), **data)
+        upd_exp = self.expense_from_view(data, pk=int(pk))
+        self.worker.submit(
+            self.replace_expense, upd_exp,
+            callback=lambda old_exp: self.on_expense_updated(old_exp, upd_exp))
+
+    def replace_expense(self, upd_exp: Expense) -> Expense | None:
+        """ Update expense, return its previous version"""
+        old_exp: Expense | None = self.exp_repo.get(upd_exp.pk)
         self.exp_repo.update(upd_exp)
-        self.set_expense_data()
+        return old_exp
+
+    def on_expense_updated(self, old_exp: Expense | None, upd_exp: Expense) -> None:
+        """ Show updated expense"""
+        if old_exp is not None:
+            self.spent.remove(old_exp.expense_date, old_exp.amount)
+        self.spent.add(upd_exp.expense_date, upd_exp.amount)
+        self.view.update_expense_row(self.expense_row(upd_exp))
+        self.set_budget_data()
 
     def expense_del_callback(self, del_pk: list[str]) -> None:
         """ Callback for expense delete procedure"""
-        for pk in del_pk:
-            self.exp_repo.delete(int(pk))
-        self.set_expense_data()
+        self.worker.submit(self.delete_expenses, [int(pk) for pk in del_pk],
+                           callback=self.on_expenses_deleted)
+
+    def delete_expenses(self, pks: list[int]) -> list[Expense]:
+        """ Delete expenses, return deleted ones"""
+        old_exps: list[Expense] = self.exp_repo.get_all(where={'pk': In(pks)})
+        self.exp_repo.delete_many(pks)
+        return old_exps
+
+    def on_expenses_deleted(self, old_exps: list[Expense]) -> None:
+        """ Remove deleted expenses from view"""
+        for exp in old_exps:
+            self.spent.remove(exp.expense_date, exp.amount)
+        self.view.remove_expense_rows([f'{exp.pk}' for exp in old_exps])
+        self.set_budget_data()
+
+    def load_categories(self) -> None:
+        """ Read categories from repository into name resolution maps"""
+        self.ctg_names = {}
+        self.ctg_pks = {}
+        for ctg in self.cat_repo.get_all():
+            self.remember_category(ctg)
+
+    def remember_category(self, ctg: Category) -> None:
+        """ Add category to name resolution maps"""
+        self.ctg_names[ctg.pk] = ctg.name
+        self.ctg_pks.setdefault(ctg.name, ctg.pk)
+
+    def forget_category(self, pk: int) -> None:
+        """ Remove category from name resolution maps"""
+        name = self.ctg_names.pop(pk, None)
+        if name is not None and self.ctg_pks.get(name) == pk:
+            del self.ctg_pks[name]
+            # another category with the same name
+            for other_pk, other_name in self.ctg_names.items():
+                if other_name == name:
+                    self.ctg_pks[name] = other_pk
+                    break
 
     def set_category_data(self) -> None:
-        """ Take data from repository and pass it to view"""
-        ctgs_lst: list[Category] = self.cat_repo.get_all()
-        ctg_data = [[f'{ctg.pk}', f'{ctg.name}'] for ctg in ctgs_lst]
+        """ Pass categories to view"""
+        ctg_data = [[f'{pk}', name] for pk, name in self.ctg_names.items()]
         self.view.set_category_data(ctg_data)
 
     def category_add_callback(self, ctg_name: str) -> None:
         """ Callback for category add procedure"""
         ctg = Category(name=ctg_name, parent=None)
-        self.cat_repo.add(ctg)
+        self.worker.submit(self.cat_repo.add, ctg,
+                           callback=lambda _: self.on_category_added(ctg))
 
-        self.set_category_data()
+    def on_category_added(self, ctg: Category) -> None:
+        """ Show added category"""
+        self.remember_category(ctg)
+        self.view.add_category_row([f'{ctg.pk}', ctg.name])
 
     def category_del_callback(self, pk_str: str) -> None:
         """ Callback for category add procedure"""
-        self.cat_repo.delete(int(pk_str))
-        self.set_category_data()
+        self.worker.submit(self.cat_repo.delete, int(pk_str),
+                           callback=lambda _: self.on_category_deleted(pk_str))
+
+    def on_category_deleted(self, pk_str: str) -> None:
+        """ Remove deleted category from view"""
+        self.forget_category(int(pk_str))
+        self.view.remove_category_row(pk_str)
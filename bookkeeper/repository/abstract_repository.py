@@ -8,7 +8,9 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, Protocol, Any
+from typing import Generic, TypeVar, Protocol, Any, Iterable, Iterator, Sequence
+
+from bookkeeper.repository.query import aggregate_objects, project_objects
 
 
 class Model(Protocol):  # pylint: disable=too-few-public-methods
@@ -30,6 +32,17 @@ class AbstractRepository(ABC, Generic[T]):
     get_all
     update
     delete
+
+    Пакетные методы add_many, update_many, delete_many по умолчанию
+    вызывают соответствующие одиночные методы, реализации могут
+    переопределить их более эффективно (например, одной транзакцией).
+    Методы count, exists и aggregate по умолчанию работают с результатом
+    get_all, реализации выполняют их без создания всех объектов
+    (SQL-репозитории - запросами COUNT, EXISTS, GROUP BY).
+    Метод iter_all по умолчанию перебирает результат get_all,
+    SQL-репозитории читают записи страницами. Метод get_columns
+    по умолчанию выбирает поля из объектов get_all, SQL-репозитории
+    читают только нужные столбцы.
     """
 
     @abstractmethod
@@ -44,11 +57,18 @@ class AbstractRepository(ABC, Generic[T]):
         """ Получить объект по id """
 
     @abstractmethod
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | Sequence[str] | None = None,
+                limit: int | None = None, offset: int = 0) -> list[T]:
         """
         Получить все записи по некоторому условию
-        where - условие в виде словаря {'название_поля': значение}
+        where - условие в виде словаря {'название_поля': значение},
+        вместо значения можно передать условие из модуля query
+        (Gt, Lt, Between, In, Prefix и др.)
         если условие не задано (по умолчанию), вернуть все записи
+        order_by - имя поля или список имен полей для сортировки,
+        минус перед именем означает сортировку по убыванию
+        limit, offset - ограничение количества и сдвиг выборки
         """
 
     @abstractmethod
@@ -58,3 +78,68 @@ class AbstractRepository(ABC, Generic[T]):
     @abstractmethod
     def delete(self, pk: int) -> None:
         """ Удалить запись """
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Добавить несколько объектов, вернуть список их id
+        в порядке следования объектов.
+        """
+        return [self.add(obj) for obj in objs]
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """ Обновить данные о нескольких объектах """
+        for obj in objs:
+            self.update(obj)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """ Удалить несколько записей """
+        for pk in pks:
+            self.delete(pk)
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 order_by: str | Sequence[str] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        """
+        Перебрать записи по условию в порядке order_by (как в get_all),
+        не собирая их все в один список. batch_size - количество записей,
+        читаемых из хранилища за один раз.
+        Записи, измененные во время перебора, могут быть пропущены
+        или получены в новой версии.
+        """
+        if batch_size < 1:
+            raise ValueError(f'batch_size must be positive, got {batch_size}')
+        return iter(self.get_all(where, order_by))
+
+    def get_columns(self, fields: Sequence[str],  # pylint: disable=too-many-arguments
+                    where: dict[str, Any] | None = None,
+                    order_by: str | Sequence[str] | None = None,
+                    limit: int | None = None, offset: int = 0) -> list[tuple[Any, ...]]:
+        """
+        Получить значения полей fields записей по условию (как в get_all)
+        в виде кортежей, значения в порядке fields, без создания объектов
+        модели (для отображения таблиц и отчетов)
+        """
+        return project_objects(self.get_all(where, order_by, limit, offset), fields)
+
+    def count(self, where: dict[str, Any] | None = None) -> int:
+        """ Количество записей, удовлетворяющих условию (как в get_all) """
+        return len(self.get_all(where))
+
+    def exists(self, where: dict[str, Any] | None = None) -> bool:
+        """ Есть ли хотя бы одна запись, удовлетворяющая условию """
+        return bool(self.get_all(where, limit=1))
+
+    def aggregate(self, field: str, by: str | Sequence[str] | None = None,
+                  where: dict[str, Any] | None = None,
+                  functions: Sequence[str] = ('sum',)) -> list[tuple[Any, ...]]:
+        """
+        Агрегаты поля field по группам записей, удовлетворяющих условию where
+        by - поле или список полей группировки, для поля с датой в формате ISO
+        можно указать период: 'expense_date:day' (week, month, year),
+        неделя обозначается датой ее понедельника
+        functions - агрегатные функции: sum, count, min, max
+        Вернуть строки (значения полей группировки..., значения функций...)
+        в порядке значений полей группировки. None в поле field не учитываются
+        в sum, min, max, count считает записи.
+        """
+        return aggregate_objects(self.get_all(where), field, by, functions)
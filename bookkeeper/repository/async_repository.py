@@ -0,0 +1,260 @@
+"""
+Asyncio interface of repositories
+
+AsyncAbstractRepository mirrors AbstractRepository with coroutine methods.
+ExecutorRepository adapts any blocking repository (e.g. SQLiteRepository)
+by running its methods in a bounded thread pool, MemoryRepository has
+a native version AsyncMemoryRepository working right in the event loop.
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Generic, Iterable, Sequence, TypeVar
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import (
+    Gt, Lt, aggregate_objects, parse_order_by, project_objects)
+
+R = TypeVar('R')
+
+
+class AsyncAbstractRepository(ABC, Generic[T]):
+    """
+    Asynchronous repository with the contract of AbstractRepository.
+    Batch methods by default await single methods one by one, queries
+    (count, exists, aggregate...) are computed from get_all.
+    """
+
+    @abstractmethod
+    async def add(self, obj: T) -> int:
+        """ Add object, return its pk and write it into obj.pk """
+
+    @abstractmethod
+    async def get(self, pk: int) -> T | None:
+        """ Get object by pk """
+
+    @abstractmethod
+    async def get_all(self, where: dict[str, Any] | None = None,
+                      order_by: str | Sequence[str] | None = None,
+                      limit: int | None = None, offset: int = 0) -> list[T]:
+        """ Get objects matching conditions, see AbstractRepository.get_all """
+
+    @abstractmethod
+    async def update(self, obj: T) -> None:
+        """ Update object, obj.pk must be set """
+
+    @abstractmethod
+    async def delete(self, pk: int) -> None:
+        """ Delete object """
+
+    async def add_many(self, objs: Iterable[T]) -> list[int]:
+        """ Add objects, return their pks in the order of objects """
+        return [await self.add(obj) for obj in objs]
+
+    async def update_many(self, objs: Iterable[T]) -> None:
+        """ Update objects """
+        for obj in objs:
+            await self.update(obj)
+
+    async def delete_many(self, pks: Iterable[int]) -> None:
+        """ Delete objects """
+        for pk in pks:
+            await self.delete(pk)
+
+    async def iter_all(self, where: dict[str, Any] | None = None,
+                       order_by: str | Sequence[str] | None = None,
+                       batch_size: int = 1000) -> AsyncIterator[T]:
+        """
+        Iterate over objects matching conditions,
+        see AbstractRepository.iter_all
+        """
+        if batch_size < 1:
+            raise ValueError(f'batch_size must be positive, got {batch_size}')
+        for obj in await self.get_all(where, order_by):
+            yield obj
+
+    async def get_columns(self,  # pylint: disable=too-many-arguments
+                          fields: Sequence[str],
+                          where: dict[str, Any] | None = None,
+                          order_by: str | Sequence[str] | None = None,
+                          limit: int | None = None,
+                          offset: int = 0) -> list[tuple[Any, ...]]:
+        """ Values of fields of objects as tuples, see AbstractRepository.get_columns """
+        return project_objects(await self.get_all(where, order_by, limit, offset), fields)
+
+    async def count(self, where: dict[str, Any] | None = None) -> int:
+        """ Number of objects matching conditions """
+        return len(await self.get_all(where))
+
+    async def exists(self, where: dict[str, Any] | None = None) -> bool:
+        """ Whether some object matches conditions """
+        return bool(await self.get_all(where, limit=1))
+
+    async def aggregate(self, field: str, by: str | Sequence[str] | None = None,
+                        where: dict[str, Any] | None = None,
+                        functions: Sequence[str] = ('sum',)) -> list[tuple[Any, ...]]:
+        """ Aggregates of field by groups, see AbstractRepository.aggregate """
+        return aggregate_objects(await self.get_all(where), field, by, functions)
+
+
+class ExecutorRepository(AsyncAbstractRepository[T]):
+    """
+    Adapter running a blocking repository in a thread pool of max_workers
+    threads, so concurrent coroutines do not wait for each other's calls
+    and the event loop is never blocked.
+    SQLiteRepository opens a pony db_session per call in the calling thread,
+    pony serializes sqlite write transactions itself.
+    """
+
+    def __init__(self, repo: AbstractRepository[T], max_workers: int = 4) -> None:
+        self.repo = repo
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='repository')
+
+    async def _call(self, func: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def add(self, obj: T) -> int:
+        return await self._call(self.repo.add, obj)
+
+    async def get(self, pk: int) -> T | None:
+        return await self._call(self.repo.get, pk)
+
+    async def get_all(self, where: dict[str, Any] | None = None,
+                      order_by: str | Sequence[str] | None = None,
+                      limit: int | None = None, offset: int = 0) -> list[T]:
+        return await self._call(self.repo.get_all, where, order_by=order_by,
+                                limit=limit, offset=offset)
+
+    async def update(self, obj: T) -> None:
+        await self._call(self.repo.update, obj)
+
+    async def delete(self, pk: int) -> None:
+        await self._call(self.repo.delete, pk)
+
+    async def add_many(self, objs: Iterable[T]) -> list[int]:
+        return await self._call(self.repo.add_many, list(objs))
+
+    async def update_many(self, objs: Iterable[T]) -> None:
+        await self._call(self.repo.update_many, list(objs))
+
+    async def delete_many(self, pks: Iterable[int]) -> None:
+        await self._call(self.repo.delete_many, list(pks))
+
+    async def iter_all(self, where: dict[str, Any] | None = None,
+                       order_by: str | Sequence[str] | None = None,
+                       batch_size: int = 1000) -> AsyncIterator[T]:
+        """
+        Every page of batch_size objects is read by one repo.get_all call
+        in the thread pool, so no repository state is resumed in another
+        thread. Pages ordered by pk start after the last pk of the previous
+        page (keyset pagination), pages of other orders are read by offset.
+        """
+        if batch_size < 1:
+            raise ValueError(f'batch_size must be positive, got {batch_size}')
+        order = parse_order_by(order_by)
+        keyset = order in ((), (('pk', False),), (('pk', True),)) \
+            and 'pk' not in (where or {})
+        page_where, offset = where, 0
+        while True:
+            page: list[T] = await self._call(
+                self.repo.get_all, page_where, order_by=order_by, limit=batch_size,
+                offset=0 if keyset else offset)
+            for obj in page:
+                yield obj
+            if len(page) < batch_size:
+                return
+            offset += batch_size
+            if keyset:
+                after = Lt(page[-1].pk) if order and order[0][1] else Gt(page[-1].pk)
+                page_where = {**(where or {}), 'pk': after}
+
+    async def get_columns(self,  # pylint: disable=too-many-arguments
+                          fields: Sequence[str],
+                          where: dict[str, Any] | None = None,
+                          order_by: str | Sequence[str] | None = None,
+                          limit: int | None = None,
+                          offset: int = 0) -> list[tuple[Any, ...]]:
+        return await self._call(self.repo.get_columns, list(fields), where,
+                                order_by=order_by, limit=limit, offset=offset)
+
+    async def count(self, where: dict[str, Any] | None = None) -> int:
+        return await self._call(self.repo.count, where)
+
+    async def exists(self, where: dict[str, Any] | None = None) -> bool:
+        return await self._call(self.repo.exists, where)
+
+    async def aggregate(self, field: str, by: str | Sequence[str] | None = None,
+                        where: dict[str, Any] | None = None,
+                        functions: Sequence[str] = ('sum',)) -> list[tuple[Any, ...]]:
+        return await self._call(self.repo.aggregate, field, by, where, functions)
+
+    def close(self) -> None:
+        """ Wait for running calls and shut the thread pool down """
+        self._executor.shutdown(wait=True)
+
+
+class AsyncMemoryRepository(AsyncAbstractRepository[T]):
+    """
+    In-memory repository for asyncio. Operations never block, so they run
+    right in the event loop without threads: each call is atomic with
+    respect to other coroutines.
+    """
+
+    def __init__(self, repo: MemoryRepository[T] | None = None) -> None:
+        self.repo: MemoryRepository[T] = repo if repo is not None else MemoryRepository()
+
+    async def add(self, obj: T) -> int:
+        return self.repo.add(obj)
+
+    async def get(self, pk: int) -> T | None:
+        return self.repo.get(pk)
+
+    async def get_all(self, where: dict[str, Any] | None = None,
+                      order_by: str | Sequence[str] | None = None,
+                      limit: int | None = None, offset: int = 0) -> list[T]:
+        return self.repo.get_all(where, order_by=order_by, limit=limit, offset=offset)
+
+    async def update(self, obj: T) -> None:
+        self.repo.update(obj)
+
+    async def delete(self, pk: int) -> None:
+        self.repo.delete(pk)
+
+    async def add_many(self, objs: Iterable[T]) -> list[int]:
+        return self.repo.add_many(objs)
+
+    async def update_many(self, objs: Iterable[T]) -> None:
+        self.repo.update_many(objs)
+
+    async def delete_many(self, pks: Iterable[int]) -> None:
+        self.repo.delete_many(pks)
+
+    async def iter_all(self, where: dict[str, Any] | None = None,
+                       order_by: str | Sequence[str] | None = None,
+                       batch_size: int = 1000) -> AsyncIterator[T]:
+        for obj in self.repo.iter_all(where, order_by, batch_size):
+            yield obj
+
+    async def get_columns(self,  # pylint: disable=too-many-arguments
+                          fields: Sequence[str],
+                          where: dict[str, Any] | None = None,
+                          order_by: str | Sequence[str] | None = None,
+                          limit: int | None = None,
+                          offset: int = 0) -> list[tuple[Any, ...]]:
+        return self.repo.get_columns(fields, where, order_by, limit, offset)
+
+    async def count(self, where: dict[str, Any] | None = None) -> int:
+        return self.repo.count(where)
+
+    async def exists(self, where: dict[str, Any] | None = None) -> bool:
+        return self.repo.exists(where)
+
+    async def aggregate(self, field: str, by: str | Sequence[str] | None = None,
+                        where: dict[str, Any] | None = None,
+                        functions: Sequence[str] = ('sum',)) -> list[tuple[Any, ...]]:
+        return self.repo.aggregate(field, by, where, functions)
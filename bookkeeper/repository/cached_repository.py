@@ -0,0 +1,180 @@
+"""
+Module describes read-through caching wrapper of repositories
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable, Iterable, Iterator, Sequence
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.query import compile_predicate
+
+
+@dataclass
+class _Entry:
+    """ Cached result of get_all """
+    predicate: Callable[[Any], bool]
+    has_offset: bool
+    pks: set[int]
+    objs: list[Any]
+
+
+class CachedRepository(AbstractRepository[T]):
+    """
+    Wrapper of any repository caching reads.
+    get is served by an identity map: the same pk gives the same object,
+    get_all results are kept in a cache of max_queries queries with LRU
+    eviction. Writes go through the wrapper and invalidate only queries
+    the written row can affect: results containing the row and queries
+    the new row matches. Queries with offset are dropped on every update
+    and delete, since a change before the window shifts it. Whether
+    a new row matches a query is checked by compile_predicate, which
+    has the semantics of the SQL compiled for the same conditions
+    (e.g. range conditions never match None).
+    Cached objects are shared with callers, change them only together
+    with update.
+    """
+
+    def __init__(self, repo: AbstractRepository[T], max_queries: int = 128) -> None:
+        self.repo = repo
+        self.max_queries = max_queries
+        self.hits = 0
+        self.misses = 0
+        self._objects: dict[int, T] = {}
+        self._queries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def clear(self) -> None:
+        """ Drop all cached data """
+        with self._lock:
+            self._objects.clear()
+            self._queries.clear()
+
+    def add(self, obj: T) -> int:
+        with self._lock:
+            pk = self.repo.add(obj)
+            self._written(obj)
+            return pk
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        with self._lock:
+            pks = self.repo.add_many(objs)
+            for obj in objs:
+                self._written(obj)
+            return pks
+
+    def get(self, pk: int) -> T | None:
+        with self._lock:
+            obj = self._objects.get(pk)
+            if obj is not None:
+                self.hits += 1
+                return obj
+            self.misses += 1
+            obj = self.repo.get(pk)
+            if obj is not None:
+                self._objects[pk] = obj
+            return obj
+
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | Sequence[str] | None = None,
+                limit: int | None = None, offset: int = 0) -> list[T]:
+        key = _query_key(where, order_by, limit, offset)
+        with self._lock:
+            entry = self._queries.get(key) if key is not None else None
+            if entry is not None:
+                self.hits += 1
+                self._queries.move_to_end(key)
+                return list(entry.objs)
+
+            self.misses += 1
+            objs = [self._objects.setdefault(obj.pk, obj)
+                    for obj in self.repo.get_all(where, order_by=order_by,
+                                                 limit=limit, offset=offset)]
+            if key is not None:
+                self._queries[key] = _Entry(compile_predicate(where), offset > 0,
+                                            {obj.pk for obj in objs}, objs)
+                if len(self._queries) > self.max_queries:
+                    self._queries.popitem(last=False)
+            return list(objs)
+
+    def get_columns(self, fields: Sequence[str],  # pylint: disable=too-many-arguments
+                    where: dict[str, Any] | None = None,
+                    order_by: str | Sequence[str] | None = None,
+                    limit: int | None = None, offset: int = 0) -> list[tuple[Any, ...]]:
+        """ Projections are not cached, they are read by the wrapped repository """
+        return self.repo.get_columns(fields, where, order_by, limit, offset)
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 order_by: str | Sequence[str] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        """ Iteration is not cached, it reads pages of the wrapped repository """
+        return self.repo.iter_all(where, order_by, batch_size)
+
+    def count(self, where: dict[str, Any] | None = None) -> int:
+        return self.repo.count(where)
+
+    def exists(self, where: dict[str, Any] | None = None) -> bool:
+        return self.repo.exists(where)
+
+    def aggregate(self, field: str, by: str | Sequence[str] | None = None,
+                  where: dict[str, Any] | None = None,
+                  functions: Sequence[str] = ('sum',)) -> list[tuple[Any, ...]]:
+        """
+        Counts and aggregates are not cached, they are computed by
+        the wrapped repository
+        """
+        return self.repo.aggregate(field, by, where, functions)
+
+    def update(self, obj: T) -> None:
+        with self._lock:
+            self.repo.update(obj)
+            self._written(obj, changed=True)
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        with self._lock:
+            self.repo.update_many(objs)
+            for obj in objs:
+                self._written(obj, changed=True)
+
+    def delete(self, pk: int) -> None:
+        with self._lock:
+            self.repo.delete(pk)
+            self._deleted(pk)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(pks)
+        with self._lock:
+            self.repo.delete_many(pks)
+            for pk in pks:
+                self._deleted(pk)
+
+    def _written(self, obj: T, changed: bool = False) -> None:
+        """ Invalidate queries affected by added or updated object """
+        self._objects[obj.pk] = obj
+        self._invalidate(lambda entry: (obj.pk in entry.pks or entry.predicate(obj)
+                                        or (changed and entry.has_offset)))
+
+    def _deleted(self, pk: int) -> None:
+        """ Invalidate queries affected by deleted row """
+        self._objects.pop(pk, None)
+        self._invalidate(lambda entry: pk in entry.pks or entry.has_offset)
+
+    def _invalidate(self, affected: Callable[[_Entry], bool]) -> None:
+        for key in [key for key, entry in self._queries.items() if affected(entry)]:
+            del self._queries[key]
+
+
+def _query_key(where: dict[str, Any] | None, order_by: str | Sequence[str] | None,
+               limit: int | None, offset: int) -> Hashable | None:
+    """ Hashable key of a query, None if the query can not be cached """
+    key = (tuple(sorted((where or {}).items())),
+           order_by if isinstance(order_by, str) or order_by is None else tuple(order_by),
+           limit, offset)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
@@ -0,0 +1,387 @@
+"""
+Модуль описывает репозиторий в оперативной памяти, хранящий объекты
+по столбцам
+"""
+
+import dataclasses
+import math
+import operator
+from array import array
+from bisect import bisect_left
+from inspect import get_annotations
+from itertools import compress, count, repeat
+from operator import itemgetter
+from types import NoneType, UnionType
+from typing import Any, Callable, Iterable, Iterator, Sequence, get_args
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.query import (
+    aggregate_values, as_condition, none_first, parse_group_by, parse_order_by)
+
+try:  # numpy необязателен, без него агрегаты считаются в цикле python
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore[assignment]
+
+_INT_NULL = -2 ** 63  # None в целочисленном столбце
+
+
+class _NumberColumn:
+    """ Столбец чисел в типизированном массиве """
+
+    def __init__(self, typecode: str, nullable: bool) -> None:
+        self.data = array(typecode)
+        self.null: Any = None
+        if nullable:
+            self.null = _INT_NULL if typecode == 'q' else math.nan
+
+    def encode(self, value: Any) -> Any:
+        """ Значение для записи в массив """
+        return self.null if value is None else value
+
+    def get(self, i: int) -> Any:
+        """ Значение в строке i """
+        value = self.data[i]
+        if self.null is not None and (value == self.null or value != value):
+            return None
+        return value
+
+    def values(self) -> Iterator[Any]:
+        """ Значения всех строк """
+        if self.null is None:
+            return iter(self.data)
+        return map(self.get, range(len(self.data)))
+
+    def mask(self, predicate: Callable[[Any], bool]) -> bytearray:
+        """ 1 для строк, значение которых удовлетворяет предикату """
+        return bytearray(map(predicate, self.values()))
+
+
+class _StringColumn:
+    """
+    Столбец строк: каждая строка хранится один раз в пуле,
+    в массиве хранятся номера строк пула (-1 для None)
+    """
+
+    def __init__(self) -> None:
+        self.data = array('i')
+        self.pool: list[str] = []
+        self.codes: dict[str, int] = {}
+
+    def encode(self, value: str | None) -> int:
+        """ Номер строки в пуле, строка добавляется в пул при необходимости """
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.pool)
+            self.pool.append(value)
+        return code
+
+    def get(self, i: int) -> str | None:
+        """ Значение в строке i """
+        code = self.data[i]
+        return None if code < 0 else self.pool[code]
+
+    def values(self) -> Iterator[str | None]:
+        """ Значения всех строк """
+        return map(self.get, range(len(self.data)))
+
+    def mask(self, predicate: Callable[[Any], bool]) -> bytearray:
+        """
+        1 для строк, значение которых удовлетворяет предикату.
+        Предикат вычисляется один раз для каждой строки пула.
+        """
+        # последний элемент таблицы соответствует коду -1 (None)
+        table = bytes(map(predicate, [*self.pool, None]))
+        return bytearray(map(table.__getitem__, self.data))
+
+
+def _make_column(annotation: Any) -> _NumberColumn | _StringColumn:
+    nullable = isinstance(annotation, UnionType) and NoneType in get_args(annotation)
+    if nullable:
+        annotation, = (arg for arg in get_args(annotation) if arg is not NoneType)
+    if annotation is float:
+        return _NumberColumn('d', nullable)
+    if annotation is int:
+        return _NumberColumn('q', nullable)
+    if annotation is str:
+        return _StringColumn()
+    raise TypeError(f'unsupported field type <{annotation}>')
+
+
+class ColumnarRepository(AbstractRepository[T]):
+    """
+    Репозиторий в оперативной памяти для датаклассов с полями типов
+    int, float, str (и None). Значения полей хранятся по столбцам
+    в типизированных массивах array, строки - в пуле уникальных строк.
+    Объекты создаются только при выдаче из репозитория, поэтому
+    изменения полученного объекта сохраняются только через update.
+    Условия get_all и агрегаты (total, sum_by, aggregate) вычисляются
+    по столбцам,
+    агрегаты - векторно через numpy, если он установлен.
+    Удаленные строки помечаются и вычищаются, когда их становится
+    больше половины.
+    """
+
+    def __init__(self, data_cls: type) -> None:
+        self.data_cls = data_cls
+        annotations = get_annotations(data_cls, eval_str=True)
+        self.fields = [f.name for f in dataclasses.fields(data_cls)]
+        self._columns = {f: _make_column(annotations[f])
+                         for f in self.fields if f != 'pk'}
+        self._pks = array('q')  # по возрастанию
+        self._alive = bytearray()
+        self._n_deleted = 0
+        self._counter = count(1)
+
+    def __len__(self) -> int:
+        return len(self._pks) - self._n_deleted
+
+    def add(self, obj: T) -> int:
+        if getattr(obj, 'pk', None) != 0:
+            raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        pk = next(self._counter)
+        for field, column in self._columns.items():
+            column.data.append(column.encode(getattr(obj, field)))
+        self._pks.append(pk)
+        self._alive.append(1)
+        obj.pk = pk
+        return pk
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        for field, column in self._columns.items():
+            column.data.extend(column.encode(getattr(obj, field)) for obj in objs)
+        pks = [next(self._counter) for _ in objs]
+        self._pks.extend(pks)
+        self._alive.extend(b'\x01' * len(objs))
+        for obj, pk in zip(objs, pks):
+            obj.pk = pk
+        return pks
+
+    def get(self, pk: int) -> T | None:
+        row = self._row(pk)
+        return None if row is None else self._build(row)
+
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | Sequence[str] | None = None,
+                limit: int | None = None, offset: int = 0) -> list[T]:
+        rows = self._ordered_rows(where, order_by)
+        stop = None if limit is None else offset + limit
+        return [self._build(i) for i in rows[offset:stop]]
+
+    def get_columns(self, fields: Sequence[str],  # pylint: disable=too-many-arguments
+                    where: dict[str, Any] | None = None,
+                    order_by: str | Sequence[str] | None = None,
+                    limit: int | None = None, offset: int = 0) -> list[tuple[Any, ...]]:
+        """ Значения читаются прямо из столбцов, объекты не создаются """
+        if not fields:
+            raise ValueError('no fields to select')
+        rows = self._ordered_rows(where, order_by)
+        stop = None if limit is None else offset + limit
+        rows = rows[offset:stop]
+        values = [list(map(self._pks.__getitem__, rows)) if field == 'pk'
+                  else list(map(self._column(field).get, rows)) for field in fields]
+        return list(zip(*values))
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 order_by: str | Sequence[str] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        """
+        Объекты создаются по одному при переборе ключей выбранных строк,
+        строки, удаленные во время перебора, пропускаются
+        """
+        if batch_size < 1:
+            raise ValueError(f'batch_size must be positive, got {batch_size}')
+        pks = array('q', map(self._pks.__getitem__, self._ordered_rows(where, order_by)))
+        return self._iter_pks(pks)
+
+    def _iter_pks(self, pks: Iterable[int]) -> Iterator[T]:
+        for pk in pks:
+            row = self._row(pk)
+            if row is not None:
+                yield self._build(row)
+
+    def _ordered_rows(self, where: dict[str, Any] | None,
+                      order_by: str | Sequence[str] | None) -> list[int]:
+        """ Номера строк, удовлетворяющих условию, в порядке order_by """
+        rows = self._select(where)
+        for field, desc in reversed(parse_order_by(order_by)):
+            get = self._pks.__getitem__ if field == 'pk' else self._column(field).get
+            rows.sort(key=none_first(get), reverse=desc)
+        return rows
+
+    def update(self, obj: T) -> None:
+        if obj.pk == 0:
+            raise ValueError('attempt to update object with unknown primary key')
+        row = self._row(obj.pk)
+        if row is None:
+            raise KeyError(obj.pk)
+        for field, column in self._columns.items():
+            column.data[row] = column.encode(getattr(obj, field))
+
+    def delete(self, pk: int) -> None:
+        row = self._row(pk)
+        if row is None:
+            raise KeyError(pk)
+        self._alive[row] = 0
+        self._n_deleted += 1
+        if self._n_deleted > len(self._pks) // 2:
+            self._compact()
+
+    def count(self, where: dict[str, Any] | None = None) -> int:
+        if not where:
+            return len(self)
+        return sum(self._mask(where))
+
+    def exists(self, where: dict[str, Any] | None = None) -> bool:
+        if not where:
+            return len(self) > 0
+        return any(self._mask(where))
+
+    def total(self, field: str, where: dict[str, Any] | None = None) -> float:
+        """ Сумма значений поля field в строках, удовлетворяющих условию """
+        column = self._number_column(field)
+        if np is not None:
+            values, mask = self._np_values(column, where)
+            return values[mask].sum().item()  # type: ignore[no-any-return]
+        return sum(compress(column.data, self._values_mask(column, where)))
+
+    def sum_by(self, field: str, by: str,
+               where: dict[str, Any] | None = None) -> dict[Any, float]:
+        """ Суммы значений поля field по значениям поля by """
+        column = self._number_column(field)
+        group = self._column(by)
+        if np is not None and group.data.typecode != 'd':  # NaN не группируются
+            values, mask = self._np_values(column, where)
+            sums = _np_sums(np.frombuffer(group.data, group.data.typecode)[mask],
+                            values[mask])
+        else:
+            mask = self._values_mask(column, where)
+            sums = {}
+            get = sums.get
+            for key, value in zip(compress(group.data, mask),
+                                  compress(column.data, mask)):
+                sums[key] = get(key, 0) + value
+        if isinstance(group, _StringColumn):
+            pool = group.pool
+            return {pool[code] if code >= 0 else None: s for code, s in sums.items()}
+        if group.null is not None:
+            return {None if key == group.null else key: s for key, s in sums.items()}
+        return sums
+
+    def aggregate(self, field: str, by: str | Sequence[str] | None = None,
+                  where: dict[str, Any] | None = None,
+                  functions: Sequence[str] = ('sum',)) -> list[tuple[Any, ...]]:
+        """
+        Агрегаты вычисляются по столбцам, объекты не создаются.
+        Сумма числового поля без None по одному полю без периода
+        вычисляется через sum_by
+        """
+        keys = parse_group_by(by)
+        column = self._column(field) if field != 'pk' else None
+        if (tuple(functions) == ('sum',) and len(keys) == 1 and keys[0][1] is None
+                and isinstance(column, _NumberColumn) and column.null is None):
+            sums = self.sum_by(field, keys[0][0], where)
+            return sorted(sums.items(), key=none_first(itemgetter(0)))
+        mask = self._mask(where)
+        values = compress(self._values(field), mask)
+        groups = [compress(self._values(name), mask) for name, _ in keys]
+        if not groups:
+            return aggregate_values(zip(repeat(()), values), keys, functions)
+        group_keys = groups[0] if len(groups) == 1 else zip(*groups)
+        return aggregate_values(zip(group_keys, values), keys, functions)
+
+    def _values(self, field: str) -> Iterator[Any]:
+        """ Значения поля во всех строках, включая удаленные """
+        return iter(self._pks) if field == 'pk' else self._column(field).values()
+
+    def _number_column(self, field: str) -> _NumberColumn:
+        column = self._column(field)
+        if not isinstance(column, _NumberColumn):
+            raise ValueError(f'field <{field}> is not numeric')
+        return column
+
+    def _values_mask(self, column: _NumberColumn,
+                     where: dict[str, Any] | None) -> bytearray:
+        """ 1 для строк, удовлетворяющих условию, со значением не None """
+        mask = self._mask(where)
+        if column.null is not None:  # None не участвуют в сумме
+            mask = bytearray(map(operator.and_, mask, column.mask(_not_none)))
+        return mask
+
+    def _np_values(self, column: _NumberColumn,
+                   where: dict[str, Any] | None) -> tuple[Any, Any]:
+        """
+        Значения столбца и маска _values_mask в виде массивов numpy,
+        значения - представление буфера array без копирования
+        """
+        values = np.frombuffer(column.data, column.data.typecode)
+        mask = np.frombuffer(self._mask(where), np.bool_)
+        if column.null is None:
+            return values, mask
+        if column.data.typecode == 'd':
+            return values, mask & ~np.isnan(values)
+        return values, mask & (values != column.null)
+
+    def _column(self, field: str) -> _NumberColumn | _StringColumn:
+        column = self._columns.get(field)
+        if column is None:
+            raise ValueError(f'unknown field <{field}>')
+        return column
+
+    def _mask(self, where: dict[str, Any] | None) -> bytearray:
+        """ 1 для живых строк, удовлетворяющих условию """
+        mask = self._alive
+        for field, value in (where or {}).items():
+            predicate = as_condition(value).predicate()
+            if field == 'pk':
+                field_mask = bytearray(map(predicate, self._pks))
+            else:
+                field_mask = self._column(field).mask(predicate)
+            mask = bytearray(map(operator.and_, mask, field_mask))
+        return mask
+
+    def _select(self, where: dict[str, Any] | None) -> list[int]:
+        """ Номера строк, удовлетворяющих условию, в порядке добавления """
+        return list(compress(range(len(self._pks)), self._mask(where)))
+
+    def _row(self, pk: int) -> int | None:
+        """ Номер живой строки объекта с ключом pk """
+        row = bisect_left(self._pks, pk)
+        if row < len(self._pks) and self._pks[row] == pk and self._alive[row]:
+            return row
+        return None
+
+    def _build(self, row: int) -> T:
+        """ Создать объект по строке """
+        columns = self._columns
+        return self.data_cls(*(  # type: ignore[no-any-return]
+            self._pks[row] if f == 'pk' else columns[f].get(row) for f in self.fields))
+
+    def _compact(self) -> None:
+        """ Убрать удаленные строки из массивов """
+        alive = self._alive
+        for column in self._columns.values():
+            column.data = array(column.data.typecode, compress(column.data, alive))
+        self._pks = array('q', compress(self._pks, alive))
+        self._alive = bytearray(b'\x01' * len(self._pks))
+        self._n_deleted = 0
+
+
+def _not_none(value: Any) -> bool:
+    return value is not None
+
+
+def _np_sums(keys: Any, values: Any) -> dict[Any, Any]:
+    """ Суммы values по значениям keys: сортировка и np.add.reduceat """
+    if keys.size == 0:
+        return {}
+    order = np.argsort(keys, kind='stable')
+    keys, values = keys[order], values[order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    return dict(zip(keys[starts].tolist(), np.add.reduceat(values, starts).tolist()))
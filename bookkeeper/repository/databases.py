@@ -1,79 +1,118 @@
 """
 Module with sqlite3 database structure
+
+Tables are generated from the model dataclasses of MODELS: pony entities
+for SQLiteRepository and TableSchema (bookkeeper.repository.schema) for
+creating tables and indexes and migrating existing database files.
 """
-from typing import Any
-from datetime import datetime
+from dataclasses import fields
+from inspect import get_annotations
+from typing import Any, Callable
+import sqlite3
 
 import pony.orm as pny  # type: ignore
+from bookkeeper.models.budget import Budget as BudgetModel
+from bookkeeper.models.category import Category as CategoryModel
+from bookkeeper.models.expense import Expense as ExpenseModel
+from bookkeeper.repository.row_codec import SQL_TYPES, _base_type, _is_nullable
+from bookkeeper.repository.schema import TableSchema
 from bookkeeper.utils import NONE_2_INT_CHANGER  # type: ignore
 
 
 db = pny.Database()
 
+# table name -> model stored in the table
+MODELS: dict[str, type] = {
+    'Expense': ExpenseModel,
+    'Category': CategoryModel,
+    'Budget': BudgetModel,
+}
+
+
+def make_entity(name: str, model: type) -> Any:
+    """
+    Pony entity for table name with attributes of the model fields.
+    Strings are Optional, since pony does not accept empty Required
+    strings, indexes are taken from the field metadata.
+    """
+    annotations = get_annotations(model, eval_str=True)
+    attrs: dict[str, Any] = {'__doc__': f'ORM for database table {name}',
+                             'pk': pny.PrimaryKey(int, auto=True)}
+    nullable = []
+    for field in fields(model):
+        if field.name == 'pk':
+            continue
+        tp = _base_type(annotations[field.name])
+        tp = tp if tp in SQL_TYPES else str
+        kind = pny.Optional if _is_nullable(annotations[field.name]) or tp is str \
+            else pny.Required
+        if _is_nullable(annotations[field.name]):
+            nullable.append(field.name)
+        attrs[field.name] = kind(tp, index=bool(field.metadata.get('index')) or None,
+                                 unique=bool(field.metadata.get('unique')) or None)
+
+    def get_data(self: Any) -> dict[str, Any]:
+        """ Get data from entity """
+        data = {f.name: getattr(self, f.name) for f in fields(model)}
+        for field_name in nullable:
+            if data[field_name] == NONE_2_INT_CHANGER:
+                data[field_name] = None
+        return data
+
+    attrs['get_data'] = get_data
+    return type(name, (db.Entity,), attrs)
+
+
+ENTITIES: dict[str, Any] = {
+    name: make_entity(name, model) for name, model in MODELS.items()}
+Expense = ENTITIES['Expense']
+Category = ENTITIES['Category']
+Budget = ENTITIES['Budget']
+
 
 class DatabaseHelper():
     """ Contains static methods to work with sqlite3 database """
     @staticmethod
-    def get_table_by_name(name: str) -> db.Entity:
-        """ Get database class entity by table name"""
-        if name == 'Expense':
-            return Expense
-        if name == 'Category':
-            return Category
-        if name == 'Budget':
-            return Budget
-
-        return Expense
-
-
-class Expense(db.Entity):
-    """ ORM for database table Expense"""
-    pk = pny.PrimaryKey(int, auto=True)
-    amount = pny.Required(float)
-    category = pny.Required(int)
-    comment = pny.Optional(str, 50)
-    added_date = pny.Required(str, 30)
-    expense_date = pny.Optional(str, 30)
-
-    def get_data(self) -> dict[str, Any]:
-        """ Get data from entity """
-        return {
-            'pk': self.pk,
-            'amount': self.amount,
-            'category': self.category,
-            'comment': self.comment,
-            'added_date': self.added_date,#datetime.strptime(self.added_date, "%d-%m-%Y %H:%M"),
-            'expense_date': self.expense_date#datetime.strptime(self.expense_date, "%d-%m-%Y")
-        }
-
-
-class Category(db.Entity):
-    """ ORM for database table Category"""
-    pk = pny.PrimaryKey(int, auto=True)
-    parent = pny.Optional(int)
-    name = pny.Required(str, 30)
-
-    def get_data(self) -> dict[str, Any]:
-        """ Get data from entity """
-        return {
-            'pk': self.pk,
-            'parent': None if self.parent == NONE_2_INT_CHANGER else self.parent,
-            'name': self.name
-        }
-
-
-class Budget(db.Entity):
-    """ ORM for database table Budget"""
-    pk = pny.PrimaryKey(int, auto=True)
-    period = pny.Required(str, 20)
-    limit = pny.Required(float)
-    spent = pny.Required(float)
-
-    def get_data(self) -> dict[str, Any]:
-        """Get data from entity """
-        return {
-            'pk': self.pk,
-            'period': self.period,
-            'limit': self.limit,
-            'spent': self.spent
-        }
+    def get_table_by_name(name: str) -> Any:
+        """ Get database class entity (a subclass of db.Entity) by table name"""
+        return ENTITIES.get(name, Expense)
+
+
+def _migrate_expense_dates_to_iso(con: sqlite3.Connection) -> None:
+    """ Convert Expense.expense_date from dd-mm-YYYY to YYYY-MM-DD """
+    con.execute("""
+        UPDATE "Expense"
+        SET "expense_date" = substr("expense_date", 7, 4) || '-' ||
+                             substr("expense_date", 4, 2) || '-' ||
+                             substr("expense_date", 1, 2)
+        WHERE "expense_date" GLOB '[0-9][0-9]-[0-9][0-9]-[0-9][0-9][0-9][0-9]'
+    """)
+
+
+# schema migrations in order of application, PRAGMA user_version of
+# the database file stores the number of applied migrations
+MIGRATIONS: list[Callable[[sqlite3.Connection], None]] = [
+    _migrate_expense_dates_to_iso,
+]
+
+
+def migrate_database(db_filename: str) -> None:
+    """
+    Apply not yet applied migrations to the database file, then bring
+    tables of MODELS to the schema of the models (new tables, columns
+    and indexes)
+    """
+    con = sqlite3.connect(db_filename)
+    try:
+        with con:
+            version = con.execute('PRAGMA user_version').fetchone()[0]
+            has_tables = con.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]
+            if has_tables:
+                for migration in MIGRATIONS[version:]:
+                    migration(con)
+            con.execute(f'PRAGMA user_version = {len(MIGRATIONS)}')
+            for name, model in MODELS.items():
+                TableSchema(model, name).migrate(con)
+    finally:
+        con.close()
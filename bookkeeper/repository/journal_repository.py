@@ -0,0 +1,348 @@
+"""
+Модуль описывает репозиторий с журналом операций на диске
+
+Каждая операция add, update, delete дописывается в конец журнала
+отдельной записью: длина данных и CRC32 (по 4 байта), затем данные
+в JSON: ["a" | "u", [значения полей]] или ["d", pk]. Состояние хранится
+в оперативной памяти (MemoryRepository) и восстанавливается при открытии:
+загружается снимок и повторяются записи журнала. Запись, оборванная
+при сбое, отбрасывается.
+
+Когда журнал вырастает, он сжимается в снимок в фоновом потоке:
+журнал переименовывается в <path>.old (если остались журналы неудачных
+сжатий - в <path>.old.<n> со следующим номером), запись продолжается
+в новый журнал, снимок <path>.snap пишется из замороженных объектов
+(MemoryRepository.frozen_values), после замены снимка журналы .old
+удаляются, начиная со старого. При восстановлении журналы .old
+повторяются по порядку номеров. Повтор записей идемпотентен, поэтому
+сбой на любом шаге не теряет данных.
+"""
+
+import dataclasses
+import json
+import os
+import struct
+import threading
+import zlib
+from typing import Any, Iterable, Sequence
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.snapshot import SnapshotReader, write_snapshot
+
+_FRAME = struct.Struct('<II')  # длина данных, CRC32 данных
+
+
+class JournalRepository(AbstractRepository[T]):
+    """
+    Репозиторий датаклассов с полями int, float, str в оперативной памяти
+    с журналом операций в файле path.
+    Запись операции - добавление в буфер файла, ее время не зависит от
+    объема данных. Буфер сбрасывается на диск с fsync одним фоновым
+    потоком для всех операций, накопившихся за commit_interval секунд
+    (групповая фиксация). Если durable, операция ждет ближайшей фиксации.
+    Журнал больше compact_size байт сжимается в снимок в фоне.
+    """
+
+    def __init__(self, path: str, data_cls: type,  # pylint: disable=too-many-arguments
+                 commit_interval: float = 0.01, durable: bool = False,
+                 compact_size: int = 64 * 2 ** 20,
+                 indexes: Iterable[str] = (), sorted_indexes: Iterable[str] = ()) -> None:
+        self.path = path
+        self.snapshot_path = path + '.snap'
+        self._old_path = path + '.old'
+        self.data_cls = data_cls
+        self.commit_interval = commit_interval
+        self.durable = durable
+        self.compact_size = compact_size
+        self._fields = [f.name for f in dataclasses.fields(data_cls)]
+
+        self._cond = threading.Condition()
+        self._written = 0  # число записанных в журнал операций
+        self._flushed = 0  # из них сброшено на диск
+        self._commit_requested = False  # операция ждет фиксации
+        self._closed = False
+        self._compaction: threading.Thread | None = None
+        # копии дескрипторов журналов, отложенных сжатием, ждут fsync
+        self._sealed_fds: list[int] = []
+
+        self._memory: MemoryRepository[T] = MemoryRepository(indexes, sorted_indexes)
+        self._next_pk = 1
+        self._recover(list(indexes), list(sorted_indexes))
+        self._log = open(path, 'ab')  # pylint: disable=consider-using-with
+        self._log_size = self._log.tell()
+        self._committer = threading.Thread(target=self._commit_loop,
+                                           name='journal-commit', daemon=True)
+        self._committer.start()
+
+    # чтение
+
+    def get(self, pk: int) -> T | None:
+        with self._cond:
+            return self._memory.get(pk)
+
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | Sequence[str] | None = None,
+                limit: int | None = None, offset: int = 0) -> list[T]:
+        with self._cond:
+            return self._memory.get_all(where, order_by=order_by,
+                                        limit=limit, offset=offset)
+
+    def get_columns(self, fields: Sequence[str],  # pylint: disable=too-many-arguments
+                    where: dict[str, Any] | None = None,
+                    order_by: str | Sequence[str] | None = None,
+                    limit: int | None = None, offset: int = 0) -> list[tuple[Any, ...]]:
+        with self._cond:
+            return self._memory.get_columns(fields, where, order_by, limit, offset)
+
+    def count(self, where: dict[str, Any] | None = None) -> int:
+        with self._cond:
+            return self._memory.count(where)
+
+    def exists(self, where: dict[str, Any] | None = None) -> bool:
+        with self._cond:
+            return self._memory.exists(where)
+
+    def aggregate(self, field: str, by: str | Sequence[str] | None = None,
+                  where: dict[str, Any] | None = None,
+                  functions: Sequence[str] = ('sum',)) -> list[tuple[Any, ...]]:
+        with self._cond:
+            return self._memory.aggregate(field, by, where, functions)
+
+    # запись
+
+    def add(self, obj: T) -> int:
+        return self.add_many([obj])[0]
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        with self._cond:
+            for obj in objs:
+                obj.pk = self._next_pk
+                self._next_pk += 1
+                self._memory.update(obj)
+                self._append(['a', self._values(obj)])
+            written = self._written
+        self._wait_durable(written)
+        return [obj.pk for obj in objs]
+
+    def update(self, obj: T) -> None:
+        self.update_many([obj])
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+        with self._cond:
+            for obj in objs:
+                if self._memory.get(obj.pk) is None:
+                    raise KeyError(obj.pk)
+                self._memory.update(obj)
+                self._append(['u', self._values(obj)])
+            written = self._written
+        self._wait_durable(written)
+
+    def delete(self, pk: int) -> None:
+        self.delete_many([pk])
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        with self._cond:
+            for pk in pks:
+                self._memory.delete(pk)
+                self._append(['d', pk])
+            written = self._written
+        self._wait_durable(written)
+
+    def sync(self) -> None:
+        """ Дождаться сброса на диск всех записанных операций """
+        with self._cond:
+            written = self._written
+        self._wait_durable(written, force=True)
+
+    def compact(self) -> None:
+        """ Сжать журнал в снимок и дождаться окончания """
+        with self._cond:
+            self._start_compaction()
+            compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+
+    def close(self) -> None:
+        """ Сбросить журнал на диск и закрыть его """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._committer.join()
+        if self._compaction is not None:
+            self._compaction.join()
+        with self._cond:
+            self._log.close()
+
+    def __enter__(self) -> 'JournalRepository[T]':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def _values(self, obj: T) -> list[Any]:
+        return [getattr(obj, field) for field in self._fields]
+
+    def _append(self, record: list[Any]) -> None:
+        """ Дописать запись в буфер журнала, вызывается под блокировкой """
+        if self._closed:
+            raise ValueError('journal is closed')
+        payload = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode()
+        self._log.write(_FRAME.pack(len(payload), zlib.crc32(payload)))
+        self._log.write(payload)
+        self._log_size += _FRAME.size + len(payload)
+        self._written += 1
+        if self._log_size > self.compact_size:
+            self._start_compaction()
+
+    def _wait_durable(self, written: int, force: bool = False) -> None:
+        """ В режиме durable дождаться фиксации операции номер written """
+        if not (self.durable or force):
+            return
+        with self._cond:
+            self._commit_requested = True
+            self._cond.notify_all()  # разбудить поток фиксации
+            self._cond.wait_for(lambda: self._flushed >= written or self._closed)
+
+    def _commit_loop(self) -> None:
+        """ Групповая фиксация: сброс буфера и fsync накопившихся операций """
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or self._commit_requested,
+                                    self.commit_interval)
+                self._commit_requested = False
+                written, closed = self._written, self._closed
+                fds = []
+                if written > self._flushed or self._sealed_fds:
+                    self._log.flush()
+                    # журнал может быть заменен при сжатии, пока идет fsync
+                    fds = [os.dup(self._log.fileno()), *self._sealed_fds]
+                    self._sealed_fds = []
+            for fd in fds:
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+            with self._cond:
+                self._flushed = max(self._flushed, written)
+                self._cond.notify_all()
+            if closed:
+                return
+
+    # восстановление и сжатие
+
+    def _recover(self, indexes: list[str], sorted_indexes: list[str]) -> None:
+        """ Загрузить снимок и повторить журналы """
+        if os.path.exists(self.snapshot_path):
+            self._memory = MemoryRepository.load_snapshot(
+                self.snapshot_path, self.data_cls, indexes, sorted_indexes)
+            with SnapshotReader(self.snapshot_path, self.data_cls) as reader:
+                self._next_pk = reader.next_pk
+        old_paths = self._old_paths()
+        for path in (*old_paths, self.path):
+            if os.path.exists(path):
+                self._replay(path)
+        if old_paths:  # прерванное сжатие
+            self._write_snapshot(self._memory.get_all(), self._next_pk)
+            for path in old_paths:
+                os.remove(path)
+            with open(self.path, 'wb'):
+                pass
+
+    def _replay(self, path: str) -> None:
+        """ Повторить записи журнала, отрезать оборванную запись в конце """
+        with open(path, 'rb') as file:
+            data = file.read()
+        position = 0
+        while position + _FRAME.size <= len(data):
+            size, crc = _FRAME.unpack_from(data, position)
+            payload = data[position + _FRAME.size:position + _FRAME.size + size]
+            if len(payload) < size or zlib.crc32(payload) != crc:
+                break
+            op, arg = json.loads(payload)
+            if op == 'd':
+                if self._memory.get(arg) is not None:
+                    self._memory.delete(arg)
+            else:
+                obj = self.data_cls(*arg)
+                self._memory.update(obj)
+                self._next_pk = max(self._next_pk, obj.pk + 1)
+            position += _FRAME.size + size
+        if position < len(data):
+            with open(path, 'r+b') as file:
+                file.truncate(position)
+
+    def _old_log(self, number: int) -> str:
+        """ Путь журнала, ожидающего снимка: <path>.old, <path>.old.<number> """
+        return f'{self._old_path}.{number}' if number else self._old_path
+
+    def _old_numbers(self) -> list[int]:
+        """ Номера журналов, ожидающих снимка, по возрастанию """
+        directory, name = os.path.split(self._old_path)
+        numbers = []
+        for entry in os.listdir(directory or '.'):
+            if entry == name:
+                numbers.append(0)
+            elif entry.startswith(name + '.') and entry[len(name) + 1:].isdigit():
+                numbers.append(int(entry[len(name) + 1:]))
+        return sorted(numbers)
+
+    def _old_paths(self) -> list[str]:
+        """ Журналы, ожидающие снимка, от старых к новым """
+        return [self._old_log(number) for number in self._old_numbers()]
+
+    def _start_compaction(self) -> None:
+        """
+        Переключить запись на новый журнал и запустить запись снимка
+        в фоне, вызывается под блокировкой. Под блокировкой только
+        переименовывается журнал и замораживаются объекты, fsync
+        отложенного журнала делает поток фиксации
+        """
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        self._log.flush()
+        self._sealed_fds.append(os.dup(self._log.fileno()))
+        self._log.close()
+        # журналы .old остаются, если предыдущее сжатие не записало снимок
+        numbers = self._old_numbers()
+        os.replace(self.path, self._old_log(numbers[-1] + 1 if numbers else 0))
+        self._log = open(self.path, 'ab')  # pylint: disable=consider-using-with
+        self._log_size = 0
+        self._commit_requested = True  # отложенный журнал сбрасывается на диск
+        self._cond.notify_all()
+        objs = self._memory.frozen_values()
+        self._compaction = threading.Thread(
+            target=self._run_compaction, args=(objs, self._next_pk),
+            name='journal-compaction', daemon=True)
+        self._compaction.start()
+
+    def _run_compaction(self, objs: Iterable[T], next_pk: int) -> None:
+        try:
+            self._compact(objs, next_pk)
+        finally:
+            with self._cond:
+                self._memory.thaw()
+
+    def _compact(self, objs: Iterable[T], next_pk: int) -> None:
+        """
+        Записать снимок и удалить журналы .old, начиная со старого:
+        оставшиеся после сбоя журналы повторяются поверх нового снимка
+        """
+        old_paths = self._old_paths()  # пока поток жив, новые не появляются
+        self._write_snapshot(list(objs), next_pk)
+        for path in old_paths:
+            os.remove(path)
+
+    def _write_snapshot(self, objs: list[T], next_pk: int) -> None:
+        """ Записать снимок, write_snapshot атомарно заменяет старый """
+        objs.sort(key=lambda obj: obj.pk)
+        write_snapshot(self.snapshot_path, self.data_cls, objs, next_pk)
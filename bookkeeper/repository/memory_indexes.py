@@ -0,0 +1,243 @@
+"""
+Индексы полей для репозитория в оперативной памяти
+
+Индекс хранит pk объектов по значению поля и по условию из модуля query
+возвращает множество pk-кандидатов или None, если условие не может быть
+выполнено с помощью индекса. Кандидаты затем проверяются полным условием.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from itertools import groupby
+from typing import Any, Hashable, Iterator
+
+from bookkeeper.repository.query import (
+    Between, Condition, Eq, Ge, Gt, In, Le, Lt, Prefix)
+
+MISSING = object()  # значение отсутствующего атрибута
+
+_AFTER_ALL_PKS = float('inf')
+
+Position = tuple[int, int]  # (номер блока, номер ключа в блоке)
+
+
+class HashIndex:
+    """ Хеш-индекс: значение -> множество pk. Выполняет условия равенства и In """
+
+    def __init__(self) -> None:
+        self.buckets: dict[Any, set[int]] = {}
+        # pk объектов с нехешируемым значением, они не попадают в buckets
+        self.unhashable: set[int] = set()
+
+    def add(self, pk: int, value: Any) -> None:
+        """ Добавить pk объекта со значением поля value """
+        if isinstance(value, Hashable):
+            try:
+                self.buckets.setdefault(value, set()).add(pk)
+                return
+            except TypeError:  # например, кортеж со списком
+                pass
+        self.unhashable.add(pk)
+
+    def remove(self, pk: int, value: Any) -> None:
+        """ Удалить pk объекта, добавленного со значением value """
+        if pk in self.unhashable:
+            self.unhashable.discard(pk)
+            return
+        bucket = self.buckets[value]
+        bucket.discard(pk)
+        if not bucket:
+            del self.buckets[value]
+
+    def candidates(self, cond: Any) -> set[int] | None:
+        """ pk объектов, которые могут удовлетворять условию """
+        if isinstance(cond, In):
+            values: tuple[Any, ...] = cond.values
+        elif isinstance(cond, Eq):
+            values = (cond.value,)
+        elif isinstance(cond, Condition):  # условие на диапазон
+            return None
+        else:
+            values = (cond,)
+        try:
+            found = (self.buckets.get(v, ()) for v in values)
+            return set().union(*found, self.unhashable)
+        except TypeError:  # нехешируемое значение в условии
+            return None
+
+
+class SortedKeys:
+    """
+    Отсортированный список ключей, разбитый на блоки не длиннее
+    2 * load. Вставка и удаление сдвигают только ключи одного блока:
+    O(log n + load) вместо O(n) у list.insert. Позиция ключа -
+    пара (номер блока, номер в блоке), позиции сравниваются как кортежи.
+    """
+
+    def __init__(self, load: int = 512) -> None:
+        self.load = load
+        self.blocks: list[list[Any]] = []
+        self.maxes: list[Any] = []  # последний ключ каждого блока
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def insert(self, key: Any) -> None:
+        """ Вставить ключ, сохраняя порядок """
+        self.size += 1
+        if not self.blocks:
+            self.blocks.append([key])
+            self.maxes.append(key)
+            return
+        i = min(bisect_left(self.maxes, key), len(self.blocks) - 1)
+        block = self.blocks[i]
+        insort(block, key)
+        self.maxes[i] = block[-1]
+        if len(block) > 2 * self.load:
+            self.blocks[i:i + 1] = [block[:self.load], block[self.load:]]
+            self.maxes[i:i + 1] = [block[self.load - 1], block[-1]]
+
+    def remove(self, key: Any) -> None:
+        """ Удалить ключ, который есть в списке """
+        i = bisect_left(self.maxes, key)
+        block = self.blocks[i]
+        del block[bisect_left(block, key)]
+        self.size -= 1
+        if block:
+            self.maxes[i] = block[-1]
+        else:
+            del self.blocks[i]
+            del self.maxes[i]
+
+    def start(self) -> Position:
+        """ Позиция первого ключа """
+        return (0, 0) if self.blocks else self.end()
+
+    def end(self) -> Position:
+        """ Позиция после последнего ключа """
+        return len(self.blocks), 0
+
+    def bisect_left(self, key: Any) -> Position:
+        """ Позиция первого ключа, не меньшего key """
+        i = bisect_left(self.maxes, key)
+        if i == len(self.blocks):
+            return self.end()
+        return i, bisect_left(self.blocks[i], key)
+
+    def bisect_right(self, key: Any) -> Position:
+        """ Позиция первого ключа, большего key """
+        i = bisect_right(self.maxes, key)
+        if i == len(self.blocks):
+            return self.end()
+        return i, bisect_right(self.blocks[i], key)
+
+    def between(self, start: Position, stop: Position,
+                reverse: bool = False) -> Iterator[Any]:
+        """ Ключи от позиции start до stop (не включая) """
+        (first, first_j), (last, last_j) = start, stop
+        blocks = range(last if last_j else last - 1, first - 1, -1) if reverse \
+            else range(first, last + 1 if last_j else last)
+        for i in blocks:
+            block = self.blocks[i]
+            part = block[first_j if i == first else 0:last_j if i == last else len(block)]
+            yield from reversed(part) if reverse else part
+
+
+class SortedIndex:
+    """
+    Упорядоченный индекс: пары (значение, pk) в отсортированных блоках.
+    Выполняет условия на диапазон за O(log n + k) и позволяет обходить
+    объекты в порядке значения поля. None и отсутствующие значения
+    хранятся отдельно, при сортировке они идут первыми, как в SQL.
+    """
+
+    def __init__(self) -> None:
+        self.keys = SortedKeys()
+        self.nones: set[int] = set()
+
+    def add(self, pk: int, value: Any) -> None:
+        """ Добавить pk объекта со значением поля value """
+        if value is None or value is MISSING:
+            self.nones.add(pk)
+            return
+        self.keys.insert((value, pk))
+
+    def remove(self, pk: int, value: Any) -> None:
+        """ Удалить pk объекта, добавленного со значением value """
+        if value is None or value is MISSING:
+            self.nones.discard(pk)
+            return
+        self.keys.remove((value, pk))
+
+    def _slice(self, cond: Any) -> tuple[Position, Position] | None:
+        """ Границы keys для условия, None если условие не диапазон """
+        if isinstance(cond, Condition) and not isinstance(cond, Eq | Gt | Ge | Lt | Le
+                                                          | Between | Prefix):
+            return None
+        low = high = None
+        low_incl = high_incl = True
+        if isinstance(cond, Gt | Ge):
+            low, low_incl = cond.value, isinstance(cond, Ge)
+        elif isinstance(cond, Lt | Le):
+            high, high_incl = cond.value, isinstance(cond, Le)
+        elif isinstance(cond, Between):
+            low, high = cond.low, cond.high
+        elif isinstance(cond, Prefix):
+            low, *upper = cond.params()
+            if upper:
+                high, high_incl = upper[0], False
+        else:
+            low = high = cond.value if isinstance(cond, Eq) else cond
+            if low is None:
+                return None
+
+        keys = self.keys
+        start = keys.start() if low is None else (
+            keys.bisect_left((low,)) if low_incl
+            else keys.bisect_right((low, _AFTER_ALL_PKS)))
+        stop = keys.end() if high is None else (
+            keys.bisect_right((high, _AFTER_ALL_PKS)) if high_incl
+            else keys.bisect_left((high,)))
+        return start, max(start, stop)
+
+    def candidates(self, cond: Any) -> set[int] | None:
+        """ pk объектов, которые могут удовлетворять условию """
+        if cond is None or (isinstance(cond, Eq) and cond.value is None):
+            return set(self.nones)
+        if isinstance(cond, In):
+            result: set[int] = set()
+            for value in cond.values:
+                found = self.candidates(Eq(value))
+                if found is None:
+                    return None
+                result |= found
+            return result
+        bounds = self._slice(cond)
+        if bounds is None:
+            return None
+        start, stop = bounds
+        return {pk for _, pk in self.keys.between(start, stop)}
+
+    def iter_pks(self, desc: bool = False, pk_desc: bool = False,
+                 cond: Any = None) -> Iterator[int]:
+        """
+        pk в порядке значения поля (desc - по убыванию), объекты с равными
+        значениями упорядочены по pk (pk_desc - по убыванию).
+        cond - условие на это же поле, сужающее обход до диапазона.
+        """
+        bounds = self._slice(cond) if cond is not None else None
+        start, stop = bounds if bounds is not None else (self.keys.start(),
+                                                         self.keys.end())
+        with_nones = cond is None or bounds is None
+        nones = sorted(self.nones, reverse=pk_desc) if with_nones else []
+
+        if not desc:
+            yield from nones
+        keys = self.keys.between(start, stop, reverse=desc)
+        if desc == pk_desc:
+            yield from (pk for _, pk in keys)
+        else:
+            for _, group in groupby(keys, key=lambda key: key[0]):
+                yield from reversed([pk for _, pk in group])
+        if desc:
+            yield from nones
@@ -2,20 +2,44 @@
 Модуль описывает репозиторий, работающий в оперативной памяти
 """
 
-from itertools import count
-from typing import Any
+from itertools import count, islice
+from operator import attrgetter
+from typing import Any, Iterable, Iterator, MutableMapping, Sequence, ValuesView
 
 from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.memory_indexes import MISSING, HashIndex, SortedIndex
+from bookkeeper.repository.query import (
+    aggregate_objects, compile_predicate, order_objects, parse_order_by, slice_objects)
+from bookkeeper.repository.snapshot import (
+    SnapshotContainer, SnapshotReader, write_snapshot)
 
 
 class MemoryRepository(AbstractRepository[T]):
     """
     Репозиторий, работающий в оперативной памяти. Хранит данные в словаре.
+    indexes - поля, по которым строятся хеш-индексы (значение -> множество pk).
+    Условия равенства и In по индексированным полям выбирают объекты
+    из пересечения индексов, без перебора всех объектов.
+    sorted_indexes - поля с упорядоченными индексами: условия на диапазон
+    выполняются за O(log n + k), выборка с order_by по такому полю
+    обходит объекты в порядке индекса и останавливается после limit.
+    Содержимое можно сохранить в бинарный снимок (save_snapshot) и открыть
+    снимок без разбора всех строк (load_snapshot).
     """
 
-    def __init__(self) -> None:
-        self._container: dict[int, T] = {}
+    def __init__(self, indexes: Iterable[str] = (),
+                 sorted_indexes: Iterable[str] = ()) -> None:
+        self._container: MutableMapping[int, T] = {}
         self._counter = count(1)
+        self._indexes: dict[str, HashIndex | SortedIndex] = {
+            field: HashIndex() for field in indexes}
+        for field in sorted_indexes:
+            if field in self._indexes:
+                raise ValueError(f'field <{field}> has two indexes')
+            self._indexes[field] = SortedIndex()
+        # значения индексированных полей на момент записи: объект могут
+        # изменить до вызова update
+        self._indexed_values: dict[int, tuple[Any, ...]] = {}
 
     def add(self, obj: T) -> int:
         if getattr(obj, 'pk', None) != 0:
@@ -23,21 +47,274 @@ class MemoryRepository(AbstractRepository[T]):
         pk = next(self._counter)
         self._container[pk] = obj
         obj.pk = pk
+        self._index(obj)
         return pk
 
     def get(self, pk: int) -> T | None:
         return self._container.get(pk)
 
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
-        if where is None:
-            return list(self._container.values())
-        return [obj for obj in self._container.values()
-                if all(getattr(obj, attr) == value for attr, value in where.items())]
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | Sequence[str] | None = None,
+                limit: int | None = None, offset: int = 0) -> list[T]:
+        if self._indexes and order_by is not None:
+            found = self._sorted_get_all(where, order_by, limit, offset)
+            if found is not None:
+                return found
+        objs = list(self._select(where))
+        if order_by is not None:
+            order_objects(objs, order_by)
+        return slice_objects(objs, limit, offset)
+
+    def count(self, where: dict[str, Any] | None = None) -> int:
+        """ Без условия - O(1), с условием перебираются кандидаты из индексов """
+        if not where:
+            return len(self._container)
+        return sum(1 for _ in self._select(where))
+
+    def exists(self, where: dict[str, Any] | None = None) -> bool:
+        """ Перебор останавливается на первом подходящем объекте """
+        if not where:
+            return len(self._container) > 0
+        return next(iter(self._select(where)), None) is not None
+
+    def aggregate(self, field: str, by: str | Sequence[str] | None = None,
+                  where: dict[str, Any] | None = None,
+                  functions: Sequence[str] = ('sum',)) -> list[tuple[Any, ...]]:
+        """ Агрегаты вычисляются за один проход по выбранным объектам """
+        return aggregate_objects(self._select(where), field, by, functions)
+
+    def _select(self, where: dict[str, Any] | None) -> Iterable[T]:
+        """ Объекты, удовлетворяющие условию, в порядке добавления """
+        if not where:
+            return self._container.values()
+        predicate = compile_predicate(where)
+        candidates = self._index_candidates(where)
+        if candidates is None:
+            return filter(predicate, self._container.values())
+        # pk растут в порядке добавления, как и порядок словаря
+        return filter(predicate, map(self._container.__getitem__, sorted(candidates)))
 
     def update(self, obj: T) -> None:
         if obj.pk == 0:
             raise ValueError('attempt to update object with unknown primary key')
+        self._unindex(obj.pk)
         self._container[obj.pk] = obj
+        self._index(obj)
 
     def delete(self, pk: int) -> None:
         self._container.pop(pk)
+        self._unindex(pk)
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        return [self.add(obj) for obj in objs]
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+        for obj in objs:
+            self.update(obj)
+
+    def frozen_values(self) -> Iterable[T]:
+        """
+        Объекты на текущий момент, последующие изменения репозитория
+        их не затрагивают. Словарь объектов не копируется (O(1)): он
+        замораживается, изменения записываются в слой поверх него, пока
+        не вызван thaw. До thaw объекты можно обходить в другом потоке,
+        заморозить их второй раз нельзя.
+        """
+        if isinstance(self._container, _LayeredContainer):
+            raise RuntimeError('objects are already frozen')
+        frozen = self._container
+        self._container = _LayeredContainer(frozen)
+        return frozen.values()
+
+    def thaw(self) -> None:
+        """ Перенести изменения, сделанные после frozen_values, в словарь объектов """
+        if isinstance(self._container, _LayeredContainer):
+            self._container = self._container.merge()
+
+    def save_snapshot(self, path: str, data_cls: type | None = None) -> None:
+        """
+        Сохранить объекты в файл снимка. Объекты должны быть экземплярами
+        одного датакласса data_cls (по умолчанию - класс первого объекта)
+        с полями типов int, float, str.
+        """
+        objs = sorted(self._container.values(), key=attrgetter('pk'))
+        if data_cls is None:
+            if not objs:
+                raise ValueError('data class of objects in empty repository is unknown')
+            data_cls = type(objs[0])
+        next_pk = next(self._counter)
+        self._counter = count(next_pk)
+        write_snapshot(path, data_cls, objs, next_pk)
+
+    @classmethod
+    def load_snapshot(cls, path: str, data_cls: type | None = None,
+                      indexes: Iterable[str] = (),
+                      sorted_indexes: Iterable[str] = ()) -> 'MemoryRepository[Any]':
+        """
+        Открыть снимок. Файл отображается в память, объекты создаются при
+        обращении к ним (построение индексов создает все объекты).
+        data_cls - класс объектов, по умолчанию берется из снимка.
+        """
+        reader = SnapshotReader(path, data_cls)
+        repo: MemoryRepository[Any] = cls(indexes, sorted_indexes)
+        repo._container = SnapshotContainer(reader)
+        repo._counter = count(reader.next_pk)
+        for obj in repo._container.values() if repo._indexes else ():
+            repo._index(obj)
+        return repo
+
+    def _index(self, obj: T) -> None:
+        """ Добавить объект в индексы """
+        if not self._indexes:
+            return
+        values = tuple(getattr(obj, field, MISSING) for field in self._indexes)
+        self._indexed_values[obj.pk] = values
+        for index, value in zip(self._indexes.values(), values):
+            index.add(obj.pk, value)
+
+    def _unindex(self, pk: int) -> None:
+        """ Удалить объект из индексов по сохраненным значениям полей """
+        values = self._indexed_values.pop(pk, None)
+        if values is None:
+            return
+        for index, value in zip(self._indexes.values(), values):
+            index.remove(pk, value)
+
+    def _index_candidates(self, where: dict[str, Any],
+                          skip: str | None = None) -> set[int] | None:
+        """
+        pk объектов, которые могут удовлетворять условиям на индексированные
+        поля (кроме поля skip), None если индексы неприменимы
+        """
+        found = []
+        for field, cond in where.items():
+            index = self._indexes.get(field)
+            if index is None or field == skip:
+                continue
+            candidates = index.candidates(cond)
+            if candidates is not None:
+                found.append(candidates)
+        if not found:
+            return None
+        found.sort(key=len)
+        return found[0].intersection(*found[1:])
+
+    def _sorted_get_all(self, where: dict[str, Any] | None,
+                        order_by: str | Sequence[str] | None,
+                        limit: int | None, offset: int) -> list[T] | None:
+        """
+        Выборка в порядке упорядоченного индекса, если порядок задан его полем
+        (и, возможно, pk): обходятся только нужные limit + offset объектов.
+        None, если индекс неприменим.
+        """
+        order = parse_order_by(order_by)
+        if not order or len(order) > 2:
+            return None
+        field, desc = order[0]
+        index = self._indexes.get(field)
+        if not isinstance(index, SortedIndex):
+            return None
+        pk_desc = False
+        if len(order) == 2:
+            if order[1][0] != 'pk':
+                return None
+            pk_desc = order[1][1]
+
+        where = where or {}
+        predicate = compile_predicate(where)
+        candidates = self._index_candidates(where, skip=field)
+        pks = index.iter_pks(desc, pk_desc, where.get(field))
+        if candidates is not None:
+            pks = (pk for pk in pks if pk in candidates)
+        objs = (obj for obj in map(self._container.__getitem__, pks) if predicate(obj))
+        return list(islice(objs, offset, None if limit is None else offset + limit))
+
+
+class _LayeredContainer(MutableMapping[int, T]):
+    """
+    Словарь pk -> объект поверх замороженного словаря base: записанные
+    объекты и удаления (None) хранятся в слое changes, base не меняется
+    (копирование при записи). Порядок обхода - порядок base, затем
+    новые объекты.
+    """
+
+    def __init__(self, base: MutableMapping[int, T]) -> None:
+        self.base = base
+        self.changes: dict[int, T | None] = {}
+        self._len = len(base)
+
+    def __getitem__(self, pk: int) -> T:
+        if pk not in self.changes:
+            return self.base[pk]
+        obj = self.changes[pk]
+        if obj is None:
+            raise KeyError(pk)
+        return obj
+
+    def __contains__(self, pk: object) -> bool:
+        if pk in self.changes:
+            return self.changes[pk] is not None  # type: ignore[index]
+        return pk in self.base
+
+    def __setitem__(self, pk: int, obj: T) -> None:
+        if pk not in self:
+            self._len += 1
+        self.changes[pk] = obj
+
+    def __delitem__(self, pk: int) -> None:
+        if pk not in self:
+            raise KeyError(pk)
+        self.changes[pk] = None
+        self._len -= 1
+
+    def __iter__(self) -> Iterator[int]:
+        changes = self.changes
+        for pk in self.base:
+            if changes.get(pk, pk) is not None:
+                yield pk
+        for pk, obj in changes.items():
+            if obj is not None and pk not in self.base:
+                yield pk
+
+    def __len__(self) -> int:
+        return self._len
+
+    def values(self) -> ValuesView[T]:
+        return _LayeredValues(self)
+
+    def _iter_values(self) -> Iterator[T]:
+        changes, base = self.changes, self.base
+        # ключи и значения словаря (и снимка) обходятся в одном порядке
+        for pk, obj in zip(base, base.values()):
+            if pk not in changes:
+                yield obj
+            elif changes[pk] is not None:
+                yield changes[pk]  # type: ignore[misc]
+        for pk, changed in changes.items():
+            if changed is not None and pk not in base:
+                yield changed
+
+    def merge(self) -> MutableMapping[int, T]:
+        """ Перенести изменения в base и вернуть его """
+        base = self.base
+        for pk, obj in self.changes.items():
+            if obj is not None:
+                base[pk] = obj
+            elif pk in base:
+                del base[pk]
+        return base
+
+
+class _LayeredValues(ValuesView[T]):
+    """ Значения _LayeredContainer без поиска каждого ключа в base """
+    _mapping: _LayeredContainer[T]
+
+    def __iter__(self) -> Iterator[T]:
+        return self._mapping._iter_values()  # pylint: disable=protected-access
@@ -0,0 +1,409 @@
+"""
+Module for repository storing rows in separate tables by period
+(year or month) of a date field
+"""
+
+import sqlite3
+from itertools import chain
+from typing import Any, Iterable, Iterator, Sequence
+
+from pony.orm import ObjectNotFound
+
+from bookkeeper.repository.abstract_repository import T
+from bookkeeper.repository.query import (
+    Between, Condition, Eq, Ge, Gt, In, Le, Lt, Prefix, aggregate_objects,
+    as_condition, compile_exists, compile_select, parse_order_by, query_fields)
+from bookkeeper.repository.raw_sqlite_repository import RawSQLiteRepository
+from bookkeeper.repository.schema import TableSchema
+from bookkeeper.repository.table_repository import checked_columns, inserted_pks
+from bookkeeper.utils import py2sqlite_type_converter
+
+_KEY_LENGTH = {'year': 4, 'month': 7}  # YYYY, YYYY-MM
+_UNDATED = ''  # partition of rows with empty date
+_READ_ONLY_OPERATIONS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class PartitionedRepository(RawSQLiteRepository[T]):
+    """
+    SQLite3 repository keeping rows in one table per period of the date
+    field partition_field (ISO string YYYY-MM-DD): "<table>_2023" for
+    period='year', "<table>_2023-05" for period='month', "<table>_" for
+    rows without date. The table "<table>__pk" hands out primary keys,
+    unique over all partitions, and stores the partition of every pk.
+    A query with a condition on partition_field reads only partitions
+    that may contain matching rows. A query ordered by partition_field
+    with a limit reads partitions one by one in that order and stops
+    when enough rows are found.
+    A partition can be made read-only (set_read_only): writes to it raise
+    PermissionError, and triggers abort them on the database level.
+    The registry of partitions is read by every operation, so partitions
+    created by other repositories on the same database are seen at once.
+    """
+
+    def __init__(self, data_cls: type, table_name: str,
+                 partition_field: str = 'expense_date', period: str = 'year') -> None:
+        if period not in _KEY_LENGTH:
+            raise ValueError(f'unknown period <{period}>, '
+                             f'expected one of {list(_KEY_LENGTH)}')
+        self.partition_field = partition_field
+        self.period = period
+        self._pk_table = f'{table_name}__pk'
+        self._partitions_table = f'{table_name}__partitions'
+        super().__init__(data_cls, table_name)
+        if partition_field not in self.data_cls_fields:
+            raise ValueError(f'unknown field <{partition_field}>')
+
+        self._columns_sql = ', '.join(f'"{f}"' for f in self.columns)
+        self._insert_columns_sql = ', '.join(
+            f'"{f}"' for f in ['pk', *self.data_cls_fields])
+        self._values_sql = ', '.join('?' for _ in self.columns)
+        self._partitions: dict[str, bool] = {}  # partition key -> read-only flag
+        self._load_partitions()
+
+    def _migrate_schema(self, con: sqlite3.Connection) -> None:
+        """
+        Create the pk and partition registry tables, bring existing
+        partition tables to the current model schema
+        """
+        con.execute(f'CREATE TABLE IF NOT EXISTS "{self._pk_table}" '
+                    f'("pk" INTEGER PRIMARY KEY AUTOINCREMENT, '
+                    f'"partition" TEXT NOT NULL)')
+        con.execute(f'CREATE TABLE IF NOT EXISTS "{self._partitions_table}" '
+                    f'("key" TEXT PRIMARY KEY, '
+                    f'"read_only" INTEGER NOT NULL DEFAULT 0)')
+        keys = con.execute(f'SELECT "key" FROM "{self._partitions_table}"').fetchall()
+        for key, in keys:
+            self._partition_schema(key).migrate(con)
+
+    def _partition_schema(self, key: str) -> TableSchema:
+        """ Schema of the table of partition key, its pks come from the pk table """
+        return TableSchema(self.data_cls, self.partition_table(key), autoincrement=False)
+
+    def partition_key(self, value: str | None) -> str:
+        """ Key of the partition for a value of partition_field """
+        return value[:_KEY_LENGTH[self.period]] if value else _UNDATED
+
+    def partition_table(self, key: str) -> str:
+        """ Name of the table of partition key """
+        return f'{self.table}_{key}'
+
+    def partitions(self) -> dict[str, bool]:
+        """ Existing partitions: key -> read-only flag """
+        return dict(sorted(self._load_partitions().items()))
+
+    def set_read_only(self, key: str, read_only: bool = True) -> None:
+        """ Forbid (or allow again) changes of the partition key """
+        if key not in self._load_partitions():
+            raise KeyError(key)
+        table = self.partition_table(key)
+        with self._get_connection() as con:
+            for operation in _READ_ONLY_OPERATIONS:
+                trigger = f'"{table}__read_only_{operation.lower()}"'
+                if read_only:
+                    con.execute(f'CREATE TRIGGER IF NOT EXISTS {trigger} '
+                                f'BEFORE {operation} ON "{table}" '
+                                f"BEGIN SELECT RAISE(ABORT, 'partition is read-only'); "
+                                f'END')
+                else:
+                    con.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+            con.execute(f'UPDATE "{self._partitions_table}" SET "read_only" = ? '
+                        f'WHERE "key" = ?', (int(read_only), key))
+        self._partitions[key] = read_only
+
+    def _load_partitions(self) -> dict[str, bool]:
+        """
+        Read the partition registry, other repositories on the database
+        may have created partitions or changed their flags
+        """
+        rows = self._get_connection().execute(
+            f'SELECT "key", "read_only" FROM "{self._partitions_table}"')
+        self._partitions = {key: bool(read_only) for key, read_only in rows}
+        return self._partitions
+
+    def _check_writable(self, key: str) -> None:
+        if self._partitions.get(key, False):
+            raise PermissionError(f'partition <{key}> is read-only')
+
+    def _create_partition(self, con: sqlite3.Connection, key: str) -> None:
+        """ Create the table of partition key, if it does not exist """
+        if key in self._partitions:
+            return
+        self._partition_schema(key).migrate(con)
+        con.execute(f'INSERT OR IGNORE INTO "{self._partitions_table}" ("key") '
+                    f'VALUES (?)', (key,))
+        self._partitions[key] = False
+
+    def _partition_of(self, pk: int) -> str | None:
+        row = self._get_connection().execute(
+            f'SELECT "partition" FROM "{self._pk_table}" WHERE "pk" = ?',
+            (pk,)).fetchone()
+        return None if row is None else row[0]
+
+    def _insert(self, con: sqlite3.Connection, key: str, objs: list[T]) -> None:
+        """ Insert objects with assigned pks into partition key """
+        self._create_partition(con, key)
+        con.executemany(
+            f'INSERT INTO "{self.partition_table(key)}" ({self._insert_columns_sql}) '
+            f'VALUES ({self._values_sql})',
+            ([obj.pk, *self.codec.encode(obj)] for obj in objs))
+
+    def _group(self, objs: Iterable[T]) -> dict[str, list[T]]:
+        """ Objects by partition key """
+        groups: dict[str, list[T]] = {}
+        for obj in objs:
+            key = self.partition_key(getattr(obj, self.partition_field))
+            groups.setdefault(key, []).append(obj)
+        return groups
+
+    def add(self, obj: T) -> int:
+        return self.add_many([obj])[0]
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        if not objs:
+            return []
+        groups = self._group(objs)
+        self._load_partitions()
+        for key in groups:
+            self._check_writable(key)
+
+        try:
+            with self._get_connection() as con:
+                con.executemany(
+                    f'INSERT INTO "{self._pk_table}" ("partition") VALUES (?)',
+                    ((self.partition_key(getattr(obj, self.partition_field)),)
+                     for obj in objs))
+                pks = inserted_pks(con, len(objs))
+                for obj, pk in zip(objs, pks):
+                    obj.pk = pk
+                for key, group in groups.items():
+                    self._insert(con, key, group)
+        except Exception:
+            for obj in objs:
+                obj.pk = 0
+            self._load_partitions()  # created partitions are rolled back
+            raise
+        return pks
+
+    def get(self, pk: int) -> T | None:
+        key = self._partition_of(pk)
+        if key is None:
+            return None
+        rows = self._select(f'SELECT {self._columns_sql} '
+                            f'FROM "{self.partition_table(key)}" WHERE "pk" = ?', (pk,))
+        return rows[0] if rows else None
+
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | Sequence[str] | None = None,
+                limit: int | None = None, offset: int = 0) -> list[T]:
+        self._check_fields(query_fields(where, order_by))
+        return self._query(where, order_by, limit, offset, None)
+
+    def get_columns(self, fields: Sequence[str],  # pylint: disable=too-many-arguments
+                    where: dict[str, Any] | None = None,
+                    order_by: str | Sequence[str] | None = None,
+                    limit: int | None = None, offset: int = 0) -> list[tuple[Any, ...]]:
+        """ Partitions are chosen as in get_all, only the selected columns are read """
+        self._check_fields({*fields, *query_fields(where, order_by)})
+        return self._query(where, order_by, limit, offset, checked_columns(fields))
+
+    def _query(self, where: dict[str, Any] | None,  # pylint: disable=too-many-arguments
+               order_by: str | Sequence[str] | None, limit: int | None, offset: int,
+               fields: tuple[str, ...] | None) -> list[Any]:
+        """ Objects, or tuples of fields if they are given, from matching partitions """
+        keys = self._matching_partitions((where or {}).get(self.partition_field, None),
+                                         self.partition_field in (where or {}))
+        if not keys:
+            return []
+        order = parse_order_by(order_by)
+        if limit is not None and order and order[0][0] == self.partition_field:
+            return self._get_all_in_order(keys, where, order_by, limit, offset, fields)
+        return self._select_from([self.partition_table(key) for key in keys],
+                                 where, order_by, limit, offset, fields)
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 order_by: str | Sequence[str] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        """
+        Keyset pages over the matching partitions. In the order of
+        partition_field partitions are read one after another.
+        """
+        if batch_size < 1:
+            raise ValueError(f'batch_size must be positive, got {batch_size}')
+        self._check_fields(query_fields(where, order_by))
+        keys = self._matching_partitions((where or {}).get(self.partition_field, None),
+                                         self.partition_field in (where or {}))
+        order = parse_order_by(order_by)
+        if order and order[0][0] == self.partition_field:
+            return chain.from_iterable(
+                self._iter_pages([self.partition_table(key)], where, order_by, batch_size)
+                for key in sorted(keys, reverse=order[0][1]))
+        if not keys:
+            return iter([])
+        return self._iter_pages([self.partition_table(key) for key in sorted(keys)],
+                                where, order_by, batch_size)
+
+    def count(self, where: dict[str, Any] | None = None) -> int:
+        return int(self.aggregate('pk', where=where, functions=('count',))[0][0])
+
+    def exists(self, where: dict[str, Any] | None = None) -> bool:
+        """ Partitions are checked one by one, newest first """
+        self._check_fields(where or ())
+        keys = self._matching_partitions((where or {}).get(self.partition_field, None),
+                                         self.partition_field in (where or {}))
+        return any(self._fetch_value(*compile_exists(self.partition_table(key), where,
+                                                     self.codec.nullable))
+                   for key in sorted(keys, reverse=True))
+
+    def aggregate(self, field: str, by: str | Sequence[str] | None = None,
+                  where: dict[str, Any] | None = None,
+                  functions: Sequence[str] = ('sum',)) -> list[tuple[Any, ...]]:
+        """ One GROUP BY query over the partitions that may contain rows of where """
+        keys = self._matching_partitions((where or {}).get(self.partition_field, None),
+                                         self.partition_field in (where or {}))
+        if not keys:  # the same result as for an empty table
+            return aggregate_objects([], field, by, functions)
+        return self._aggregate([self.partition_table(key) for key in sorted(keys)],
+                               field, by, where, functions)
+
+    def _select_from(self, tables: list[str],  # pylint: disable=too-many-arguments
+                     where: dict[str, Any] | None, order_by: str | Sequence[str] | None,
+                     limit: int | None, offset: int,
+                     fields: tuple[str, ...] | None = None) -> list[Any]:
+        sql, params = compile_select(tables, where, order_by, limit, offset,
+                                     columns=fields or self.columns,
+                                     nullable=self.codec.nullable)
+        params = [py2sqlite_type_converter(p) for p in params]
+        if fields is None:
+            return self._select(sql, params)
+        return self._select_columns(sql, params, fields)
+
+    def _get_all_in_order(self, keys: list[str],  # pylint: disable=too-many-arguments
+                          where: dict[str, Any] | None,
+                          order_by: str | Sequence[str] | None,
+                          limit: int, offset: int,
+                          fields: tuple[str, ...] | None) -> list[Any]:
+        """
+        Query partitions in the order of partition_field and stop when
+        offset + limit rows are found: partitions do not overlap,
+        rows without date go first, as NULL in SQL
+        """
+        desc = parse_order_by(order_by)[0][1]
+        found: list[Any] = []
+        for key in sorted(keys, reverse=desc):
+            found += self._select_from([self.partition_table(key)], where, order_by,
+                                       offset + limit - len(found), 0, fields)
+            if len(found) >= offset + limit:
+                break
+        return found[offset:offset + limit]
+
+    def _matching_partitions(self, cond: Any, has_cond: bool) -> list[str]:
+        """ Keys of partitions that may contain rows satisfying cond """
+        keys = self._load_partitions()
+        if not has_cond:
+            return list(keys)
+        cond = as_condition(cond)
+        return [key for key in keys if _may_match(cond, key)]
+
+    def update(self, obj: T) -> None:
+        if obj.pk != 0 and self._partition_of(obj.pk) is None:
+            raise ObjectNotFound(self.data_cls, (obj.pk,))
+        self.update_many([obj])
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+        moves = []  # (object, old partition, new partition)
+        self._load_partitions()
+        for obj in objs:
+            old = self._partition_of(obj.pk)
+            if old is None:  # no such row, as UPDATE of a missing row
+                continue
+            new = self.partition_key(getattr(obj, self.partition_field))
+            self._check_writable(old)
+            self._check_writable(new)
+            moves.append((obj, old, new))
+
+        assignments = ', '.join(f'"{f}" = ?' for f in self.data_cls_fields)
+        try:
+            with self._get_connection() as con:
+                for obj, old, new in moves:
+                    if old == new:
+                        con.execute(f'UPDATE "{self.partition_table(old)}" '
+                                    f'SET {assignments} WHERE "pk" = ?',
+                                    [*self.codec.encode(obj), obj.pk])
+                        continue
+                    # the date moved the row to another partition
+                    con.execute(f'DELETE FROM "{self.partition_table(old)}" '
+                                f'WHERE "pk" = ?', (obj.pk,))
+                    self._insert(con, new, [obj])
+                    con.execute(f'UPDATE "{self._pk_table}" SET "partition" = ? '
+                                f'WHERE "pk" = ?', (new, obj.pk))
+        except Exception:
+            self._load_partitions()
+            raise
+
+    def delete(self, pk: int) -> None:
+        self.delete_many([pk])
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        located = []
+        self._load_partitions()
+        for pk in pks:
+            key = self._partition_of(pk)
+            if key is not None:
+                self._check_writable(key)
+                located.append((pk, key))
+        with self._get_connection() as con:
+            for pk, key in located:
+                con.execute(f'DELETE FROM "{self.partition_table(key)}" WHERE "pk" = ?',
+                            (pk,))
+                con.execute(f'DELETE FROM "{self._pk_table}" WHERE "pk" = ?', (pk,))
+
+
+def _may_match(cond: Condition, key: str) -> bool:
+    """
+    False if no value of partition key satisfies the condition.
+    Values of the partition are strings starting with key, or empty
+    strings and None for the undated partition.
+    """
+    if key == _UNDATED:
+        check = cond.predicate()
+        return check(None) or check('')
+    if isinstance(cond, In):
+        return any(_may_match(Eq(value), key) for value in cond.values)
+    bounds = _bounds(cond)
+    if bounds is None:
+        return True
+    low, high, high_incl = bounds
+    if not all(isinstance(bound, str | None) for bound in (low, high)):
+        return True
+    if isinstance(cond, Eq) and low is None:
+        return False
+    # values of the partition lie in [key, key + '\uffff')
+    return ((low is None or low < key + '\uffff')
+            and (high is None or high > key or (high_incl and high == key)))
+
+
+def _bounds(cond: Condition) -> tuple[Any, Any, bool] | None:
+    """
+    Lower bound, upper bound and whether the upper bound is included
+    for values satisfying the condition, None bound if it is open.
+    None if the condition type gives no range.
+    """
+    if isinstance(cond, Eq):
+        return cond.value, cond.value, True
+    if isinstance(cond, Gt | Ge):
+        return cond.value, None, True
+    if isinstance(cond, Lt | Le):
+        return None, cond.value, isinstance(cond, Le)
+    if isinstance(cond, Between):
+        return cond.low, cond.high, True
+    if isinstance(cond, Prefix):
+        low, *upper = cond.params()
+        return (low, upper[0], False) if upper else (low, None, True)
+    return None
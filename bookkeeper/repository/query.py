@@ -0,0 +1,621 @@
+"""
+Query conditions for AbstractRepository.get_all
+
+A value in the `where` dict is either a plain value (equality) or one of
+the conditions below:
+    {'amount': Gt(100), 'expense_date': Between('2023-01-01', '2023-01-31'),
+     'category': In([1, 2, 3]), 'comment': Prefix('кафе')}
+
+order_by is a field name or a list of field names, a leading minus
+means descending order: order_by=['-expense_date', '-pk'].
+
+Conditions are compiled either into parametrized SQL (for SQL based
+repositories) or into predicate functions (for in-memory repositories).
+"""
+
+import sys
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import date, timedelta
+from functools import lru_cache
+from operator import attrgetter, itemgetter
+from typing import Any, Callable, ClassVar, Iterable, Sequence
+
+from bookkeeper.utils import NONE_2_INT_CHANGER
+
+_MAX_CHAR = chr(sys.maxunicode)
+_SURROGATES = (0xD800, 0xDFFF)
+
+
+class Condition(ABC):
+    """
+    Condition on a single field.
+    is_range - the condition compares values by order, None never satisfies it
+    """
+    is_range: ClassVar[bool] = False
+
+    @classmethod
+    @abstractmethod
+    def sql(cls, column: str, n_params: int) -> str:
+        """ SQL expression for the column with n_params ? placeholders """
+
+    @abstractmethod
+    def params(self) -> tuple[Any, ...]:
+        """ Values for the placeholders of sql() """
+
+    @abstractmethod
+    def predicate(self) -> Callable[[Any], bool]:
+        """ Python function checking a field value """
+
+    def shape(self) -> tuple[str, int]:
+        """ Key of the SQL text produced by the condition """
+        return type(self).__name__, len(self.params())
+
+
+@dataclass(frozen=True)
+class Eq(Condition):
+    """ field == value """
+    value: Any
+
+    @classmethod
+    def sql(cls, column: str, n_params: int) -> str:
+        return f'{column} = ?'
+
+    def params(self) -> tuple[Any, ...]:
+        return (self.value,)
+
+    def predicate(self) -> Callable[[Any], bool]:
+        value = self.value
+        return lambda x: bool(x == value)
+
+
+@dataclass(frozen=True)
+class Gt(Condition):
+    """ field > value """
+    value: Any
+    is_range = True
+
+    @classmethod
+    def sql(cls, column: str, n_params: int) -> str:
+        return f'{column} > ?'
+
+    def params(self) -> tuple[Any, ...]:
+        return (self.value,)
+
+    def predicate(self) -> Callable[[Any], bool]:
+        value = self.value
+        return lambda x: x is not None and x > value
+
+
+@dataclass(frozen=True)
+class Ge(Condition):
+    """ field >= value """
+    value: Any
+    is_range = True
+
+    @classmethod
+    def sql(cls, column: str, n_params: int) -> str:
+        return f'{column} >= ?'
+
+    def params(self) -> tuple[Any, ...]:
+        return (self.value,)
+
+    def predicate(self) -> Callable[[Any], bool]:
+        value = self.value
+        return lambda x: x is not None and x >= value
+
+
+@dataclass(frozen=True)
+class Lt(Condition):
+    """ field < value """
+    value: Any
+    is_range = True
+
+    @classmethod
+    def sql(cls, column: str, n_params: int) -> str:
+        return f'{column} < ?'
+
+    def params(self) -> tuple[Any, ...]:
+        return (self.value,)
+
+    def predicate(self) -> Callable[[Any], bool]:
+        value = self.value
+        return lambda x: x is not None and x < value
+
+
+@dataclass(frozen=True)
+class Le(Condition):
+    """ field <= value """
+    value: Any
+    is_range = True
+
+    @classmethod
+    def sql(cls, column: str, n_params: int) -> str:
+        return f'{column} <= ?'
+
+    def params(self) -> tuple[Any, ...]:
+        return (self.value,)
+
+    def predicate(self) -> Callable[[Any], bool]:
+        value = self.value
+        return lambda x: x is not None and x <= value
+
+
+@dataclass(frozen=True)
+class Between(Condition):
+    """ low <= field <= high """
+    low: Any
+    high: Any
+    is_range = True
+
+    @classmethod
+    def sql(cls, column: str, n_params: int) -> str:
+        return f'{column} BETWEEN ? AND ?'
+
+    def params(self) -> tuple[Any, ...]:
+        return (self.low, self.high)
+
+    def predicate(self) -> Callable[[Any], bool]:
+        low, high = self.low, self.high
+        return lambda x: x is not None and low <= x <= high
+
+
+@dataclass(frozen=True, init=False)
+class In(Condition):
+    """ field in values """
+    values: tuple[Any, ...]
+
+    def __init__(self, values: Iterable[Any]):
+        object.__setattr__(self, 'values', tuple(values))
+
+    @classmethod
+    def sql(cls, column: str, n_params: int) -> str:
+        return f'{column} IN ({", ".join("?" * n_params)})'
+
+    def params(self) -> tuple[Any, ...]:
+        return self.values
+
+    def predicate(self) -> Callable[[Any], bool]:
+        try:
+            values: Any = frozenset(self.values)
+        except TypeError:  # unhashable values
+            values = self.values
+        return lambda x: x in values
+
+
+@dataclass(frozen=True)
+class Prefix(Condition):
+    """
+    String field starts with prefix.
+    Compiled into a range condition, so that an index on the field is used.
+    """
+    prefix: str
+    is_range = True
+
+    @classmethod
+    def sql(cls, column: str, n_params: int) -> str:
+        if n_params == 1:  # empty prefix
+            return f'{column} >= ?'
+        return f'{column} >= ? AND {column} < ?'
+
+    def params(self) -> tuple[Any, ...]:
+        # the upper bound increments the last character below the maximal
+        # code point, strings after prefix + maximal characters have no bound
+        stem = self.prefix.rstrip(_MAX_CHAR)
+        if not stem:
+            return (self.prefix,)
+        code = ord(stem[-1]) + 1
+        if _SURROGATES[0] <= code <= _SURROGATES[1]:  # not encodable in UTF-8
+            code = _SURROGATES[1] + 1
+        return self.prefix, stem[:-1] + chr(code)
+
+    def predicate(self) -> Callable[[Any], bool]:
+        prefix = self.prefix
+        return lambda x: isinstance(x, str) and x.startswith(prefix)
+
+
+def as_condition(value: Any) -> Condition:
+    """ Plain values in `where` mean equality """
+    return value if isinstance(value, Condition) else Eq(value)
+
+
+def parse_order_by(order_by: str | Sequence[str] | None) -> tuple[tuple[str, bool], ...]:
+    """ Convert order_by into pairs (field, descending) """
+    if order_by is None:
+        return ()
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    return tuple((f[1:], True) if f.startswith('-') else (f, False) for f in order_by)
+
+
+def query_fields(where: dict[str, Any] | None,
+                 order_by: str | Sequence[str] | None) -> set[str]:
+    """ All field names used in a query """
+    fields = set(where or ())
+    fields.update(f for f, _ in parse_order_by(order_by))
+    return fields
+
+
+# shape of a condition: field, condition class name, number of parameters and
+# whether the column is nullable
+Shape = tuple[tuple[str, str, int, bool], ...]
+
+
+def _condition_sql(field: str, kind: str, n_params: int, nullable: bool) -> str:
+    cls = _CONDITIONS[kind]
+    sql = cls.sql(f'"{field}"', n_params)
+    if nullable and cls.is_range:
+        # None is stored as NONE_2_INT_CHANGER, which must not fall into the range
+        sql = f'({sql} AND "{field}" != {NONE_2_INT_CHANGER})'
+    return sql
+
+
+@lru_cache(maxsize=256)
+def _where_template(shape: Shape) -> str:
+    if not shape:
+        return ''
+    return ' WHERE ' + ' AND '.join(_condition_sql(*condition) for condition in shape)
+
+
+def _where_shape(where: dict[str, Any] | None,
+                 nullable: Iterable[str]) -> tuple[Shape, list[Any]]:
+    """ Shape of the conditions and their parameters """
+    nullable = set(nullable)
+    conditions = [(field, as_condition(value)) for field, value in (where or {}).items()]
+    shape = tuple((field, *cond.shape(), field in nullable) for field, cond in conditions)
+    return shape, [p for _, cond in conditions for p in cond.params()]
+
+
+def _compile_where(where: dict[str, Any] | None,
+                   nullable: Iterable[str] = ()) -> tuple[str, list[Any]]:
+    """ WHERE clause (empty without conditions) and its parameters """
+    shape, params = _where_shape(where, nullable)
+    return _where_template(shape), params
+
+
+@lru_cache(maxsize=256)
+def _select_template(tables: tuple[str, ...],  # pylint: disable=too-many-arguments
+                     columns: tuple[str, ...] | None,
+                     shape: Shape,
+                     order: tuple[tuple[str, bool], ...],
+                     has_limit: bool, has_offset: bool, has_after: bool = False) -> str:
+    selected = ', '.join(f'"{col}"' for col in columns) if columns else '*'
+    where = _where_template(shape)
+    if has_after:
+        where += (' AND ' if where else ' WHERE ') + _after_sql(order)
+    if len(tables) > 1 and columns and not {field for field, _ in order} <= set(columns):
+        # ORDER BY of a compound select may use only its result columns
+        union = ' UNION ALL '.join(f'SELECT * FROM "{table}"{where}' for table in tables)
+        sql = f'SELECT {selected} FROM ({union})'
+    else:
+        sql = ' UNION ALL '.join(f'SELECT {selected} FROM "{table}"{where}'
+                                 for table in tables)
+    if order:
+        sql += ' ORDER BY ' + ', '.join(
+            f'"{field}" DESC' if desc else f'"{field}"' for field, desc in order)
+    if has_limit:
+        sql += ' LIMIT ?'
+    if has_offset:
+        sql += (' OFFSET ?' if has_limit else ' LIMIT -1 OFFSET ?')
+    return sql
+
+
+def keyset_order(order_by: str | Sequence[str] | None) -> tuple[tuple[str, bool], ...]:
+    """
+    Pairs (field, descending) of the full row order used by compile_select:
+    order_by followed by pk, so that every row has a unique position
+    """
+    order = parse_order_by(order_by)
+    if 'pk' not in (field for field, _ in order):
+        order += (('pk', False),)
+    return order
+
+
+def keyset_key(obj: Any, order_by: str | Sequence[str] | None) -> tuple[Any, ...]:
+    """ Values of the keyset_order fields of an object, `after` for the next page """
+    return tuple(getattr(obj, field) for field, _ in keyset_order(order_by))
+
+
+@lru_cache(maxsize=256)
+def _after_sql(order: tuple[tuple[str, bool], ...]) -> str:
+    """
+    Condition selecting rows that follow a given key in the order.
+    With one direction it is a row value comparison, which SQLite
+    resolves by an index seek, mixed directions are expanded field by field.
+    """
+    if len({desc for _, desc in order}) == 1:
+        columns = ', '.join(f'"{field}"' for field, _ in order)
+        marks = ', '.join('?' * len(order))
+        return f'({columns}) {"<" if order[0][1] else ">"} ({marks})'
+    (field, desc), rest = order[0], order[1:]
+    return f'("{field}" {"<" if desc else ">"} ? OR "{field}" = ? AND {_after_sql(rest)})'
+
+
+def _after_params(order: tuple[tuple[str, bool], ...], key: Sequence[Any]) -> list[Any]:
+    """ Parameters of _after_sql(order) for the key """
+    if len({desc for _, desc in order}) == 1:
+        return list(key)
+    return [key[0], key[0], *_after_params(order[1:], key[1:])]
+
+
+def compile_select(table: str | Sequence[str],  # pylint: disable=too-many-arguments
+                   where: dict[str, Any] | None = None,
+                   order_by: str | Sequence[str] | None = None,
+                   limit: int | None = None,
+                   offset: int = 0,
+                   columns: Sequence[str] | None = None,
+                   after: Sequence[Any] | None = None,
+                   nullable: Iterable[str] = ()) -> tuple[str, list[Any]]:
+    """
+    Compile a query into a SELECT statement with ? placeholders and
+    a list of parameters. SQL text is cached per query shape: the same
+    fields with the same operators produce the same statement.
+    Rows are ordered by order_by and then by pk.
+    columns - selected columns in this order, all columns by default
+    table - a table name or several tables with the same columns, their
+    rows are combined with UNION ALL before ordering
+    after - keyset_key of the last row of the previous page: only rows
+    following it are selected, pages are read without OFFSET
+    nullable - columns storing None as NONE_2_INT_CHANGER, range
+    conditions on them do not match None, as in compile_predicate
+    """
+    tables = (table,) if isinstance(table, str) else tuple(table)
+    shape, params = _where_shape(where, nullable)
+    order = keyset_order(order_by)
+    sql = _select_template(tables, tuple(columns) if columns else None,
+                           shape, order, limit is not None, offset > 0, after is not None)
+
+    if after is not None:
+        params += _after_params(order, after)
+    params *= len(tables)
+    if limit is not None:
+        params.append(limit)
+    if offset > 0:
+        params.append(offset)
+    return sql, params
+
+
+def compile_count(table: str, where: dict[str, Any] | None = None,
+                  nullable: Iterable[str] = ()) -> tuple[str, list[Any]]:
+    """ SELECT COUNT(*) of rows satisfying the conditions """
+    where_sql, params = _compile_where(where, nullable)
+    return f'SELECT COUNT(*) FROM "{table}"{where_sql}', params
+
+
+def compile_exists(table: str, where: dict[str, Any] | None = None,
+                   nullable: Iterable[str] = ()) -> tuple[str, list[Any]]:
+    """ SELECT EXISTS, stops at the first row satisfying the conditions """
+    where_sql, params = _compile_where(where, nullable)
+    return f'SELECT EXISTS (SELECT 1 FROM "{table}"{where_sql})', params
+
+
+AGGREGATES = ('sum', 'count', 'min', 'max')
+
+# SQL expressions and python functions grouping ISO dates YYYY-MM-DD by period,
+# a week is represented by its Monday
+_PERIOD_SQL = {
+    'day': 'substr({}, 1, 10)',
+    'week': "date({}, '-6 days', 'weekday 1')",
+    'month': 'substr({}, 1, 7)',
+    'year': 'substr({}, 1, 4)',
+}
+
+
+def _week_start(value: Any) -> str | None:
+    try:
+        day = date.fromisoformat(value[:10])
+    except (TypeError, ValueError):
+        return None
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+_PERIOD_FUNCTIONS: dict[str, Callable[[Any], Any]] = {
+    'day': lambda value: value[:10],
+    'week': _week_start,
+    'month': lambda value: value[:7],
+    'year': lambda value: value[:4],
+}
+
+
+def parse_group_by(by: str | Sequence[str] | None) -> tuple[tuple[str, str | None], ...]:
+    """
+    Convert group keys into pairs (field, period). A key is a field name
+    or a date field with period: 'expense_date:month'
+    (periods: day, week, month, year).
+    """
+    if by is None:
+        return ()
+    if isinstance(by, str):
+        by = [by]
+    keys = []
+    for key in by:
+        field, _, period = key.partition(':')
+        if period and period not in _PERIOD_SQL:
+            raise ValueError(f'unknown period <{period}>, '
+                             f'expected one of {list(_PERIOD_SQL)}')
+        keys.append((field, period or None))
+    return tuple(keys)
+
+
+def _check_aggregates(functions: Sequence[str]) -> None:
+    for func in functions:
+        if func not in AGGREGATES:
+            raise ValueError(f'unknown aggregate <{func}>, '
+                             f'expected one of {list(AGGREGATES)}')
+
+
+def compile_aggregate(table: str | Sequence[str],  # pylint: disable=too-many-arguments
+                      field: str,
+                      by: str | Sequence[str] | None = None,
+                      where: dict[str, Any] | None = None,
+                      functions: Sequence[str] = ('sum',),
+                      nullable: Iterable[str] = ()) -> tuple[str, list[Any]]:
+    """
+    Compile an aggregation into a SELECT ... GROUP BY statement. Rows of
+    the result are group values followed by aggregates of field in the
+    order of functions, ordered by group values.
+    nullable - columns storing None as NONE_2_INT_CHANGER, they are
+    read through NULLIF, so that None is skipped as in SQL, and range
+    conditions on them do not match None
+    """
+    _check_aggregates(functions)
+    nullable = set(nullable)
+
+    def column(name: str) -> str:
+        if name in nullable:
+            return f'NULLIF("{name}", {NONE_2_INT_CHANGER})'
+        return f'"{name}"'
+
+    groups = [_PERIOD_SQL[period].format(column(name)) if period else column(name)
+              for name, period in parse_group_by(by)]
+    values = ['COUNT(*)' if func == 'count' else f'{func.upper()}({column(field)})'
+              for func in functions]
+
+    tables = (table,) if isinstance(table, str) else tuple(table)
+    where_sql, params = _compile_where(where, nullable)
+    if len(tables) == 1:
+        source = f'"{tables[0]}"{where_sql}'
+    else:
+        source = '(' + ' UNION ALL '.join(
+            f'SELECT * FROM "{name}"{where_sql}' for name in tables) + ')'
+        params *= len(tables)
+    sql = f'SELECT {", ".join(groups + values)} FROM {source}'
+    if groups:
+        positions = ', '.join(str(i + 1) for i in range(len(groups)))
+        sql += f' GROUP BY {positions} ORDER BY {positions}'
+    return sql, params
+
+
+def aggregate_objects(objs: Iterable[Any], field: str,
+                      by: str | Sequence[str] | None = None,
+                      functions: Sequence[str] = ('sum',)) -> list[tuple[Any, ...]]:
+    """
+    Aggregate objects in one pass, the same way as compile_aggregate:
+    None values of field are skipped by sum, min and max, count counts objects
+    """
+    keys = parse_group_by(by)
+    get_key = attrgetter(*(name for name, _ in keys)) if keys else lambda obj: ()
+    get_value = attrgetter(field)
+    return aggregate_values(((get_key(obj), get_value(obj)) for obj in objs),
+                            keys, functions)
+
+
+def aggregate_values(pairs: Iterable[tuple[Any, Any]],
+                     keys: tuple[tuple[str, str | None], ...],
+                     functions: Sequence[str] = ('sum',)) -> list[tuple[Any, ...]]:
+    """
+    Aggregate pairs (group, value) like aggregate_objects. keys are
+    the group keys parsed by parse_group_by, group is () without keys,
+    the value of the field for one key and a tuple of values for several
+    """
+    _check_aggregates(functions)
+    groups = _accumulate(pairs)
+    if not keys and not groups:  # SQL returns one row for an empty table
+        groups[()] = [0, None, None, None]
+
+    if len(keys) == 1:
+        groups = {(key,): acc for key, acc in groups.items()}
+    if any(period for _, period in keys):
+        groups = _merge_periods(groups, keys)
+
+    slots = {'count': 0, 'sum': 1, 'min': 2, 'max': 3}
+    rows = [(*key, *(acc[slots[func]] for func in functions))
+            for key, acc in groups.items()]
+    for i in reversed(range(len(keys))):
+        rows.sort(key=none_first(itemgetter(i)))
+    return rows
+
+
+def _accumulate(pairs: Iterable[tuple[Any, Any]]) -> dict[Any, list[Any]]:
+    """ Group -> [count, sum, min, max] of values, None values are only counted """
+    groups: dict[Any, list[Any]] = {}
+    for key, value in pairs:
+        acc = groups.get(key)
+        if acc is None:
+            groups[key] = [1, value, value, value]
+            continue
+        acc[0] += 1
+        if value is None:
+            continue
+        if acc[1] is None:
+            acc[1] = acc[2] = acc[3] = value
+            continue
+        acc[1] += value
+        if value < acc[2]:
+            acc[2] = value
+        elif value > acc[3]:
+            acc[3] = value
+    return groups
+
+
+def _merge_periods(groups: dict[Any, list[Any]],
+                   keys: tuple[tuple[str, str | None], ...]) -> dict[Any, list[Any]]:
+    """ Replace dates in group keys by periods and merge groups of one period """
+    periods = [_PERIOD_FUNCTIONS[period] if period else None for _, period in keys]
+    merged: dict[Any, list[Any]] = {}
+    for key, acc in groups.items():
+        key = tuple(value if period is None or value is None else period(value)
+                    for value, period in zip(key, periods))
+        total = merged.get(key)
+        if total is None:
+            merged[key] = acc
+            continue
+        total[0] += acc[0]
+        if acc[1] is None:
+            continue
+        if total[1] is None:
+            total[1:] = acc[1:]
+            continue
+        total[1] += acc[1]
+        total[2] = min(total[2], acc[2])
+        total[3] = max(total[3], acc[3])
+    return merged
+
+
+_CONDITIONS: dict[str, type[Condition]] = {
+    cls.__name__: cls for cls in (Eq, Gt, Ge, Lt, Le, Between, In, Prefix)
+}
+
+
+def compile_predicate(where: dict[str, Any] | None) -> Callable[[Any], bool]:
+    """ Compile conditions into a single predicate on objects """
+    checks = [(attrgetter(field), as_condition(value).predicate())
+              for field, value in (where or {}).items()]
+    if not checks:
+        return lambda obj: True
+    if len(checks) == 1:
+        (get, check), = checks
+        return lambda obj: check(get(obj))
+    return lambda obj: all(check(get(obj)) for get, check in checks)
+
+
+def order_objects(objs: list[Any], order_by: str | Sequence[str] | None) -> list[Any]:
+    """
+    Sort objects in place like SQL does: None goes first in ascending
+    order and last in descending. Sorting is stable.
+    """
+    for field, desc in reversed(parse_order_by(order_by)):
+        objs.sort(key=none_first(attrgetter(field)), reverse=desc)
+    return objs
+
+
+def none_first(get: Callable[[Any], Any]) -> Callable[[Any], tuple[bool, Any]]:
+    """ Sort key of the value returned by get, None goes before other values """
+    return lambda item: (get(item) is not None, get(item))
+
+
+def slice_objects(objs: list[Any], limit: int | None, offset: int) -> list[Any]:
+    """ Apply limit and offset to a list """
+    if limit is None:
+        return objs[offset:] if offset else objs
+    return objs[offset:offset + limit]
+
+
+def project_objects(objs: Iterable[Any], fields: Sequence[str]) -> list[tuple[Any, ...]]:
+    """ Tuples of values of fields of the objects, in the order of fields """
+    if not fields:
+        raise ValueError('no fields to select')
+    if len(fields) == 1:
+        get_one = attrgetter(fields[0])
+        return [(get_one(obj),) for obj in objs]
+    return list(map(attrgetter(*fields), objs))
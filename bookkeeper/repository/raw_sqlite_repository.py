@@ -0,0 +1,68 @@
+"""
+Module for repository working with sqlite3 database directly,
+without pony ORM
+"""
+
+import sqlite3
+from os import path
+from typing import Any, ClassVar, Sequence
+
+import bookkeeper.repository.databases as my_dbs
+from bookkeeper.repository.abstract_repository import T
+from bookkeeper.repository.schema import TableSchema
+from bookkeeper.repository.sqlite_connection import ConnectionPool, SQLiteTuning
+from bookkeeper.repository.table_repository import RowFactory, TableRepository
+
+
+class RawSQLiteRepository(TableRepository[T]):
+    """
+    SQLite3 repository on the stdlib sqlite3 module.
+    Works with the same database files as SQLiteRepository.
+    Rows are fetched as tuples in the order of dataclass fields and
+    passed to the dataclass constructor by the cursor row factory, SQL
+    statements are fixed strings, so sqlite3 reuses prepared statements
+    from its per-connection cache.
+    Every thread works with its own connection from the pool.
+    """
+    _pool: ClassVar[ConnectionPool | None] = None
+
+    def __init__(self, data_cls: type, table_name: str) -> None:
+        super().__init__(data_cls, table_name)
+        with self._get_connection() as con:
+            self._migrate_schema(con)
+
+    @classmethod
+    def bind_database(cls, db_filename: str = 'database.db',
+                      tuning: SQLiteTuning = SQLiteTuning()) -> None:
+        """
+        Bind repositories to database in file <db_filename>.
+        Relative path is taken from the directory of this module.
+        Existing database file is migrated to the current schema.
+        Connections are configured by the tuning profile.
+        """
+        if db_filename != ':memory:':
+            db_filename = path.join(path.dirname(path.abspath(__file__)), db_filename)
+            my_dbs.migrate_database(db_filename)
+
+        if RawSQLiteRepository._pool is not None:
+            RawSQLiteRepository._pool.close_all()
+        RawSQLiteRepository._pool = ConnectionPool(db_filename, tuning)
+
+    @classmethod
+    def _get_connection(cls) -> sqlite3.Connection:
+        if cls._pool is None:
+            raise RuntimeError('database is not bound, call bind_database first')
+        return cls._pool.connection()
+
+    def _migrate_schema(self, con: sqlite3.Connection) -> None:
+        """ Create the table of the model or bring it to the current model schema """
+        TableSchema(self.data_cls, self.table).migrate(con)
+
+    def _fetch(self, sql: str, params: Sequence[Any],
+               row_factory: RowFactory | None = None) -> list[Any]:
+        cursor = self._get_connection().cursor()
+        cursor.row_factory = row_factory
+        return cursor.execute(sql, params).fetchall()
+
+    def _transaction(self) -> sqlite3.Connection:
+        return self._get_connection()
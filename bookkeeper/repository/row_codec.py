@@ -0,0 +1,114 @@
+"""
+Module with codecs converting model objects into sqlite3 rows and back
+"""
+
+from dataclasses import fields
+from inspect import get_annotations
+from operator import attrgetter
+from types import NoneType, UnionType
+from typing import Any, Callable, Generic, Sequence, get_args
+
+from bookkeeper.repository.abstract_repository import T
+from bookkeeper.utils import NONE_2_INT_CHANGER, py2sqlite_type_converter
+
+# python types stored by sqlite3 as is
+SQL_TYPES = {int: 'INTEGER', float: 'REAL', str: 'TEXT'}
+
+
+class RowCodec(Generic[T]):
+    """
+    Encoder and decoder of one model, built once from the dataclass
+    annotations instead of checking the type of every value.
+    columns - fields stored in the table columns (all fields except pk)
+    fields - all fields in the order of the dataclass constructor
+    nullable - columns of fields which may be None
+    encode(obj) - values of columns for INSERT and UPDATE
+    decode(row) - object from values of fields
+    row_factory - decode as a sqlite3 cursor row factory
+    restore_none(rows, fields) - None back in rows of selected fields
+    None in nullable fields is stored as NONE_2_INT_CHANGER. Values of
+    fields annotated with int, float or str are passed to sqlite3 as is,
+    values of other types are stored by py2sqlite_type_converter.
+    """
+
+    def __init__(self, data_cls: type) -> None:
+        self.data_cls = data_cls
+        self.annotations = get_annotations(data_cls, eval_str=True)
+        self.columns = [f for f in self.annotations if f != 'pk']
+        self.fields = [f.name for f in fields(data_cls)]
+        self.nullable = [f for f in self.columns if _is_nullable(self.annotations[f])]
+        self.encode = self._make_encoder()
+        self.row_factory = self._make_row_factory()
+        row_factory = self.row_factory
+        self.decode: Callable[[Sequence[Any]], T] = lambda row: row_factory(None, row)
+
+    def restore_none(self, rows: list[tuple[Any, ...]],
+                     fields_: Sequence[str]) -> list[tuple[Any, ...]]:
+        """ Replace NONE_2_INT_CHANGER stored for None in nullable fields """
+        nullable = [i for i, f in enumerate(fields_) if f in self.nullable]
+        if not nullable:
+            return rows
+        restored = []
+        for row in rows:
+            if any(row[i] == NONE_2_INT_CHANGER for i in nullable):
+                values = list(row)
+                for i in nullable:
+                    if values[i] == NONE_2_INT_CHANGER:
+                        values[i] = None
+                row = tuple(values)
+            restored.append(row)
+        return restored
+
+    def _make_encoder(self) -> Callable[[T], Sequence[Any]]:
+        get_values = _values_getter(self.columns)
+        converters = [(i, _encode_nullable if _base_type(tp) in SQL_TYPES
+                       else py2sqlite_type_converter)
+                      for i, tp in enumerate(map(self.annotations.get, self.columns))
+                      if _is_nullable(tp) or _base_type(tp) not in SQL_TYPES]
+        if not converters:
+            return get_values
+
+        def encode(obj: T) -> list[Any]:
+            values = list(get_values(obj))
+            for i, convert in converters:
+                values[i] = convert(values[i])
+            return values
+        return encode
+
+    def _make_row_factory(self) -> Callable[[Any, Sequence[Any]], T]:
+        data_cls = self.data_cls
+        nullable = [i for i, f in enumerate(self.fields)
+                    if f != 'pk' and _is_nullable(self.annotations[f])]
+        if not nullable:
+            return lambda cursor, row: data_cls(*row)  # type: ignore[no-any-return]
+
+        def factory(cursor: Any, row: Sequence[Any]) -> T:
+            values = list(row)
+            for i in nullable:
+                if values[i] == NONE_2_INT_CHANGER:
+                    values[i] = None
+            return data_cls(*values)  # type: ignore[no-any-return]
+        return factory
+
+
+def _values_getter(names: Sequence[str]) -> Callable[[Any], tuple[Any, ...]]:
+    """ attrgetter returning a tuple for a single name too """
+    if len(names) > 1:
+        return attrgetter(*names)
+    get_value = attrgetter(names[0])
+    return lambda obj: (get_value(obj),)
+
+
+def _encode_nullable(value: Any) -> Any:
+    return NONE_2_INT_CHANGER if value is None else value
+
+
+def _is_nullable(annotation: Any) -> bool:
+    return isinstance(annotation, UnionType) and NoneType in get_args(annotation)
+
+
+def _base_type(annotation: Any) -> Any:
+    """ int for int | None """
+    if isinstance(annotation, UnionType):
+        return next(arg for arg in get_args(annotation) if arg is not NoneType)
+    return annotation
@@ -0,0 +1,124 @@
+"""
+Module generating sqlite3 tables and indexes from model dataclasses
+
+Indexes are declared in the metadata of dataclass fields:
+    category: int = field(metadata={'index': True})
+    name: str = field(default='', metadata={'unique': True})
+"""
+
+import sqlite3
+from dataclasses import MISSING, Field, dataclass, fields
+from inspect import get_annotations
+from typing import Any
+
+from bookkeeper.repository.row_codec import SQL_TYPES, _base_type, _is_nullable
+from bookkeeper.utils import NONE_2_INT_CHANGER
+
+# prefixes of index names, the same as pony uses
+_INDEX_PREFIX = {False: 'idx', True: 'unq'}
+
+# table recording indexes declared by models, only these indexes are
+# dropped when their fields are no longer declared
+GENERATED_INDEXES = '_generated_indexes'
+
+
+@dataclass(frozen=True)
+class Index:
+    """ Index on a column of a table """
+    table: str
+    column: str
+    unique: bool = False
+
+    @property
+    def name(self) -> str:
+        """ Name of the index in the database """
+        return f'{_INDEX_PREFIX[self.unique]}_{self.table.lower()}__{self.column}'
+
+    def create_sql(self) -> str:
+        """ Statement creating the index if it does not exist """
+        return (f'CREATE {"UNIQUE " if self.unique else ""}INDEX IF NOT EXISTS '
+                f'"{self.name}" ON "{self.table}" ("{self.column}")')
+
+
+class TableSchema:
+    """
+    Table of a model: a column for every dataclass field (pk is the
+    integer primary key) and indexes declared in the field metadata.
+    autoincrement - pk values are never reused, pk of partitions are
+    assigned by their repository, so it is off for them
+    """
+
+    def __init__(self, data_cls: type, table: str, autoincrement: bool = True) -> None:
+        self.table = table
+        self.autoincrement = autoincrement
+        self.fields: dict[str, Field[Any]] = {f.name: f for f in fields(data_cls)
+                                              if f.name != 'pk'}
+        self.annotations = get_annotations(data_cls, eval_str=True)
+        self.columns = {name: SQL_TYPES.get(_base_type(self.annotations[name]), 'TEXT')
+                        for name in self.fields}
+        self.indexes = [Index(table, name, unique=bool(f.metadata.get('unique')))
+                        for name, f in self.fields.items()
+                        if f.metadata.get('index') or f.metadata.get('unique')]
+
+    def create_sql(self) -> list[str]:
+        """ Statements creating the table and its indexes if they do not exist """
+        pk = ('INTEGER PRIMARY KEY AUTOINCREMENT' if self.autoincrement
+              else 'INTEGER PRIMARY KEY')
+        columns = ''.join(f', "{name}" {tp}' for name, tp in self.columns.items())
+        return [f'CREATE TABLE IF NOT EXISTS "{self.table}" ("pk" {pk}{columns})',
+                *(index.create_sql() for index in self.indexes)]
+
+    def migrate(self, con: sqlite3.Connection) -> list[str]:
+        """
+        Bring the table in the database to this schema and return executed
+        statements: a missing table is created, columns of new fields are
+        added with the default value of the field, missing indexes are
+        created and indexes recorded as declared by an earlier schema of
+        the table, but no longer declared, are dropped. Indexes made by
+        hand and columns of removed fields are kept.
+        """
+        con.execute(f'CREATE TABLE IF NOT EXISTS "{GENERATED_INDEXES}" '
+                    f'("name" TEXT PRIMARY KEY, "table" TEXT NOT NULL)')
+        declared = {index.name for index in self.indexes}
+        existing = [row[1] for row in con.execute(f'PRAGMA table_info("{self.table}")')]
+        if not existing:
+            statements = self.create_sql()
+        else:
+            statements = [
+                f'ALTER TABLE "{self.table}" ADD COLUMN "{name}" {tp} '
+                f'DEFAULT {_sql_literal(self._default(name))}'
+                for name, tp in self.columns.items() if name not in existing]
+            indexes = {row[1] for row in
+                       con.execute(f'PRAGMA index_list("{self.table}")')}
+            generated = {row[0] for row in con.execute(
+                f'SELECT "name" FROM "{GENERATED_INDEXES}" WHERE "table" = ?',
+                (self.table,))}
+            statements += [index.create_sql() for index in self.indexes
+                           if index.name not in indexes]
+            statements += [f'DROP INDEX "{name}"'
+                           for name in sorted((generated & indexes) - declared)]
+        for sql in statements:
+            con.execute(sql)
+        con.execute(f'DELETE FROM "{GENERATED_INDEXES}" WHERE "table" = ?',
+                    (self.table,))
+        con.executemany(f'INSERT INTO "{GENERATED_INDEXES}" ("name", "table") '
+                        f'VALUES (?, ?)', ((name, self.table) for name in declared))
+        return statements
+
+    def _default(self, name: str) -> Any:
+        """ Value of a new column in existing rows """
+        default = self.fields[name].default
+        if default is not MISSING:
+            return NONE_2_INT_CHANGER if default is None else default
+        annotation = self.annotations[name]
+        if _is_nullable(annotation):
+            return NONE_2_INT_CHANGER
+        base = _base_type(annotation)
+        return base() if base in SQL_TYPES else ''
+
+
+def _sql_literal(value: Any) -> str:
+    """ Value in SQL text, for DEFAULT of ALTER TABLE which takes no parameters """
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
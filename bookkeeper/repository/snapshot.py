@@ -0,0 +1,358 @@
+"""
+Бинарные снимки репозитория в оперативной памяти
+
+Формат файла (порядок байт платформы, записан в заголовке):
+    b'BKSNAP01'
+    длина заголовка, 8 байт
+    заголовок в JSON: класс объектов, число строк, следующий pk,
+        описание столбцов (поле, тип, смещение и длина данных)
+    данные столбцов, каждый выровнен на 8 байт:
+        pk, int - int64, None записывается как -2**63
+        float - float64, None записывается как NaN
+        str - номера строк пула int32 (-1 для None), смещения строк
+              пула int64 и строки пула в UTF-8 подряд
+
+При чтении файл отображается в память (mmap), столбцы читаются через
+memoryview без копирования, объект строки создается при обращении к нему.
+"""
+
+import dataclasses
+import importlib
+import json
+import math
+import mmap
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from inspect import get_annotations
+from types import NoneType, UnionType
+from typing import (
+    Any, BinaryIO, Iterable, Iterator, MutableMapping, ValuesView, get_args)
+
+from bookkeeper.repository.abstract_repository import T
+
+MAGIC = b'BKSNAP01'
+_CHUNK_ROWS = 4096  # строки декодируются пачками при последовательном обходе
+_CACHED_OBJECTS = 4096  # сколько последних созданных по pk объектов помнить
+_INT_NULL = -2 ** 63
+
+
+def _field_kind(annotation: Any) -> str:
+    """ Тип столбца для аннотации поля: int, float или str """
+    if isinstance(annotation, UnionType):
+        annotation, = (arg for arg in get_args(annotation) if arg is not NoneType)
+    for kind in (int, float, str):
+        if annotation is kind:
+            return kind.__name__
+    raise TypeError(f'unsupported field type <{annotation}>')
+
+
+def _pad(out: BinaryIO, position: int) -> int:
+    """ Дописать нули до границы 8 байт, вернуть новую позицию """
+    padding = -position % 8
+    out.write(b'\0' * padding)
+    return position + padding
+
+
+def write_snapshot(path: str, data_cls: type, objs: Iterable[Any], next_pk: int) -> None:
+    """
+    Записать объекты датакласса data_cls в файл снимка. Снимок пишется
+    во временный файл, который затем атомарно заменяет path: открытый
+    SnapshotReader старого файла продолжает читать прежние данные,
+    при сбое остается старый снимок.
+    """
+    objs = list(objs)
+    annotations = get_annotations(data_cls, eval_str=True)
+    fields = [f.name for f in dataclasses.fields(data_cls)]
+    chunks: list[tuple[str, str, list[bytes]]] = []  # поле, тип, части данных
+    for field in fields:
+        kind = _field_kind(annotations[field])
+        values = [getattr(obj, field) for obj in objs]
+        if kind == 'int':
+            parts = [array('q', (_INT_NULL if v is None else v
+                                 for v in values)).tobytes()]
+        elif kind == 'float':
+            parts = [array('d', (math.nan if v is None else v
+                                 for v in values)).tobytes()]
+        else:
+            codes: dict[str, int] = {}
+            column = array('i', (-1 if v is None else codes.setdefault(v, len(codes))
+                                 for v in values))
+            encoded = [s.encode() for s in codes]
+            offsets = array('q', [0])
+            for s in encoded:
+                offsets.append(offsets[-1] + len(s))
+            parts = [column.tobytes(), offsets.tobytes(), b''.join(encoded)]
+        chunks.append((field, kind, parts))
+
+    columns = []
+    position = 0
+    for field, kind, parts in chunks:
+        sizes = [len(part) for part in parts]
+        columns.append({'field': field, 'kind': kind, 'offset': position, 'sizes': sizes})
+        for size in sizes:
+            position += size + (-size % 8)
+    header = json.dumps({
+        'class': f'{data_cls.__module__}:{data_cls.__qualname__}',
+        'byteorder': sys.byteorder,
+        'rows': len(objs),
+        'next_pk': next_pk,
+        'columns': columns,
+    }).encode()
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as out:
+        out.write(MAGIC)
+        out.write(len(header).to_bytes(8, 'little'))
+        out.write(header)
+        _pad(out, len(MAGIC) + 8 + len(header))
+        for _, _, parts in chunks:
+            for part in parts:
+                out.write(part)
+                _pad(out, len(part))
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, path)
+
+
+class _Column:
+    """ Столбец снимка, значения декодируются при обращении """
+
+    def __init__(self, data: memoryview, kind: str, sizes: list[int], nullable: bool):
+        self.kind = kind
+        self.nullable = nullable
+        self.values: 'memoryview[Any]'  # int или float
+        if kind == 'int':
+            self.values = data[:sizes[0]].cast('q')
+        elif kind == 'float':
+            self.values = data[:sizes[0]].cast('d')
+        else:
+            self.values = data[:sizes[0]].cast('i')
+            offsets_start = sizes[0] + (-sizes[0] % 8)
+            self.offsets = data[offsets_start:offsets_start + sizes[1]].cast('q')
+            blob_start = offsets_start + sizes[1] + (-sizes[1] % 8)
+            self.blob = data[blob_start:blob_start + sizes[2]]
+            self.pool: list[str | None] = [None] * (len(self.offsets) - 1)
+            self.pool_decoded = False
+
+    def release(self) -> None:
+        """ Освободить представления данных файла """
+        self.values.release()
+        if self.kind == 'str':
+            self.offsets.release()
+            self.blob.release()
+
+    def get(self, row: int) -> Any:
+        """ Значение в строке row """
+        value = self.values[row]
+        if self.kind == 'str':
+            if value < 0:
+                return None
+            string = self.pool[value]
+            if string is None:
+                offsets = self.offsets
+                string = str(self.blob[offsets[value]:offsets[value + 1]], 'utf-8')
+                self.pool[value] = string
+            return string
+        if self.nullable and (value == _INT_NULL or value != value):
+            return None
+        return value
+
+    def _decoded_pool(self) -> list[str | None]:
+        """ Все строки пула и None в конце (для номера -1) """
+        if not self.pool_decoded:
+            blob, offsets = self.blob, self.offsets
+            self.pool = [str(blob[offsets[i]:offsets[i + 1]], 'utf-8')
+                         for i in range(len(offsets) - 1)]
+            self.pool.append(None)
+            self.pool_decoded = True
+        return self.pool
+
+    def get_many(self, start: int, stop: int) -> list[Any]:
+        """ Значения строк с start до stop """
+        values = self.values[start:stop].tolist()
+        if self.kind == 'str':
+            return list(map(self._decoded_pool().__getitem__, values))
+        if self.nullable:
+            return [None if v == _INT_NULL or v != v else v for v in values]
+        return values
+
+
+class SnapshotReader:
+    """
+    Снимок, отображенный в память. Строки упорядочены по pk,
+    объект строки создается методом build. Поля передаются в конструктор
+    по порядку объявления, как в конструкторе датакласса.
+    close (или выход из блока with) освобождает отображение файла,
+    после этого строки снимка читать нельзя.
+    """
+
+    def __init__(self, path: str, data_cls: type | None = None) -> None:
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        data = memoryview(self._mmap)
+        if bytes(data[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f'{path} is not a snapshot file')
+        header_size = int.from_bytes(data[len(MAGIC):len(MAGIC) + 8], 'little')
+        header_end = len(MAGIC) + 8 + header_size
+        header = json.loads(bytes(data[len(MAGIC) + 8:header_end]))
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError(f'{path} was written with another byte order')
+
+        self.data_cls: Any = data_cls
+        if data_cls is None:
+            module, qualname = header['class'].split(':')
+            self.data_cls = importlib.import_module(module)
+            for name in qualname.split('.'):
+                self.data_cls = getattr(self.data_cls, name)
+        self.n_rows: int = header['rows']
+        self.next_pk: int = header['next_pk']
+
+        annotations = get_annotations(self.data_cls, eval_str=True)
+        body = data[header_end + (-header_end % 8):]
+        self.fields: list[str] = []
+        self._columns: list[_Column] = []
+        for column in header['columns']:
+            annotation = annotations[column['field']]
+            nullable = (isinstance(annotation, UnionType)
+                        and NoneType in get_args(annotation))
+            self.fields.append(column['field'])
+            self._columns.append(_Column(body[column['offset']:], column['kind'],
+                                         column['sizes'], nullable))
+        self.pks = self._columns[self.fields.index('pk')].values
+
+    def row_of(self, pk: int) -> int | None:
+        """ Номер строки объекта с ключом pk """
+        row = bisect_left(self.pks, pk)
+        if row < self.n_rows and self.pks[row] == pk:
+            return row
+        return None
+
+    def build(self, row: int) -> Any:
+        """ Создать объект строки row """
+        return self.data_cls(*[column.get(row) for column in self._columns])
+
+    def values_many(self, start: int, stop: int) -> Iterator[tuple[Any, ...]]:
+        """ Значения полей строк с start до stop по столбцам сразу """
+        return zip(*(column.get_many(start, stop) for column in self._columns))
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.pks)
+
+    def close(self) -> None:
+        """ Закрыть отображение файла в память """
+        if self._mmap.closed:
+            return
+        for column in self._columns:
+            column.release()
+        self._mmap.close()
+
+    def __enter__(self) -> 'SnapshotReader':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+class SnapshotContainer(MutableMapping[int, T]):
+    """
+    Словарь pk -> объект поверх снимка. Объект строки создается при
+    обращении к нему, последние _CACHED_OBJECTS созданных по pk объектов
+    запоминаются, повторное обращение возвращает тот же объект. Обход
+    values не запоминает создаваемые объекты. Записанные и удаленные
+    объекты хранятся отдельно от снимка.
+    """
+
+    def __init__(self, reader: SnapshotReader) -> None:
+        self._reader = reader
+        self._objects: dict[int, T] = {}  # записанные объекты снимка
+        # созданные по pk объекты, от давних обращений к последним (LRU);
+        # обычный словарь: его копирование при обходе не прерывается потоками
+        self._decoded: dict[int, T] = {}
+        self._deleted: set[int] = set()
+        self._added: dict[int, T] = {}  # объекты с pk вне снимка
+
+    def _in_snapshot(self, pk: int) -> bool:
+        return pk not in self._deleted and self._reader.row_of(pk) is not None
+
+    def __getitem__(self, pk: int) -> T:
+        obj = self._objects.get(pk)
+        if obj is not None:
+            return obj
+        decoded = self._decoded
+        obj = decoded.pop(pk, None)
+        if obj is not None:
+            decoded[pk] = obj  # в конец, как последнее обращение
+            return obj
+        if pk in self._added:
+            return self._added[pk]
+        row = None if pk in self._deleted else self._reader.row_of(pk)
+        if row is None:
+            raise KeyError(pk)
+        obj = decoded[pk] = self._reader.build(row)
+        if len(decoded) > _CACHED_OBJECTS:
+            del decoded[next(iter(decoded))]
+        return obj
+
+    def __contains__(self, pk: object) -> bool:
+        return (pk in self._objects or pk in self._added
+                or isinstance(pk, int) and self._in_snapshot(pk))
+
+    def __setitem__(self, pk: int, obj: T) -> None:
+        if self._in_snapshot(pk):
+            self._objects[pk] = obj
+            self._decoded.pop(pk, None)
+        else:
+            self._added[pk] = obj
+
+    def __delitem__(self, pk: int) -> None:
+        if pk in self._added:
+            del self._added[pk]
+        elif self._in_snapshot(pk):
+            self._deleted.add(pk)
+            self._objects.pop(pk, None)
+            self._decoded.pop(pk, None)
+        else:
+            raise KeyError(pk)
+
+    def __iter__(self) -> Iterator[int]:
+        deleted = self._deleted
+        for pk in self._reader:
+            if pk not in deleted:
+                yield pk
+        yield from self._added
+
+    def __len__(self) -> int:
+        return self._reader.n_rows - len(self._deleted) + len(self._added)
+
+    def values(self) -> ValuesView[T]:
+        return _SnapshotValues(self)
+
+    def _iter_values(self) -> Iterator[T]:
+        """
+        Объекты по порядку строк, без поиска строки по pk. Созданные
+        объекты не запоминаются, иначе полный обход держал бы в памяти
+        все строки снимка
+        """
+        reader, deleted = self._reader, self._deleted
+        # уже созданные объекты, обычным словарем: поиск в нем быстрее
+        known = {**self._decoded, **self._objects}
+        data_cls = reader.data_cls
+        for start in range(0, reader.n_rows, _CHUNK_ROWS):
+            stop = min(start + _CHUNK_ROWS, reader.n_rows)
+            rows = zip(reader.pks[start:stop], reader.values_many(start, stop))
+            for pk, values in rows:
+                if pk in deleted:
+                    continue
+                obj = known.get(pk)
+                yield data_cls(*values) if obj is None else obj
+        yield from self._added.values()
+
+
+class _SnapshotValues(ValuesView[T]):
+    """ Значения SnapshotContainer в порядке строк снимка """
+    _mapping: SnapshotContainer[T]
+
+    def __iter__(self) -> Iterator[T]:
+        return self._mapping._iter_values()  # pylint: disable=protected-access
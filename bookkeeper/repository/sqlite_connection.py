@@ -0,0 +1,84 @@
+"""
+Tuning and pooling of sqlite3 connections
+"""
+
+import sqlite3
+import threading
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class SQLiteTuning:
+    """
+    Connection pragmas. Defaults are tuned for a desktop application:
+    journal_mode -- WAL lets readers work while a writer commits
+    synchronous -- NORMAL is durable in WAL mode except for a power loss
+    cache_size -- page cache, negative value is in KiB
+    mmap_size -- bytes of the database file read through memory mapping
+    temp_store -- MEMORY keeps temporary tables and indexes in memory
+    busy_timeout -- milliseconds to wait for a lock before an error
+    A None value leaves sqlite default of the pragma.
+    """
+    journal_mode: str | None = 'WAL'
+    synchronous: str | None = 'NORMAL'
+    cache_size: int | None = -64_000
+    mmap_size: int | None = 256 * 1024 * 1024
+    temp_store: str | None = 'MEMORY'
+    busy_timeout: int | None = 5_000
+
+    def pragmas(self) -> list[str]:
+        """ PRAGMA statements of the profile """
+        return [f'PRAGMA {name} = {value}'
+                for name, value in vars(self).items() if value is not None]
+
+    def apply(self, con: sqlite3.Connection) -> None:
+        """ Apply the profile to a connection """
+        for pragma in self.pragmas():
+            con.execute(pragma).fetchall()
+
+
+# sqlite defaults: rollback journal, synchronous FULL, default cache
+NO_TUNING = SQLiteTuning(journal_mode=None, synchronous=None, cache_size=None,
+                         mmap_size=None, temp_store=None, busy_timeout=None)
+
+
+class ConnectionPool:
+    """
+    Pool with one connection per thread. Threads do not share connections,
+    so readers and writers in different threads run at the same time
+    (with WAL journal readers are not blocked by a writer).
+    ':memory:' database is opened in shared cache mode to be the same
+    database for all threads.
+    """
+
+    def __init__(self, db_filename: str, tuning: SQLiteTuning = SQLiteTuning()) -> None:
+        self.db_filename = db_filename
+        self.tuning = tuning
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        """ Connection of the current thread """
+        con: sqlite3.Connection | None = getattr(self._local, 'connection', None)
+        if con is None:
+            if self.db_filename == ':memory:':
+                database, uri = f'file:memory{id(self)}?mode=memory&cache=shared', True
+            else:
+                database, uri = self.db_filename, False
+            # check_same_thread=False only to let close_all close it
+            con = sqlite3.connect(database, uri=uri, check_same_thread=False,
+                                  cached_statements=256)
+            self.tuning.apply(con)
+            self._local.connection = con
+            with self._lock:
+                self._connections.append(con)
+        return con
+
+    def close_all(self) -> None:
+        """ Close connections of all threads """
+        with self._lock:
+            connections, self._connections = self._connections, []
+        self._local = threading.local()
+        for con in connections:
+            con.close()
@@ -2,102 +2,86 @@
 Module for repository working with sqlite3 database
 """
 
-from typing import Any
-from inspect import get_annotations
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Iterator, Sequence
+from os import path
+import sqlite3
 
 from pony import orm
 
-from bookkeeper.repository.abstract_repository import AbstractRepository, T
 import bookkeeper.repository.databases as my_dbs
-from bookkeeper.utils import py2sqlite_type_converter
+from bookkeeper.repository.abstract_repository import T
+from bookkeeper.repository.sqlite_connection import SQLiteTuning
+from bookkeeper.repository.table_repository import RowFactory, TableRepository
 
 
-class SQLiteRepository(AbstractRepository[T]):
+class SQLiteRepository(TableRepository[T]):
     """
-    SQLite3 repository
+    SQLite3 repository.
+    Pony describes the tables and manages connections and transactions,
+    rows are converted by the row codec of the model, without pony
+    entities. Queries are run by db.select outside of transactions, so
+    reads do not wait for the pony lock of sqlite write transactions
+    held by other threads. Writes use the cursor of db.get_connection()
+    in a db_session transaction.
     """
+    tuning = SQLiteTuning()  # profile of new connections, set by bind_database
+
     def __init__(self, data_cls: type,
                  table_name: str) -> None:
 
         self.table_cls = my_dbs.DatabaseHelper.get_table_by_name(table_name)
-        self.data_cls = data_cls
-        self.data_cls_fields = get_annotations(self.data_cls, eval_str=True)
-        self.data_cls_fields.pop('pk')
+        super().__init__(data_cls, self.table_cls._table_)
 
     @staticmethod
-    def bind_database(db_filename: str = 'database.db') -> None:
-        """ Bind database to db in file <db_filename> """
+    def bind_database(db_filename: str = 'database.db',
+                      tuning: SQLiteTuning = SQLiteTuning()) -> None:
+        """
+        Bind database to db in file <db_filename>.
+        Relative path is taken from the directory of this module.
+        Existing database file is migrated to the current schema.
+        Every connection is configured by the tuning profile, pony keeps
+        one connection per thread.
+        """
+        if db_filename != ':memory:':
+            db_filename = path.join(path.dirname(path.abspath(__file__)), db_filename)
+            my_dbs.migrate_database(db_filename)
+
+        SQLiteRepository.tuning = tuning
+
         my_dbs.db.bind(provider='sqlite',
                        filename=db_filename,
                        create_db=True)
 
         my_dbs.db.generate_mapping(create_tables=True)
 
-    @orm.db_session
-    def add(self, obj: T) -> int:
-        if getattr(obj, 'pk', None) != 0:
-            raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
-
-        kwargs = {
-            f: py2sqlite_type_converter(getattr(obj, f))
-            for f in self.data_cls_fields.keys()
-        }
-        db_obj = self.table_cls(**kwargs)
-        orm.commit()
-
-        obj.pk = db_obj.pk
-        return obj.pk
-
-    @orm.db_session
-    def get(self, pk: int) -> T | None:
-        try:
-            db_obj = self.table_cls[pk]
-            return self.data_cls(**db_obj.get_data())
-
-        except orm.ObjectNotFound:
-            return None
-
-    @orm.db_session
-    def update(self, obj: T) -> None:
-        if obj.pk == 0:
-            raise ValueError('attempt to update object with unknown primary key')
-
-        db_obj = self.table_cls[obj.pk]
-
-        for field in self.data_cls_fields.keys():
-            setattr(db_obj, field, py2sqlite_type_converter(getattr(obj, field)))
-
-    @orm.db_session
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
-
-        if where is None:  # return all objects from the table
-            db_objs_lst = orm.select(p for p in self.table_cls)[:]
-
-            objs_lst = []
-            for db_obj in db_objs_lst:
-                objs_lst.append(self.data_cls(**db_obj.get_data()))
-
-            return objs_lst
-
-        # return objects accroding to condition
-        attr1, value1 = list(where.items())[0]  # first condition
-        # can not put all conditions inside a query, so use at least one condition
-        db_objs_lst = orm.select(p for p in self.table_cls
-                                 if getattr(p, attr1) == value1)[:]
-        # apply all conditions
-        db_objs_lst = [p for p in db_objs_lst
-                       if all(getattr(p, attr) == value
-                              for (attr, value) in where.items())]
-
-        objs_lst = []
-        for db_obj in db_objs_lst:
-            objs_lst.append(self.data_cls(**db_obj.get_data()))
-
-        return objs_lst
-
-    @orm.db_session
-    def delete(self, pk: int) -> None:
-        try:
-            self.table_cls[pk].delete()
-        except orm.ObjectNotFound:
-            pass
+    def _fetch(self, sql: str, params: Sequence[Any],
+               row_factory: RowFactory | None = None) -> list[Any]:
+        with orm.db_session:
+            rows = my_dbs.db.select(_pony_sql(sql),
+                                    {f'p{i}': value for i, value in enumerate(params)})
+        if row_factory is not None:
+            return [row_factory(None, row) for row in rows]
+        if rows and not isinstance(rows[0], tuple):  # db.select unwraps single columns
+            return [(value,) for value in rows]
+        return [tuple(row) for row in rows]
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Cursor]:
+        with orm.db_session:
+            yield my_dbs.db.get_connection().cursor()
+            orm.commit()
+
+
+@my_dbs.db.on_connect(provider='sqlite')
+def _apply_tuning(_: Any, con: sqlite3.Connection) -> None:
+    """ Hook of pony connections, registered once on import """
+    SQLiteRepository.tuning.apply(con)
+
+
+@lru_cache(maxsize=256)
+def _pony_sql(sql: str) -> str:
+    """ Replace ? placeholders with $p<i> parameters of pony raw queries """
+    first, *parts = sql.replace('$', '$$').split('?')
+    return first + ''.join(f'$p{i}{part}' for i, part in enumerate(parts))
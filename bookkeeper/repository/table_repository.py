@@ -0,0 +1,219 @@
+"""
+Module with the base of repositories keeping objects in a sqlite3 table
+"""
+
+import sqlite3
+from abc import abstractmethod
+from typing import Any, Callable, ContextManager, Iterable, Iterator, Sequence
+
+from pony.orm import ObjectNotFound
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.query import (
+    compile_aggregate, compile_count, compile_exists, compile_select, keyset_key,
+    parse_group_by, query_fields)
+from bookkeeper.repository.row_codec import RowCodec
+from bookkeeper.utils import py2sqlite_type_converter
+
+RowFactory = Callable[[Any, Sequence[Any]], Any]  # sqlite3 cursor row factory
+
+
+class TableRepository(AbstractRepository[T]):
+    """
+    Base of sqlite3 repositories storing a model in one table.
+    SQL statements of the table are built once, rows are converted by
+    the row codec of the model, queries are compiled by the query module.
+    Subclasses provide connections:
+    _fetch(sql, params, row_factory) - rows of a query, reads must not
+    take write locks
+    _transaction() - context manager of a write transaction, gives
+    a sqlite3 connection or cursor, commits on exit
+    """
+
+    def __init__(self, data_cls: type, table_name: str) -> None:
+        self.data_cls = data_cls
+        self.table = table_name
+        self.codec: RowCodec[T] = RowCodec(data_cls)
+        self.data_cls_fields = {f: self.codec.annotations[f] for f in self.codec.columns}
+        self.columns = self.codec.fields  # constructor order
+
+        columns = ', '.join(f'"{f}"' for f in self.data_cls_fields)
+        placeholders = ', '.join('?' for _ in self.data_cls_fields)
+        assignments = ', '.join(f'"{f}" = ?' for f in self.data_cls_fields)
+        selected = ', '.join(f'"{f}"' for f in self.columns)
+        self._insert_sql = (f'INSERT INTO "{table_name}" ({columns}) '
+                            f'VALUES ({placeholders})')
+        self._update_sql = f'UPDATE "{table_name}" SET {assignments} WHERE "pk" = ?'
+        self._delete_sql = f'DELETE FROM "{table_name}" WHERE "pk" = ?'
+        self._get_sql = f'SELECT {selected} FROM "{table_name}" WHERE "pk" = ?'
+
+    @abstractmethod
+    def _fetch(self, sql: str, params: Sequence[Any],
+               row_factory: RowFactory | None = None) -> list[Any]:
+        """ All rows of the query, built by row_factory if it is given """
+
+    @abstractmethod
+    def _transaction(self) -> ContextManager[sqlite3.Connection | sqlite3.Cursor]:
+        """ Write transaction, committed on exit and rolled back on error """
+
+    def _select(self, sql: str, params: Sequence[Any]) -> list[T]:
+        return self._fetch(sql, params, self.codec.row_factory)
+
+    def _select_columns(self, sql: str, params: Sequence[Any],
+                        fields: Sequence[str]) -> list[tuple[Any, ...]]:
+        return self.codec.restore_none(self._fetch(sql, params), fields)
+
+    def _fetch_value(self, sql: str, params: list[Any]) -> Any:
+        """ Single value returned by the query """
+        return self._fetch(sql, [py2sqlite_type_converter(p) for p in params])[0][0]
+
+    def add(self, obj: T) -> int:
+        if getattr(obj, 'pk', None) != 0:
+            raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        with self._transaction() as con:
+            pk = con.execute(self._insert_sql, self.codec.encode(obj)).lastrowid
+        obj.pk = pk  # type: ignore[assignment]
+        return obj.pk
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        if not objs:
+            return []
+
+        with self._transaction() as con:
+            con.executemany(self._insert_sql, map(self.codec.encode, objs))
+            pks = inserted_pks(con, len(objs))
+
+        for obj, pk in zip(objs, pks):
+            obj.pk = pk
+        return pks
+
+    def get(self, pk: int) -> T | None:
+        rows = self._select(self._get_sql, (pk,))
+        return rows[0] if rows else None
+
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | Sequence[str] | None = None,
+                limit: int | None = None, offset: int = 0) -> list[T]:
+        self._check_fields(query_fields(where, order_by))
+        sql, params = compile_select(self.table, where, order_by, limit, offset,
+                                     columns=self.columns, nullable=self.codec.nullable)
+        return self._select(sql, [py2sqlite_type_converter(p) for p in params])
+
+    def get_columns(self, fields: Sequence[str],  # pylint: disable=too-many-arguments
+                    where: dict[str, Any] | None = None,
+                    order_by: str | Sequence[str] | None = None,
+                    limit: int | None = None, offset: int = 0) -> list[tuple[Any, ...]]:
+        """
+        Only the selected columns are read, rows are returned as sqlite3
+        tuples, no data objects are created
+        """
+        self._check_fields({*fields, *query_fields(where, order_by)})
+        sql, params = compile_select(self.table, where, order_by, limit, offset,
+                                     columns=checked_columns(fields),
+                                     nullable=self.codec.nullable)
+        return self._select_columns(sql, [py2sqlite_type_converter(p) for p in params],
+                                    fields)
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 order_by: str | Sequence[str] | None = None,
+                 batch_size: int = 1000) -> Iterator[T]:
+        """
+        Rows are read by pages of batch_size, every page starts after
+        the key of the previous page's last row (keyset pagination),
+        so a page costs an index seek instead of skipping OFFSET rows.
+        Every page is a separate query, no transaction is kept open
+        while the caller processes the rows.
+        """
+        if batch_size < 1:
+            raise ValueError(f'batch_size must be positive, got {batch_size}')
+        self._check_fields(query_fields(where, order_by))
+        return self._iter_pages([self.table], where, order_by, batch_size)
+
+    def _iter_pages(self, tables: list[str], where: dict[str, Any] | None,
+                    order_by: str | Sequence[str] | None,
+                    batch_size: int) -> Iterator[T]:
+        after = None
+        while True:
+            sql, params = compile_select(tables, where, order_by, batch_size,
+                                         columns=self.columns, after=after,
+                                         nullable=self.codec.nullable)
+            page = self._select(sql, [py2sqlite_type_converter(p) for p in params])
+            yield from page
+            if len(page) < batch_size:
+                return
+            after = keyset_key(page[-1], order_by)
+
+    def count(self, where: dict[str, Any] | None = None) -> int:
+        self._check_fields(where or ())
+        sql, params = compile_count(self.table, where, self.codec.nullable)
+        return int(self._fetch_value(sql, params))
+
+    def exists(self, where: dict[str, Any] | None = None) -> bool:
+        self._check_fields(where or ())
+        sql, params = compile_exists(self.table, where, self.codec.nullable)
+        return bool(self._fetch_value(sql, params))
+
+    def aggregate(self, field: str, by: str | Sequence[str] | None = None,
+                  where: dict[str, Any] | None = None,
+                  functions: Sequence[str] = ('sum',)) -> list[tuple[Any, ...]]:
+        """ Aggregation is done by a GROUP BY query in the database """
+        return self._aggregate([self.table], field, by, where, functions)
+
+    def _aggregate(self,  # pylint: disable=too-many-arguments
+                   tables: list[str], field: str,
+                   by: str | Sequence[str] | None, where: dict[str, Any] | None,
+                   functions: Sequence[str]) -> list[tuple[Any, ...]]:
+        self._check_fields({field, *(f for f, _ in parse_group_by(by)), *(where or ())})
+        sql, params = compile_aggregate(tables, field, by, where, functions,
+                                        nullable=self.codec.nullable)
+        return self._fetch(sql, [py2sqlite_type_converter(p) for p in params])
+
+    def _check_fields(self, fields_: Iterable[str]) -> None:
+        """ Raise ValueError if some field is not a column of the table """
+        for field in fields_:
+            if field != 'pk' and field not in self.data_cls_fields:
+                raise ValueError(f'unknown field <{field}>')
+
+    def update(self, obj: T) -> None:
+        if obj.pk == 0:
+            raise ValueError('attempt to update object with unknown primary key')
+        with self._transaction() as con:
+            cursor = con.execute(self._update_sql, [*self.codec.encode(obj), obj.pk])
+            if cursor.rowcount == 0:
+                raise ObjectNotFound(self.data_cls, (obj.pk,))
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+        with self._transaction() as con:
+            con.executemany(self._update_sql,
+                            ([*self.codec.encode(obj), obj.pk] for obj in objs))
+
+    def delete(self, pk: int) -> None:
+        with self._transaction() as con:
+            con.execute(self._delete_sql, (pk,))
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        with self._transaction() as con:
+            con.executemany(self._delete_sql, ((pk,) for pk in pks))
+
+
+def inserted_pks(con: sqlite3.Connection | sqlite3.Cursor, n_rows: int) -> list[int]:
+    """
+    pks of n_rows rows inserted by the last executemany of the connection:
+    rows inserted by one statement inside a transaction get consecutive pks
+    """
+    last_pk = con.execute('SELECT last_insert_rowid()').fetchone()[0]
+    return list(range(last_pk - n_rows + 1, last_pk + 1))
+
+
+def checked_columns(fields: Sequence[str]) -> tuple[str, ...]:
+    """ Selected columns of a projection, ValueError if there are none """
+    if not fields:
+        raise ValueError('no fields to select')
+    return tuple(fields)
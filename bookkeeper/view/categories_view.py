@@ -1,4 +1,5 @@
 """GUI for categories"""
+from bisect import insort
 from typing import Callable
 from PySide6 import QtWidgets, QtCore
 
@@ -57,7 +58,7 @@ class EditCategoriesWindow(QtWidgets.QDialog):
             The first element is considered as a primary key and 
             used in callbacks
         """
-        self.user_data = data
+        self.user_data = list(data)
         self.ctgs_lst = [row[1] for row in data]
 
         self.ctg_lst_widget.clear()
@@ -66,6 +67,23 @@ class EditCategoriesWindow(QtWidgets.QDialog):
         self.del_input.clear()
         self.del_input.addItems(self.ctgs_lst)
 
+    def add_category(self, row: list[str]) -> None:
+        """ Add category row ['pk', 'cat'] to the end of lists"""
+        self.user_data.append(row)
+        self.ctgs_lst.append(row[1])
+        self.ctg_lst_widget.addItem(row[1])
+        self.del_input.addItem(row[1])
+
+    def remove_category(self, pk: str) -> None:
+        """ Remove category with primary key pk from lists"""
+        for i, row in enumerate(self.user_data):
+            if row[0] == pk:
+                del self.user_data[i]
+                del self.ctgs_lst[i]
+                self.ctg_lst_widget.takeItem(i)
+                self.del_input.removeItem(i)
+                return
+
     def _on_clicked_add_button(self) -> None:
         """ Triggers when add button is pressed"""
         if self.add_input.text():
@@ -133,6 +151,18 @@ class MainCategoryWidget(QtWidgets.QWidget):
         if not self.edit_window is None:
             self.edit_window.set_data(data)
 
+    def add_category(self, row: list[str]) -> None:
+        """ Add category row ['pk', 'cat']"""
+        insort(self.user_data, row, key=lambda r: r[1])
+        if not self.edit_window is None:
+            self.edit_window.add_category(row)
+
+    def remove_category(self, pk: str) -> None:
+        """ Remove category with primary key pk"""
+        self.user_data = [row for row in self.user_data if row[0] != pk]
+        if not self.edit_window is None:
+            self.edit_window.remove_category(pk)
+
     def register_add_callback(self, callback: Callable[[str], None]) -> None:
         """ Register callback on adding a new category"""
         self.add_callback = callback
@@ -1,8 +1,7 @@
-import itertools
 from functools import partial
+from typing import Any, Callable
 
 from PySide6 import QtWidgets, QtGui, QtCore
-from typing import Callable
 
 
 class InputExpenseWindow(QtWidgets.QDialog):
@@ -116,9 +115,185 @@ class InputExpenseWindow(QtWidgets.QDialog):
             dlg.exec()
 
 
+class ExpenseTableModel(QtCore.QAbstractTableModel):
+    """
+    Model of expense table. Rows have the same format as user data of
+    MainTableWidget, the first element (primary key) is not displayed.
+    Cells are rendered on demand, with a fetch callback rows are loaded
+    page by page when the view scrolls to the end of loaded rows.
+    The fetch callback either returns the page or returns None and passes
+    the page to append_rows later.
+    Rows are ordered by date and primary key, newest first (see sort_key),
+    add_row, change_row and discard_row keep this order.
+    """
+    headers = ['Дата покупки', 'Сумма, руб.', 'Категория', 'Комментарий']
+
+    def __init__(self, parent: QtCore.QObject | None = None, page_size: int = 200):
+        super().__init__(parent)
+        self.rows: list[list[str]] = []
+        self.page_size = page_size
+        self.fetch_callback: Callable[[int, int], list[list[str]] | None] | None = None
+        self._has_more = False
+        self._fetching = False
+        # counter of row changes, pages fetched before a change are stale
+        self._changes = 0
+        self._fetch_changes = 0
+        self._by_pk: dict[str, list[str]] = {}
+
+    def rowCount(self, parent: Any = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent: Any = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index: Any, role: int = QtCore.Qt.ItemDataRole.DisplayRole) -> Any:
+        if role == QtCore.Qt.ItemDataRole.DisplayRole and index.isValid():
+            return self.rows[index.row()][index.column() + 1]
+        return None
+
+    def headerData(self, section: int, orientation: QtCore.Qt.Orientation,
+                   role: int = QtCore.Qt.ItemDataRole.DisplayRole) -> Any:
+        if (role == QtCore.Qt.ItemDataRole.DisplayRole
+                and orientation == QtCore.Qt.Orientation.Horizontal):
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
+
+    def flags(self, index: Any) -> QtCore.Qt.ItemFlag:
+        return QtCore.Qt.ItemFlag.ItemIsSelectable | QtCore.Qt.ItemFlag.ItemIsEnabled
+
+    def canFetchMore(self, parent: Any = QtCore.QModelIndex()) -> bool:
+        return not parent.isValid() and self._has_more and not self._fetching
+
+    def fetchMore(self, parent: Any = QtCore.QModelIndex()) -> None:
+        if parent.isValid() or self.fetch_callback is None or self._fetching:
+            return
+        self._fetching = True
+        self._fetch_changes = self._changes
+        offset = len(self.rows)
+        page = self.fetch_callback(offset, self.page_size)
+        if page is not None:
+            self.append_rows(offset, page)
+
+    def append_rows(self, offset: int, page: list[list[str]]) -> None:
+        """
+        Add a page fetched from offset. If rows have changed since the page
+        was requested, the page is dropped and requested again.
+        """
+        if not self._fetching:
+            return
+        self._fetching = False
+        if offset != len(self.rows) or self._fetch_changes != self._changes:
+            self.fetchMore()
+            return
+        self._has_more = len(page) == self.page_size
+        if page:
+            self.beginInsertRows(QtCore.QModelIndex(),
+                                 len(self.rows), len(self.rows) + len(page) - 1)
+            self.rows.extend(page)
+            self._by_pk.update((row[0], row) for row in page)
+            self.endInsertRows()
+
+    def set_rows(self, rows: list[list[str]]) -> None:
+        """ Replace all rows, no more rows will be fetched """
+        self.beginResetModel()
+        self.rows = rows
+        self._by_pk = {row[0]: row for row in rows}
+        self._has_more = False
+        self._fetching = False
+        self._changes += 1
+        self.endResetModel()
+
+    def reload(self) -> None:
+        """ Drop loaded rows and fetch the first page """
+        self.beginResetModel()
+        self.rows = []
+        self._by_pk = {}
+        self._has_more = self.fetch_callback is not None
+        self._fetching = False
+        self._changes += 1
+        self.endResetModel()
+        self.fetchMore()
+
+    def insert_row(self, position: int, row: list[str]) -> None:
+        """ Insert row before position """
+        self.beginInsertRows(QtCore.QModelIndex(), position, position)
+        self.rows.insert(position, row)
+        self._by_pk[row[0]] = row
+        self._changes += 1
+        self.endInsertRows()
+
+    def update_row(self, position: int, row: list[str]) -> None:
+        """ Replace row at position """
+        del self._by_pk[self.rows[position][0]]
+        self.rows[position] = row
+        self._by_pk[row[0]] = row
+        self.dataChanged.emit(self.index(position, 0),
+                              self.index(position, len(self.headers) - 1))
+
+    def remove_row(self, position: int) -> None:
+        """ Remove row at position """
+        self.beginRemoveRows(QtCore.QModelIndex(), position, position)
+        del self._by_pk[self.rows[position][0]]
+        del self.rows[position]
+        self._changes += 1
+        self.endRemoveRows()
+
+    @staticmethod
+    def sort_key(row: list[str]) -> tuple[str, str, str, int]:
+        """ Key of row order: date (dd-mm-YYYY) and primary key """
+        row_date = row[1]
+        return row_date[6:10], row_date[3:5], row_date[0:2], int(row[0])
+
+    def _bisect(self, key: tuple[str, str, str, int]) -> int:
+        """ Position of the first row with key not greater than key """
+        low, high = 0, len(self.rows)
+        while low < high:
+            mid = (low + high) // 2
+            if self.sort_key(self.rows[mid]) > key:
+                low = mid + 1
+            else:
+                high = mid
+        return low
+
+    def position_of(self, pk: str) -> int | None:
+        """ Position of loaded row with primary key pk """
+        row = self._by_pk.get(pk)
+        if row is None:
+            return None
+        position = self._bisect(self.sort_key(row))
+        if position < len(self.rows) and self.rows[position] is row:
+            return position
+        return self.rows.index(row)  # rows were set out of order
+
+    def add_row(self, row: list[str]) -> None:
+        """
+        Insert row at its place. A row after the last loaded one
+        is not inserted while there are rows to fetch, it comes with them.
+        """
+        position = self._bisect(self.sort_key(row))
+        if position < len(self.rows) or not self._has_more:
+            self.insert_row(position, row)
+
+    def change_row(self, row: list[str]) -> None:
+        """ Replace row with the same primary key and move it to its place """
+        position = self.position_of(row[0])
+        if position is None:
+            self.add_row(row)
+        elif self.sort_key(self.rows[position]) == self.sort_key(row):
+            self.update_row(position, row)
+        else:
+            self.remove_row(position)
+            self.add_row(row)
+
+    def discard_row(self, pk: str) -> None:
+        """ Remove row with primary key pk if it is loaded """
+        position = self.position_of(pk)
+        if position is not None:
+            self.remove_row(position)
+
+
 class MainTableWidget(QtWidgets.QWidget):
     """ Main widget for displaying expense table"""
-    user_data = list[list[str]]
     update_callback: Callable[[str, dict[str, str]], None]
     remove_callback: Callable[[list[str]], None]
     add_callback: Callable[[dict[str, str]], None]
@@ -127,7 +302,9 @@ class MainTableWidget(QtWidgets.QWidget):
     def __init__(self, parent: QtWidgets.QWidget | None = None):
         super().__init__(parent=parent)
 
-        self.table = QtWidgets.QTableWidget()
+        self.model = ExpenseTableModel(self)
+        self.table = QtWidgets.QTableView()
+        self.table.setModel(self.model)
         self.set_up_table()
         self.input_win = None
 
@@ -154,9 +331,17 @@ class MainTableWidget(QtWidgets.QWidget):
 
         self.setLayout(v_layout)
 
+    @property
+    def user_data(self) -> list[list[str]]:
+        """ Rows loaded into the table """
+        return self.model.rows
+
+    def _selected_rows(self) -> list[int]:
+        """ Numbers of rows with selected cells """
+        return sorted({i.row() for i in self.table.selectionModel().selectedIndexes()})
+
     def _on_clicked_upd_button(self) -> None:
-        idx = self.table.selectedItems()
-        rows = list(set([i.row() for i in idx]))
+        rows = self._selected_rows()
 
         msg_dict = {
             'window_title': 'Редактировать запись',
@@ -177,8 +362,10 @@ class MainTableWidget(QtWidgets.QWidget):
             sel_row = rows[0]
             pk = self.user_data[sel_row][0]
             row_data = {
-                'expense_date': self.user_data[sel_row][1], 'amount': self.user_data[sel_row][2],
-                'category': self.user_data[sel_row][3], 'comment': self.user_data[sel_row][4]
+                'expense_date': self.user_data[sel_row][1],
+                'amount': self.user_data[sel_row][2],
+                'category': self.user_data[sel_row][3],
+                'comment': self.user_data[sel_row][4]
             }
             self.input_win = InputExpenseWindow(
                 self,
@@ -213,8 +400,8 @@ class MainTableWidget(QtWidgets.QWidget):
         self.input_win.show()
 
     def _on_clicked_del_button(self) -> None:
-        idx = self.table.selectedItems()
-        if len(idx) == 0:
+        rows = self._selected_rows()
+        if len(rows) == 0:
             dlg = QtWidgets.QMessageBox(
                 parent=self,
                 icon=QtWidgets.QMessageBox.Information,
@@ -235,7 +422,6 @@ class MainTableWidget(QtWidgets.QWidget):
             answer = dlg.exec()
 
             if answer == QtWidgets.QMessageBox.Yes:
-                rows = set([i.row() for i in idx])
                 pks = [self.user_data[i][0] for i in rows]
                 self.remove_callback(pks)
 
@@ -245,39 +431,54 @@ class MainTableWidget(QtWidgets.QWidget):
     def register_remove_callback(self, callback: Callable[[list[str]], None]) -> None:
         self.remove_callback = callback
 
-    def register_update_callback(self, callback: Callable[[str, dict[str, str]], None]) -> None:
+    def register_update_callback(self,
+                                 callback: Callable[[str, dict[str, str]], None]) -> None:
         self.update_callback = callback
 
     def set_categories(self, cat_data: list[str]) -> None:
         self.cat_data = cat_data
 
+    def register_fetch_callback(
+            self, callback: Callable[[int, int], list[list[str]] | None]) -> None:
+        """
+        Register callback returning rows in user data format,
+        arguments are offset and maximal number of rows.
+        Callback returning None must pass rows to append_rows later.
+        """
+        self.model.fetch_callback = callback
+
+    def append_rows(self, offset: int, rows: list[list[str]]) -> None:
+        """ Add rows requested by the fetch callback from offset """
+        self.model.append_rows(offset, rows)
+
     def set_data(self, user_data: list[list[str]]) -> None:
         """
         Set user data to be displayed.
-        The first element in each row is considered as a primary 
-        and is not displayed. 
-        Primary key is used in callbacks. 
+        The first element in each row is considered as a primary
+        and is not displayed.
+        Primary key is used in callbacks.
         """
-        self.user_data = user_data
-        self.table.setRowCount(len(self.user_data))
+        self.model.set_rows(user_data)
 
-        n_cols = self.table.columnCount()
-        n_rows = self.table.rowCount()
+    def reload_data(self) -> None:
+        """ Load data page by page with the fetch callback """
+        self.model.reload()
 
-        for row, col in itertools.product(range(n_rows), range(n_cols)):
-            item = QtWidgets.QTableWidgetItem(self.user_data[row][col+1])
-            item.setFlags(
-                QtCore.Qt.ItemFlag.ItemIsSelectable |
-                QtCore.Qt.ItemFlag.ItemIsEnabled)
+    def add_row(self, row: list[str]) -> None:
+        """ Show a new row in user data format """
+        self.model.add_row(row)
 
-            self.table.setItem(row, col, item)
+    def update_row(self, row: list[str]) -> None:
+        """ Show changed row in user data format """
+        self.model.change_row(row)
 
-    def set_up_table(self) -> None:
-        my_headers = ['Дата покупки', 'Сумма, руб.', 'Категория', 'Комментарий']
-        self.table.setColumnCount(len(my_headers))
-        self.table.setHorizontalHeaderLabels(my_headers)
+    def remove_rows(self, pks: list[str]) -> None:
+        """ Remove rows with given primary keys """
+        for pk in pks:
+            self.model.discard_row(pk)
 
+    def set_up_table(self) -> None:
         header = self.table.horizontalHeader()
         header.setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.ResizeToContents)
         header.setSectionResizeMode(
-            len(my_headers)-1, QtWidgets.QHeaderView.ResizeMode.Stretch)
+            len(self.model.headers)-1, QtWidgets.QHeaderView.ResizeMode.Stretch)
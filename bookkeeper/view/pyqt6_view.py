@@ -1,6 +1,8 @@
 """ GUI based on PyQt Library"""
 from typing import Callable
 
+from PySide6 import QtWidgets
+
 from bookkeeper.view.expense_table_view import MainTableWidget
 from bookkeeper.view.categories_view import MainCategoryWidget
 from bookkeeper.view.main_window import MainWindow
@@ -33,12 +35,48 @@ class PyQtView():
         as a primary and is not displayed. Primary key is used in callbacks."""
         self.expense_view.set_data(user_data)
 
+    def register_expense_fetch_callback(
+            self, callback: Callable[[int, int], list[list[str]] | None]) -> None:
+        """ Register callback returning expense rows for (offset, limit) or None,
+        in the latter case the rows are passed to append_expense_rows later"""
+        self.expense_view.register_fetch_callback(callback)
+
+    def append_expense_rows(self, offset: int, rows: list[list[str]]) -> None:
+        """ Add expense rows requested by the fetch callback from offset"""
+        self.expense_view.append_rows(offset, rows)
+
+    def reload_expense_data(self) -> None:
+        """ Reload expense rows page by page with the fetch callback"""
+        self.expense_view.reload_data()
+
+    def add_expense_row(self, row: list[str]) -> None:
+        """ Show a new expense row, row format is the same as in set_expense_data"""
+        self.expense_view.add_row(row)
+
+    def update_expense_row(self, row: list[str]) -> None:
+        """ Show changed expense row with the same primary key"""
+        self.expense_view.update_row(row)
+
+    def remove_expense_rows(self, pks: list[str]) -> None:
+        """ Remove expense rows with given primary keys"""
+        self.expense_view.remove_rows(pks)
+
     def set_category_data(self, data: list[list[str]]) -> None:
         """ Data format: [['pk1', 'cat1'], ['pk2', 'cat2']]. The first element 
         is considered as a primary key and used in callbacks"""
         self.category_view.set_data(data)
         self.expense_view.set_categories([row[1] for row in data])
 
+    def add_category_row(self, row: list[str]) -> None:
+        """ Show a new category ['pk', 'cat']"""
+        self.category_view.add_category(row)
+        self.expense_view.set_categories([r[1] for r in self.category_view.user_data])
+
+    def remove_category_row(self, pk: str) -> None:
+        """ Remove category with primary key pk"""
+        self.category_view.remove_category(pk)
+        self.expense_view.set_categories([r[1] for r in self.category_view.user_data])
+
     def register_category_add_callback(self, callback: Callable[[str], None]) -> None:
         """ Register category add callback"""
         self.category_view.register_add_callback(callback)
@@ -62,3 +100,13 @@ class PyQtView():
     def show_main_window(self) -> None:
         """ Show main window"""
         self.window.show()
+
+    def show_error(self, text: str) -> None:
+        """ Show error message"""
+        dlg = QtWidgets.QMessageBox(
+            parent=self.window,
+            icon=QtWidgets.QMessageBox.Icon.Critical,
+            text=text
+        )
+        dlg.setWindowTitle('Ошибка')
+        dlg.exec()
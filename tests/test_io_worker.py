@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+
+from bookkeeper.io_worker import RepositoryWorker
+
+
+@pytest.fixture
+def worker(qtbot):
+    w = RepositoryWorker()
+    yield w
+    w.stop()
+
+
+def finish(qtbot, worker, results, n):
+    worker.wait()
+    qtbot.waitUntil(lambda: len(results) == n)
+
+
+def test_order_and_gui_thread(qtbot, worker):
+    results = []
+    threads = []
+    def callback(x):
+        results.append(x)
+        threads.append(threading.current_thread())
+    for i in range(10):
+        worker.submit(lambda i: (i, threading.current_thread()), i, callback=callback)
+    finish(qtbot, worker, results, 10)
+    assert [r[0] for r in results] == list(range(10))
+    assert all(r[1] is not threading.main_thread() for r in results)
+    assert all(t is threading.main_thread() for t in threads)
+
+
+def test_stale_key(qtbot, worker):
+    results = []
+    started = threading.Event()
+    release = threading.Event()
+    def block():
+        started.set()
+        release.wait()
+    worker.submit(block)
+    started.wait()
+    worker.submit(lambda: 1, callback=results.append, key='page')
+    worker.submit(lambda: 2, callback=results.append, key='page')
+    worker.submit(lambda: 3, callback=results.append)
+    release.set()
+    finish(qtbot, worker, results, 2)
+    assert results == [2, 3]
+
+
+def test_stale_result_dropped(qtbot, worker):
+    results = []
+    worker.submit(lambda: 1, callback=results.append, key='page')
+    worker.wait()
+    worker.submit(lambda: 2, callback=results.append, key='page')
+    finish(qtbot, worker, results, 1)
+    assert results == [2]
+
+
+def test_on_error(qtbot, worker):
+    errors = []
+    worker.submit(lambda: 1 / 0, callback=lambda x: None, on_error=errors.append)
+    finish(qtbot, worker, errors, 1)
+    assert isinstance(errors[0], ZeroDivisionError)
+
+
+def test_errors_without_on_error_go_to_worker_handler(qtbot):
+    errors = []
+    worker = RepositoryWorker(on_error=errors.append)
+    worker.submit(lambda: 1 / 0, callback=lambda x: None)
+    finish(qtbot, worker, errors, 1)
+    worker.stop()
+    assert isinstance(errors[0], ZeroDivisionError)
+
+
+def test_errors_are_logged_by_default(qtbot, worker, caplog):
+    results = []
+    worker.submit(lambda: 1 / 0)
+    worker.submit(lambda: 1, callback=lambda x: [][x])  # failing callback
+    worker.submit(lambda: 2, callback=results.append)
+    finish(qtbot, worker, results, 1)
+    failures = [r for r in caplog.records if r.name == 'bookkeeper.io_worker']
+    assert [type(r.exc_info[1]) for r in failures] == [ZeroDivisionError, IndexError]
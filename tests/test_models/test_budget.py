@@ -1,6 +1,8 @@
 import pytest
 
-from bookkeeper.models.budget import Budget
+from datetime import date
+
+from bookkeeper.models.budget import Budget, SpentTracker
 
 def test_create_with_full_args_list():
     b = Budget(period='День', limit=100, spent=20, pk=1)
@@ -14,4 +16,48 @@ def test_period_values():
         b = Budget(period=period, limit=0, spent=0, pk=1)
     
     with pytest.raises(ValueError):
-        b = Budget(period='Квартал', limit=2, spent=4, pk=1)
\ No newline at end of file
+        b = Budget(period='Квартал', limit=2, spent=4, pk=1)
+
+
+def test_spent_tracker_totals():
+    today = date(2023, 3, 15)  # Wednesday
+    tracker = SpentTracker()
+    tracker.reset([('2023-03-15', 10), ('2023-03-13', 20), ('2023-03-01', 40),
+                   ('2023-03-20', 80), ('2023-02-28', 160)], today)
+    assert tracker.totals(today) == {'День': 10, 'Неделя': 30, 'Месяц': 150}
+
+
+def test_spent_tracker_add_remove():
+    today = date(2023, 3, 15)
+    tracker = SpentTracker()
+    tracker.reset([], today)
+    tracker.add('2023-03-15', 0.1)
+    tracker.add('2023-03-15', 0.2)
+    tracker.add('2022-01-01', 1000)  # out of all periods
+    assert tracker.totals(today) == {'День': 0.3, 'Неделя': 0.3, 'Месяц': 0.3}
+    tracker.remove('2023-03-15', 0.1)
+    tracker.remove('2022-01-01', 1000)
+    assert tracker.totals(today)['День'] == 0.2
+    tracker.remove('2023-03-15', 0.2)
+    assert tracker.totals(today) == {'День': 0, 'Неделя': 0, 'Месяц': 0}
+
+
+def test_spent_tracker_roll_over():
+    tracker = SpentTracker()
+    tracker.reset([('2023-03-31', 10), ('2023-04-01', 20), ('2023-04-03', 40)],
+                  date(2023, 3, 31))
+    assert tracker.totals(date(2023, 3, 31)) == {'День': 10, 'Неделя': 30, 'Месяц': 10}
+    # Saturday, new month
+    assert tracker.totals(date(2023, 4, 1)) == {'День': 20, 'Неделя': 30, 'Месяц': 60}
+    # Monday, new week
+    assert tracker.totals(date(2023, 4, 3)) == {'День': 40, 'Неделя': 40, 'Месяц': 60}
+
+
+def test_spent_tracker_reset_daily():
+    today = date(2023, 3, 15)
+    tracker = SpentTracker()
+    tracker.reset_daily([('2023-02-28', 160, 1), ('2023-03-13', 20, 2),
+                         ('2023-03-15', 10, 2)], today)
+    assert tracker.totals(today) == {'День': 10, 'Неделя': 30, 'Месяц': 30}
+    tracker.remove('2023-03-15', 4)
+    assert tracker.totals(today)['День'] == 6
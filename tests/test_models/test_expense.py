@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 
 import pytest
 
@@ -28,3 +28,8 @@ def test_can_add_to_repo(repo):
     e = Expense(100, 1)
     pk = repo.add(e)
     assert e.pk == pk
+
+
+def test_default_expense_date_is_iso():
+    e = Expense(100, 1)
+    assert e.expense_date == date.today().isoformat()
@@ -18,3 +18,56 @@ def test_can_create_subclass():
 
     t = Test()
     assert isinstance(t, AbstractRepository)
+
+
+def test_batch_methods_use_single_ones():
+    class Test(AbstractRepository):
+        def __init__(self):
+            self.calls = []
+        def add(self, obj):
+            self.calls.append(('add', obj))
+            return obj
+        def get(self, pk): pass
+        def get_all(self, where=None): pass
+        def update(self, obj): self.calls.append(('update', obj))
+        def delete(self, pk): self.calls.append(('delete', pk))
+
+    t = Test()
+    assert t.add_many(iter([1, 2])) == [1, 2]
+    t.update_many([3])
+    t.delete_many([4, 5])
+    assert t.calls == [('add', 1), ('add', 2), ('update', 3),
+                       ('delete', 4), ('delete', 5)]
+
+
+def test_count_and_exists_use_get_all():
+    class Test(AbstractRepository):
+        def add(self, obj): pass
+        def get(self, pk): pass
+        def get_all(self, where=None, order_by=None, limit=None, offset=0):
+            objs = [o for o in [1, 2, 3] if where is None or o in where['in']]
+            return objs[:limit] if limit is not None else objs
+        def update(self, obj): pass
+        def delete(self, pk): pass
+
+    t = Test()
+    assert t.count() == 3
+    assert t.count({'in': [1, 3, 5]}) == 2
+    assert t.exists({'in': [2]})
+    assert not t.exists({'in': [7]})
+
+
+def test_iter_all_uses_get_all():
+    class Test(AbstractRepository):
+        def add(self, obj): pass
+        def get(self, pk): pass
+        def get_all(self, where=None, order_by=None, limit=None, offset=0):
+            return [3, 2, 1] if order_by == '-pk' else [1, 2, 3]
+        def update(self, obj): pass
+        def delete(self, pk): pass
+
+    t = Test()
+    assert list(t.iter_all(order_by='-pk', batch_size=2)) == [3, 2, 1]
+    assert t.get_columns(['real', 'imag'], order_by='-pk') == [(3, 0), (2, 0), (1, 0)]
+    with pytest.raises(ValueError):
+        t.iter_all(batch_size=0)
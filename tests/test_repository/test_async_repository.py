@@ -0,0 +1,152 @@
+from bookkeeper.repository.async_repository import (
+    AsyncAbstractRepository, AsyncMemoryRepository, ExecutorRepository)
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Gt
+
+import asyncio
+import pytest
+
+
+@pytest.fixture
+def custom_class():
+    class Custom():
+        def __init__(self, value=0):
+            self.pk = 0
+            self.value = value
+
+    return Custom
+
+
+@pytest.fixture(params=['native', 'executor'])
+def repo(request):
+    if request.param == 'native':
+        yield AsyncMemoryRepository()
+    else:
+        repo = ExecutorRepository(MemoryRepository(), max_workers=2)
+        yield repo
+        repo.close()
+
+
+def test_cannot_create_abstract_repository():
+    with pytest.raises(TypeError):
+        AsyncAbstractRepository()
+
+
+def test_crud(repo, custom_class):
+    async def run():
+        obj = custom_class()
+        pk = await repo.add(obj)
+        assert obj.pk == pk
+        assert await repo.get(pk) == obj
+        obj2 = custom_class()
+        obj2.pk = pk
+        await repo.update(obj2)
+        assert await repo.get(pk) == obj2
+        await repo.delete(pk)
+        assert await repo.get(pk) is None
+    asyncio.run(run())
+
+
+def test_batch(repo, custom_class):
+    async def run():
+        objs = [custom_class(i) for i in range(5)]
+        pks = await repo.add_many(objs)
+        assert pks == [o.pk for o in objs]
+        assert await repo.get_all({'value': Gt(2)}, order_by='-value') == [objs[4], objs[3]]
+        objs[0].value = 10
+        await repo.update_many(objs[:1])
+        assert await repo.get_all(order_by='-value', limit=1) == [objs[0]]
+        await repo.delete_many(pks[:3])
+        assert await repo.get_all() == objs[3:]
+    asyncio.run(run())
+
+
+def test_concurrent_coroutines(repo, custom_class):
+    async def worker(i):
+        obj = custom_class(i)
+        await repo.add(obj)
+        assert await repo.get(obj.pk) is obj
+        return obj.pk
+
+    async def run():
+        pks = await asyncio.gather(*(worker(i) for i in range(50)))
+        assert sorted(pks) == list(range(1, 51))
+        assert len(await repo.get_all()) == 50
+    asyncio.run(run())
+
+
+def test_queries(repo, custom_class):
+    async def run():
+        objs = [custom_class(i % 3) for i in range(7)]
+        await repo.add_many(objs)
+        assert await repo.count() == 7
+        assert await repo.count({'value': Gt(0)}) == 4
+        assert await repo.exists({'value': 2})
+        assert not await repo.exists({'value': 5})
+        assert await repo.aggregate('value', 'value', functions=('count',)) == \
+            [(0, 3), (1, 2), (2, 2)]
+        assert await repo.get_columns(['pk', 'value'], {'value': 2}) == [(3, 2), (6, 2)]
+        assert [obj async for obj in repo.iter_all(order_by='-value', batch_size=2)] == \
+            await repo.get_all(order_by='-value')
+        with pytest.raises(ValueError):
+            [obj async for obj in repo.iter_all(batch_size=0)]
+    asyncio.run(run())
+
+
+def test_default_queries_use_get_all(custom_class):
+    class OnlyCrud(AsyncAbstractRepository):
+        def __init__(self):
+            self.repo = MemoryRepository()
+
+        async def add(self, obj):
+            return self.repo.add(obj)
+
+        async def get(self, pk):
+            return self.repo.get(pk)
+
+        async def get_all(self, where=None, order_by=None, limit=None, offset=0):
+            return self.repo.get_all(where, order_by, limit, offset)
+
+        async def update(self, obj):
+            self.repo.update(obj)
+
+        async def delete(self, pk):
+            self.repo.delete(pk)
+
+    async def run():
+        repo = OnlyCrud()
+        await repo.add_many(custom_class(i) for i in range(4))
+        assert await repo.count({'value': Gt(1)}) == 2
+        assert await repo.exists()
+        assert await repo.aggregate('value') == [(6,)]
+        assert await repo.get_columns(['value'], order_by='-value', limit=2) == [(3,), (2,)]
+        assert [obj.value async for obj in repo.iter_all()] == [0, 1, 2, 3]
+    asyncio.run(run())
+
+
+def test_executor_iter_all_reads_pages_by_get_all(custom_class):
+    calls = []
+
+    class Recording(MemoryRepository):
+        def get_all(self, where=None, order_by=None, limit=None, offset=0):
+            calls.append((where, limit, offset))
+            return super().get_all(where, order_by, limit, offset)
+
+        def iter_all(self, where=None, order_by=None, batch_size=1000):
+            raise AssertionError('a generator would be resumed in other threads')
+
+    async def run():
+        objs = [custom_class(i % 4) for i in range(7)]
+        await repo.add_many(objs)
+        assert [obj async for obj in repo.iter_all(batch_size=3)] == objs
+        assert calls == [(None, 3, 0), ({'pk': Gt(3)}, 3, 0), ({'pk': Gt(6)}, 3, 0)]
+        found = repo.iter_all({'value': Gt(0)}, order_by='-pk', batch_size=2)
+        assert [obj.pk async for obj in found] == [7, 6, 4, 3, 2]
+        calls.clear()
+        found = repo.iter_all(order_by=['value', 'pk'], batch_size=3)
+        assert [obj.pk async for obj in found] == [1, 5, 2, 6, 3, 7, 4]
+        assert [offset for _, _, offset in calls] == [0, 3, 6]
+
+    repo = ExecutorRepository(Recording(), max_workers=3)
+    asyncio.run(run())
+    repo.close()
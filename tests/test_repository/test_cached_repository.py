@@ -0,0 +1,142 @@
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Gt, In, Lt
+
+import pytest
+
+
+class Custom():
+    def __init__(self, value=0, name=''):
+        self.pk = 0
+        self.value = value
+        self.name = name
+
+
+@pytest.fixture
+def inner():
+    return MemoryRepository()
+
+
+@pytest.fixture
+def repo(inner):
+    return CachedRepository(inner, max_queries=3)
+
+
+def test_crud(repo):
+    obj = Custom()
+    pk = repo.add(obj)
+    assert repo.get(pk) is obj
+    obj2 = Custom(5)
+    obj2.pk = pk
+    repo.update(obj2)
+    assert repo.get(pk) is obj2
+    repo.delete(pk)
+    assert repo.get(pk) is None
+
+
+def test_get_identity_map(repo, inner):
+    obj = Custom()
+    inner.add(obj)
+    assert repo.get(obj.pk) is obj
+    assert (repo.hits, repo.misses) == (0, 1)
+    assert repo.get(obj.pk) is obj
+    assert (repo.hits, repo.misses) == (1, 1)
+
+
+def test_get_all_cached(repo, inner):
+    objs = [Custom(i) for i in range(5)]
+    inner.add_many(objs)
+    assert repo.get_all({'value': Gt(2)}) == objs[3:]
+    assert repo.get_all({'value': Gt(2)}) == objs[3:]
+    assert (repo.hits, repo.misses) == (1, 1)
+    inner.delete(objs[4].pk)  # not through the wrapper
+    assert repo.get_all({'value': Gt(2)}) == objs[3:]
+    # get_all fills the identity map
+    assert repo.get(objs[3].pk) is objs[3]
+    assert repo.hits == 3
+
+
+def test_precise_invalidation(repo):
+    objs = [Custom(i) for i in range(5)]
+    repo.add_many(objs)
+    assert repo.get_all({'value': Gt(2)}) == objs[3:]
+    assert repo.get_all({'value': In([0, 1])}) == objs[:2]
+    repo.misses = 0
+
+    # not matching new row keeps both queries
+    repo.add(Custom(2))
+    assert repo.get_all({'value': Gt(2)}) == objs[3:]
+    assert repo.get_all({'value': In([0, 1])}) == objs[:2]
+    assert repo.misses == 0
+
+    # matching new row invalidates the query
+    new = Custom(10)
+    repo.add(new)
+    assert repo.get_all({'value': Gt(2)}) == objs[3:] + [new]
+    assert repo.get_all({'value': In([0, 1])}) == objs[:2]
+    assert repo.misses == 1
+
+    # row leaving the result
+    objs[3].value = 0
+    repo.update(objs[3])
+    assert repo.get_all({'value': Gt(2)}) == [objs[4], new]
+    assert repo.get_all({'value': In([0, 1])}) == [objs[0], objs[1], objs[3]]
+    assert repo.misses == 3
+
+    repo.delete(objs[0].pk)
+    assert repo.get_all({'value': Gt(2)}) == [objs[4], new]
+    assert repo.get_all({'value': In([0, 1])}) == [objs[1], objs[3]]
+    assert repo.misses == 4
+
+
+def test_offset_queries_dropped_on_change(repo):
+    objs = [Custom(i) for i in range(5)]
+    repo.add_many(objs)
+    assert repo.get_all(order_by='value', offset=2) == objs[2:]
+    repo.delete(objs[0].pk)
+    assert repo.get_all(order_by='value', offset=2) == objs[3:]
+    assert repo.misses == 2
+
+
+def test_lru_eviction(repo):
+    repo.add_many(Custom(i) for i in range(5))
+    for i in range(3):
+        repo.get_all({'value': i})
+    repo.get_all({'value': 0})  # most recently used now
+    repo.get_all({'value': 3})  # evicts value 1
+    repo.hits = repo.misses = 0
+    repo.get_all({'value': 0})
+    repo.get_all({'value': 1})
+    assert (repo.hits, repo.misses) == (1, 1)
+
+
+def test_unhashable_query_not_cached(repo):
+    repo.add(Custom([1]))
+    assert len(repo.get_all({'value': [1]})) == 1
+    assert len(repo.get_all({'value': [1]})) == 1
+    assert repo.misses == 2
+
+
+def test_count_exists_aggregate_delegated(repo, inner):
+    repo.add_many([Custom(1, 'a'), Custom(2, 'a'), Custom(3, 'b')])
+    assert repo.count({'name': 'a'}) == 2
+    assert repo.exists({'value': Gt(2)})
+    assert repo.aggregate('value', 'name', functions=('sum',)) == [('a', 3), ('b', 3)]
+    inner.add(Custom(4, 'b'))  # past the cache
+    assert repo.count() == 4
+
+
+def test_invalidation_agrees_with_sqlite_on_nullable_ranges(tmp_path):
+    from bookkeeper.models.category import Category
+    from bookkeeper.repository.raw_sqlite_repository import RawSQLiteRepository
+    RawSQLiteRepository.bind_database(str(tmp_path / 'cached.db'))
+    inner = RawSQLiteRepository[Category](Category, Category.__name__)
+    repo = CachedRepository(inner)
+    repo.add(Category('b', parent=1))
+    where = {'parent': Lt(5)}
+    assert [c.name for c in repo.get_all(where)] == ['b']
+    repo.add(Category('a', parent=None))
+    assert repo.get_all(where) == inner.get_all(where)
+    repo.add(Category('c', parent=3))
+    assert [c.name for c in repo.get_all(where)] == [c.name for c in inner.get_all(where)] \
+        == ['b', 'c']
@@ -0,0 +1,197 @@
+from bookkeeper.repository.columnar_repository import ColumnarRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Between, Gt, In, Prefix
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.category import Category
+
+from dataclasses import dataclass
+import pytest
+
+
+@pytest.fixture
+def repo():
+    return ColumnarRepository[Expense](Expense)
+
+
+def expenses():
+    return [Expense(amount=float(i), category=i % 3, comment=f'c{i % 4}',
+                    expense_date=f'2023-01-{1 + i % 10:02}') for i in range(20)]
+
+
+def test_crud(repo):
+    obj = Expense(amount=10.5, category=2, expense_date='2023-03-01', comment='abc')
+    pk = repo.add(obj)
+    assert obj.pk == pk
+    got = repo.get(pk)
+    assert got == obj and got is not obj
+    obj2 = Expense(amount=20, category=3, comment='def', pk=pk)
+    repo.update(obj2)
+    assert repo.get(pk) == obj2
+    repo.delete(pk)
+    assert repo.get(pk) is None
+    with pytest.raises(KeyError):
+        repo.delete(pk)
+    with pytest.raises(KeyError):
+        repo.update(obj2)
+
+
+def test_cannot_add_with_pk(repo):
+    with pytest.raises(ValueError):
+        repo.add(Expense(amount=1, category=1, pk=1))
+    with pytest.raises(ValueError):
+        repo.add_many([Expense(amount=1, category=1), Expense(amount=1, category=1, pk=1)])
+    assert len(repo) == 0
+
+
+def test_none_values():
+    repo = ColumnarRepository[Category](Category)
+    parent = Category(name='parent')
+    repo.add(parent)
+    child = Category(name='child', parent=parent.pk)
+    repo.add(child)
+    assert repo.get(parent.pk).parent is None
+    assert repo.get_all({'parent': None}) == [parent]
+    assert repo.get_all({'parent': Gt(0)}) == [child]
+    assert repo.get_all(order_by='-parent') == [child, parent]
+
+
+def test_unsupported_type():
+    @dataclass
+    class WithList:
+        items: list
+        pk: int = 0
+    with pytest.raises(TypeError):
+        ColumnarRepository(WithList)
+
+
+@pytest.mark.parametrize('where, order_by, limit, offset', [
+    (None, None, None, 0),
+    ({'category': 1}, None, None, 0),
+    ({'amount': Between(3, 12), 'comment': In(['c1', 'c2'])}, None, None, 0),
+    ({'expense_date': Prefix('2023-01-1')}, None, None, 0),
+    ({'pk': Gt(15)}, None, None, 0),
+    (None, ['-expense_date', '-pk'], 5, 2),
+    ({'category': In([0, 2])}, ['comment', '-amount'], None, 3),
+])
+def test_same_as_memory_repository(repo, where, order_by, limit, offset):
+    memory = MemoryRepository()
+    memory.add_many(expenses())
+    repo.add_many(expenses())
+    for pk in [2, 5, 11]:
+        memory.delete(pk)
+        repo.delete(pk)
+    assert repo.get_all(where, order_by=order_by, limit=limit, offset=offset) == \
+        memory.get_all(where, order_by=order_by, limit=limit, offset=offset)
+
+
+def test_count_and_exists(repo):
+    assert repo.count() == 0 and not repo.exists()
+    objs = expenses()
+    repo.add_many(objs)
+    repo.delete(objs[0].pk)
+    assert repo.count() == 19
+    assert repo.count({'category': 0}) == 6
+    assert repo.exists({'comment': 'c1', 'category': 1})
+    assert not repo.exists({'comment': 'c9'})
+
+
+def test_compaction(repo):
+    objs = expenses()
+    repo.add_many(objs)
+    for obj in objs[:15]:
+        repo.delete(obj.pk)
+    assert len(repo._pks) < 20
+    assert len(repo) == 5
+    assert repo.get_all() == objs[15:]
+    assert repo.get(objs[16].pk) == objs[16]
+    assert repo.add(Expense(amount=1, category=1)) == 21
+
+
+def test_iter_all(repo):
+    objs = expenses()
+    repo.add_many(objs)
+    assert list(repo.iter_all(order_by=['comment', '-amount'])) == \
+        repo.get_all(order_by=['comment', '-amount'])
+    found = repo.iter_all({'category': 0})
+    assert next(found) == objs[0]
+    for obj in objs[:15]:  # с уплотнением массивов
+        repo.delete(obj.pk)
+    assert list(found) == [objs[15], objs[18]]
+
+
+def test_get_columns(repo):
+    objs = expenses()
+    repo.add_many(objs)
+    memory = MemoryRepository[Expense]()
+    memory.add_many(expenses())
+    for args in [(['pk', 'amount'], {'category': 1}), (['comment'], None, '-amount', 3, 2),
+                 (['expense_date', 'category', 'pk'], {'comment': 'c1'}, 'expense_date')]:
+        assert repo.get_columns(*args) == memory.get_columns(*args)
+    with pytest.raises(ValueError):
+        repo.get_columns(['unknown'])
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def engine(request, monkeypatch):
+    import bookkeeper.repository.columnar_repository as columnar
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(columnar, 'np', None)
+    return request.param
+
+
+def test_aggregates(repo, engine):
+    objs = expenses()
+    repo.add_many(objs)
+    repo.delete(objs[0].pk)
+    assert repo.total('amount') == sum(o.amount for o in objs[1:])
+    assert repo.total('amount', {'category': 1}) == sum(o.amount for o in objs if o.category == 1)
+    assert repo.sum_by('amount', 'category') == {
+        c: sum(o.amount for o in objs[1:] if o.category == c) for c in range(3)}
+    by_comment = repo.sum_by('amount', 'comment', {'expense_date': Prefix('2023-01-0')})
+    assert by_comment == {
+        c: sum(o.amount for o in objs[1:]
+               if o.comment == c and o.expense_date.startswith('2023-01-0'))
+        for c in ['c0', 'c1', 'c2', 'c3']}
+    with pytest.raises(ValueError):
+        repo.total('comment')
+
+
+def test_aggregates_with_none(engine):
+    repo = ColumnarRepository[Category](Category)
+    repo.add_many([Category('a'), Category('b', parent=1), Category('c', parent=1)])
+    assert repo.total('parent') == 2
+    assert repo.sum_by('parent', 'name') == {'b': 1, 'c': 1}
+
+
+@pytest.mark.parametrize('field, by, functions', [
+    ('amount', None, ('sum', 'count', 'min', 'max')),
+    ('amount', 'category', ('sum',)),
+    ('amount', 'comment', ('sum',)),
+    ('amount', ['category', 'expense_date:month'], ('sum', 'count')),
+    ('amount', 'expense_date:week', ('min', 'max')),
+    ('pk', 'category', ('count', 'max')),
+])
+def test_aggregate_same_as_memory_repository(repo, engine, field, by, functions):
+    memory = MemoryRepository[Expense]()
+    for r in (repo, memory):
+        r.add_many(expenses())
+        r.delete(3)
+    where = {'expense_date': Between('2023-01-02', '2023-01-08')}
+    for cond in (None, where):
+        assert repo.aggregate(field, by, cond, functions) == \
+            memory.aggregate(field, by, cond, functions)
+
+
+def test_aggregate_with_none(engine):
+    repo = ColumnarRepository[Category](Category)
+    repo.add_many([Category('a'), Category('b', parent=1), Category('b', parent=2)])
+    assert repo.aggregate('parent', 'name') == [('a', None), ('b', 3)]
+    assert repo.aggregate('pk', 'parent', functions=('count',)) == \
+        [(None, 1), (1, 1), (2, 1)]
+    assert repo.aggregate('parent', 'pk', {'name': 'c'}) == []
+    with pytest.raises(ValueError):
+        repo.aggregate('parent', 'unknown')
+    with pytest.raises(ValueError):
+        repo.aggregate('parent', functions=('avg',))
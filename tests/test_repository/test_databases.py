@@ -0,0 +1,54 @@
+import sqlite3
+
+from bookkeeper.repository.databases import migrate_database, MIGRATIONS
+
+
+def create_old_database(filename):
+    con = sqlite3.connect(filename)
+    con.execute('CREATE TABLE "Expense" ("pk" INTEGER PRIMARY KEY AUTOINCREMENT, '
+                '"amount" REAL NOT NULL, "category" INTEGER NOT NULL, '
+                '"comment" VARCHAR(50) NOT NULL, "added_date" VARCHAR(30) NOT NULL, '
+                '"expense_date" VARCHAR(30) NOT NULL)')
+    con.executemany('INSERT INTO "Expense" ("amount", "category", "comment", '
+                    '"added_date", "expense_date") VALUES (?, ?, ?, ?, ?)',
+                    [(1, 1, '', '01-02-2023 10:00', '01-02-2023'),
+                     (2, 1, '', '01-02-2023 10:00', '31-12-2022')])
+    con.commit()
+    con.close()
+
+
+def get_dates(filename):
+    con = sqlite3.connect(filename)
+    dates = [row[0] for row in con.execute('SELECT "expense_date" FROM "Expense" ORDER BY "pk"')]
+    version = con.execute('PRAGMA user_version').fetchone()[0]
+    con.close()
+    return dates, version
+
+
+def test_migrate_expense_dates(tmp_path):
+    filename = str(tmp_path / 'old.db')
+    create_old_database(filename)
+    migrate_database(filename)
+    assert get_dates(filename) == (['2023-02-01', '2022-12-31'], len(MIGRATIONS))
+
+
+def test_migration_is_applied_once(tmp_path):
+    filename = str(tmp_path / 'old.db')
+    create_old_database(filename)
+    migrate_database(filename)
+
+    con = sqlite3.connect(filename)
+    con.execute('UPDATE "Expense" SET "expense_date" = \'05-05-2025\' WHERE "pk" = 1')
+    con.commit()
+    con.close()
+
+    migrate_database(filename)
+    assert get_dates(filename)[0] == ['05-05-2025', '2022-12-31']
+
+
+def test_new_database_is_up_to_date(tmp_path):
+    filename = str(tmp_path / 'new.db')
+    migrate_database(filename)
+    con = sqlite3.connect(filename)
+    assert con.execute('PRAGMA user_version').fetchone()[0] == len(MIGRATIONS)
+    con.close()
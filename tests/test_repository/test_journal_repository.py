@@ -0,0 +1,224 @@
+from bookkeeper.repository.journal_repository import JournalRepository
+from bookkeeper.repository.query import Ge
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.category import Category
+
+import os
+import threading
+import pytest
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'expenses.log')
+
+
+def expenses(n):
+    return [Expense(amount=float(i), category=i % 3, comment=f'c{i}',
+                    expense_date=f'2023-01-{1 + i % 28:02}') for i in range(n)]
+
+
+def test_crud(path):
+    with JournalRepository[Expense](path, Expense) as repo:
+        obj = Expense(amount=10.5, category=2, comment='abc')
+        pk = repo.add(obj)
+        assert obj.pk == pk
+        assert repo.get(pk) == obj
+        obj2 = Expense(amount=20, category=3, comment='def', pk=pk)
+        repo.update(obj2)
+        assert repo.get(pk) == obj2
+        repo.delete(pk)
+        assert repo.get(pk) is None
+        with pytest.raises(KeyError):
+            repo.delete(pk)
+        with pytest.raises(KeyError):
+            repo.update(obj2)
+        with pytest.raises(ValueError):
+            repo.add(Expense(amount=1, category=1, pk=5))
+
+
+def test_replay_on_open(path):
+    with JournalRepository[Expense](path, Expense, indexes=['category']) as repo:
+        pks = repo.add_many(expenses(10))
+        repo.update(Expense(amount=100, category=2, comment='new', pk=pks[0]))
+        repo.delete_many(pks[5:])
+        state = repo.get_all()
+    with JournalRepository[Expense](path, Expense, indexes=['category']) as repo:
+        assert repo.get_all() == state
+        assert repo.get_all({'category': 2}) == [s for s in state if s.category == 2]
+        assert repo.add(Expense(amount=1, category=1)) == pks[-1] + 1
+
+
+def test_none_values(path):
+    with JournalRepository[Category](path, Category) as repo:
+        parent = Category(name='parent')
+        repo.add(parent)
+        repo.add(Category(name='child', parent=parent.pk))
+    with JournalRepository[Category](path, Category) as repo:
+        assert repo.get_all({'parent': None}) == [parent]
+        assert repo.get_all({'parent': parent.pk})[0].name == 'child'
+
+
+def test_torn_record_is_dropped(path):
+    with JournalRepository[Expense](path, Expense) as repo:
+        repo.add_many(expenses(3))
+    size = os.path.getsize(path)
+    with open(path, 'ab') as file:  # запись, оборванная при сбое
+        file.write(b'\x40\x00\x00\x00\x01\x02\x03\x04["a",[1')
+    with JournalRepository[Expense](path, Expense) as repo:
+        assert len(repo.get_all()) == 3
+        repo.add(Expense(amount=1, category=1))
+    assert os.path.getsize(path) > size
+    with JournalRepository[Expense](path, Expense) as repo:
+        assert len(repo.get_all()) == 4
+
+
+def test_corrupted_record_stops_replay(path):
+    with JournalRepository[Expense](path, Expense) as repo:
+        repo.add_many(expenses(2))
+    with open(path, 'r+b') as file:
+        data = bytearray(file.read())
+        data[-2] ^= 0xff  # последняя запись повреждена
+        file.seek(0)
+        file.write(data)
+    with JournalRepository[Expense](path, Expense) as repo:
+        assert [obj.pk for obj in repo.get_all()] == [1]
+
+
+def test_durable_group_commit(path):
+    with JournalRepository[Expense](path, Expense, durable=True,
+                                    commit_interval=10) as repo:
+        def writer(i):
+            for obj in expenses(20):
+                obj.comment = f'{i}'
+                repo.add(obj)
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        # commit_interval больше таймаута: каждая запись разбудила фиксацию
+        assert not any(thread.is_alive() for thread in threads)
+        with open(path, 'rb') as file:
+            assert len(file.read()) == os.path.getsize(path)
+    with JournalRepository[Expense](path, Expense) as repo:
+        assert len(repo.get_all()) == 80
+
+
+def test_sync(path):
+    repo = JournalRepository[Expense](path, Expense, commit_interval=10)
+    repo.add(Expense(amount=1, category=1))
+    repo.sync()
+    assert os.path.getsize(path) > 0
+    repo.close()
+    repo.close()
+    with pytest.raises(ValueError):
+        repo.add(Expense(amount=1, category=1))
+
+
+def test_compact(path):
+    with JournalRepository[Expense](path, Expense, sorted_indexes=['expense_date']) as repo:
+        pks = repo.add_many(expenses(50))
+        repo.delete(pks[0])
+        repo.compact()
+        assert os.path.exists(repo.snapshot_path)
+        assert os.path.getsize(path) == 0
+        assert not os.path.exists(path + '.old')
+        repo.update(Expense(amount=7, category=1, comment='after', pk=pks[1]))
+        state = repo.get_all()
+    with JournalRepository[Expense](path, Expense, sorted_indexes=['expense_date']) as repo:
+        assert repo.get_all() == state
+        assert repo.get_all({'expense_date': Ge('2023-01-28')}) == [
+            s for s in state if s.expense_date >= '2023-01-28']
+        assert repo.add(Expense(amount=1, category=1)) == pks[-1] + 1
+
+
+def test_background_compaction(path, tmp_path):
+    full_path = str(tmp_path / 'full.log')
+    with JournalRepository[Expense](full_path, Expense) as repo:
+        repo.add_many(expenses(200))
+    with JournalRepository[Expense](path, Expense, compact_size=2000) as repo:
+        for obj in expenses(200):
+            repo.add(obj)
+        state = repo.get_all()
+    assert os.path.exists(path + '.snap')
+    assert os.path.getsize(path) < os.path.getsize(full_path)
+    with JournalRepository[Expense](path, Expense) as repo:
+        assert repo.get_all() == state
+
+
+def test_interrupted_compaction(path):
+    with JournalRepository[Expense](path, Expense) as repo:
+        pks = repo.add_many(expenses(5))
+        repo.compact()
+        repo.delete(pks[0])
+    # сбой после замены снимка, до удаления старого журнала
+    with open(path, 'rb') as file:
+        log = file.read()
+    with open(path + '.old', 'wb') as file:
+        file.write(log)
+    with JournalRepository[Expense](path, Expense) as repo:
+        assert [obj.pk for obj in repo.get_all()] == pks[1:]
+        assert not os.path.exists(path + '.old')
+        assert os.path.getsize(path) == 0
+    with JournalRepository[Expense](path, Expense) as repo:
+        assert [obj.pk for obj in repo.get_all()] == pks[1:]
+
+
+def test_compaction_does_not_decode_snapshot(path):
+    with JournalRepository[Expense](path, Expense) as repo:
+        repo.add_many(expenses(100))
+        repo.compact()
+    with JournalRepository[Expense](path, Expense) as repo:
+        repo.add(Expense(amount=1, category=1))
+        repo.compact()
+        assert repo._memory._container._objects == {}  # строки снимка не созданы
+        assert len(repo.get_all()) == 101
+    with JournalRepository[Expense](path, Expense) as repo:
+        assert len(repo.get_all()) == 101
+
+
+def test_failed_compaction_journal_is_kept(path, monkeypatch):
+    repo = JournalRepository[Expense](path, Expense)
+    # сжатие падает до записи снимка, <path>.old остается
+    monkeypatch.setattr(repo, '_compact', lambda objs, next_pk: None)
+    first = repo.add(Expense(amount=1, category=1))
+    repo.compact()
+    second = repo.add(Expense(amount=2, category=2))
+    repo.compact()
+    assert os.path.exists(path + '.old') and os.path.exists(path + '.old.1')
+    repo.close()
+    with JournalRepository[Expense](path, Expense) as repo:
+        assert [obj.pk for obj in repo.get_all()] == [first, second]
+        assert not os.path.exists(path + '.old')
+
+
+def test_compaction_start_does_not_copy_or_fsync(path, monkeypatch):
+    # под блокировкой только переключается журнал: объекты не копируются,
+    # fsync делают фоновые потоки, время add не зависит от числа строк
+    with JournalRepository[Expense](path, Expense) as repo:
+        repo.add_many(expenses(20000))
+        container = repo._memory._container
+        fsync_threads = []
+        real_fsync = os.fsync
+        monkeypatch.setattr(os, 'fsync', lambda fd: (
+            fsync_threads.append(threading.current_thread()), real_fsync(fd)))
+        release = threading.Event()
+        real_compact = repo._compact
+        monkeypatch.setattr(repo, '_compact', lambda objs, next_pk: (
+            release.wait(), real_compact(objs, next_pk)))
+
+        repo.compact_size = 1  # следующая запись запускает сжатие
+        pk = repo.add(Expense(amount=1, category=1))
+        assert threading.current_thread() not in fsync_threads
+        assert repo._memory._container.base is container
+        repo.update(Expense(amount=2, category=2, pk=pk))
+        release.set()
+        repo._compaction.join()
+        assert repo._memory._container is container
+        assert os.path.getsize(path) > 0 and not os.path.exists(path + '.old')
+        state = repo.get_all()
+    with JournalRepository[Expense](path, Expense) as repo:
+        assert repo.get_all() == state
+        assert repo.get(pk).amount == 2
@@ -1,5 +1,7 @@
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Between, Ge, Gt, Le, Lt, In, Prefix
 
+import os
 import pytest
 
 
@@ -69,3 +71,393 @@ def test_get_all_with_condition(repo, custom_class):
         objects.append(o)
     assert repo.get_all({'name': '0'}) == [objects[0]]
     assert repo.get_all({'test': 'test'}) == objects
+
+
+def test_add_many(repo, custom_class):
+    objects = [custom_class() for i in range(5)]
+    pks = repo.add_many(iter(objects))
+    assert [o.pk for o in objects] == pks
+    assert repo.get_all() == objects
+
+
+def test_cannot_add_many_with_pk(repo, custom_class):
+    objects = [custom_class() for i in range(3)]
+    objects[2].pk = 1
+    with pytest.raises(ValueError):
+        repo.add_many(objects)
+    assert repo.get_all() == []
+
+
+def test_update_many(repo, custom_class):
+    pks = repo.add_many([custom_class() for i in range(3)])
+    new_objects = [custom_class() for i in range(3)]
+    for o, pk in zip(new_objects, pks):
+        o.pk = pk
+    repo.update_many(new_objects)
+    assert repo.get_all() == new_objects
+    with pytest.raises(ValueError):
+        repo.update_many([custom_class()])
+
+
+def test_delete_many(repo, custom_class):
+    objects = [custom_class() for i in range(5)]
+    pks = repo.add_many(objects)
+    repo.delete_many(pks[1:4])
+    assert repo.get_all() == [objects[0], objects[4]]
+
+
+def test_get_all_with_operators(repo, custom_class):
+    objects = []
+    for i in range(10):
+        o = custom_class()
+        o.value = i
+        o.name = f'name{i % 3}'
+        objects.append(o)
+    repo.add_many(objects)
+    assert repo.get_all({'value': Between(2, 4)}) == objects[2:5]
+    assert repo.get_all({'value': Gt(5), 'name': In(['name0', 'name1'])}) == \
+        [objects[6], objects[7], objects[9]]
+    assert repo.get_all({'name': Prefix('name2')}) == objects[2::3]
+
+
+def test_get_all_order_limit_offset(repo, custom_class):
+    objects = []
+    for i in range(10):
+        o = custom_class()
+        o.value = i % 4
+        objects.append(o)
+    repo.add_many(objects)
+    result = repo.get_all(order_by='-value', limit=3, offset=1)
+    assert result == [objects[7], objects[2], objects[6]]
+    assert repo.get_all({'value': Lt(1)}, order_by=['value', '-pk']) == \
+        [objects[8], objects[4], objects[0]]
+    assert repo.get_all(offset=8) == objects[8:]
+
+
+class Indexed():
+    def __init__(self, name, category, pk=0):
+        self.name = name
+        self.category = category
+        self.pk = pk
+
+
+@pytest.fixture
+def indexed_repo():
+    return MemoryRepository(indexes=['name', 'category'])
+
+
+def test_index_lookup(indexed_repo):
+    objs = [Indexed(f'n{i % 3}', i % 2) for i in range(10)]
+    indexed_repo.add_many(objs)
+    assert indexed_repo.get_all({'name': 'n1'}) == objs[1::3]
+    assert indexed_repo.get_all({'name': 'n1', 'category': 0}) == [objs[4]]
+    assert indexed_repo.get_all({'name': In(['n0', 'n2']), 'category': 1}) == \
+        [objs[3], objs[5], objs[9]]
+    assert indexed_repo.get_all({'name': 'n1', 'category': Gt(0)}) == [objs[1], objs[7]]
+    assert indexed_repo.get_all({'name': 'unknown'}) == []
+
+
+def test_count_and_exists(indexed_repo, custom_class):
+    assert indexed_repo.count() == 0
+    assert not indexed_repo.exists()
+    objs = [Indexed(f'n{i % 3}', i % 2) for i in range(10)]
+    indexed_repo.add_many(objs)
+    assert indexed_repo.count() == 10
+    assert indexed_repo.exists()
+    assert indexed_repo.count({'name': 'n1'}) == 3
+    assert indexed_repo.count({'name': 'n1', 'category': 1}) == 2
+    assert indexed_repo.count({'name': In(['n0', 'n2']), 'pk': Gt(5)}) == 4
+    assert indexed_repo.exists({'name': 'n2', 'category': 0})
+    assert not indexed_repo.exists({'name': 'n3'})
+    assert not indexed_repo.exists({'pk': Gt(10)})
+
+
+def test_aggregate(indexed_repo):
+    objs = [Indexed(f'n{i % 3}', i % 2) for i in range(10)]
+    indexed_repo.add_many(objs)
+    assert indexed_repo.aggregate('pk', 'name', {'category': 1}, ('count', 'max')) == [
+        ('n0', 2, 10), ('n1', 2, 8), ('n2', 1, 6)]
+    assert indexed_repo.aggregate('category', ['name', 'category'], {'name': 'n1'},
+                                  ('sum',)) == [('n1', 0, 0), ('n1', 1, 2)]
+
+
+def test_index_follows_update_and_delete(indexed_repo):
+    objs = [Indexed('a', 1), Indexed('b', 1)]
+    indexed_repo.add_many(objs)
+    objs[0].name = 'b'  # changed before update
+    indexed_repo.update(objs[0])
+    assert indexed_repo.get_all({'name': 'a'}) == []
+    assert indexed_repo.get_all({'name': 'b'}) == objs
+    new = Indexed('c', 2, pk=objs[1].pk)
+    indexed_repo.update(new)
+    assert indexed_repo.get_all({'name': 'b'}) == [objs[0]]
+    assert indexed_repo.get_all({'category': 2}) == [new]
+    indexed_repo.delete(objs[0].pk)
+    assert indexed_repo.get_all({'name': 'b'}) == []
+    assert indexed_repo._indexes['name'].buckets == {'c': {new.pk}}
+
+
+def test_index_unhashable_and_missing_values(indexed_repo, custom_class):
+    obj = Indexed(['list'], 1)
+    indexed_repo.add(obj)
+    assert indexed_repo.get_all({'name': ['list']}) == [obj]
+    no_name = custom_class()
+    indexed_repo.add(no_name)
+    # objects without indexed attribute are not met by index lookups
+    assert indexed_repo.get_all({'category': 1}) == [obj]
+    indexed_repo.delete(obj.pk)
+    indexed_repo.delete(no_name.pk)
+    assert indexed_repo.get_all() == []
+
+
+class Row():
+    def __init__(self, date, amount, category=0, pk=0):
+        self.date = date
+        self.amount = amount
+        self.category = category
+        self.pk = pk
+
+
+@pytest.mark.parametrize('where, order_by, limit, offset', [
+    ({'date': Between('2023-01-05', '2023-01-10')}, None, None, 0),
+    ({'amount': Gt(50)}, None, None, 0),
+    ({'amount': Le(20), 'date': Lt('2023-01-03')}, None, None, 0),
+    ({'amount': In([3, 5, None])}, None, None, 0),
+    ({'amount': None}, None, None, 0),
+    ({'date': Prefix('2023-01-1')}, None, None, 0),
+    (None, 'amount', 10, 0),
+    (None, '-amount', 10, 5),
+    (None, ['-date', '-pk'], 7, 3),
+    (None, ['date', '-pk'], None, 0),
+    (None, ['-date', 'pk'], None, 0),
+    ({'category': 1, 'amount': Ge(10)}, '-date', 5, 0),
+    ({'date': Ge('2023-01-15')}, ['-date', '-pk'], 4, 1),
+    ({'amount': Between(10, 30)}, 'amount', None, 2),
+])
+def test_sorted_index_same_as_scan(where, order_by, limit, offset):
+    import random
+    rnd = random.Random(1)
+    plain = MemoryRepository()
+    indexed = MemoryRepository(indexes=['category'], sorted_indexes=['date', 'amount'])
+    for _ in range(200):
+        date = f'2023-01-{rnd.randint(1, 20):02}'
+        amount = rnd.choice([None, rnd.randint(0, 100)])
+        category = rnd.randint(0, 3)
+        plain.add(Row(date, amount, category))
+        indexed.add(Row(date, amount, category))
+    for pk in range(1, 201, 7):
+        obj = indexed.get(pk)
+        obj.amount = rnd.randint(0, 100)  # changed in place before update
+        indexed.update(obj)
+        plain.update(Row(obj.date, obj.amount, obj.category, pk))
+    for pk in range(3, 201, 11):
+        plain.delete(pk)
+        indexed.delete(pk)
+
+    def pks(repo):
+        return [o.pk for o in repo.get_all(where, order_by=order_by,
+                                           limit=limit, offset=offset)]
+    assert pks(indexed) == pks(plain)
+
+
+def test_sorted_index_top_n_does_not_scan(monkeypatch):
+    repo = MemoryRepository(sorted_indexes=['amount'])
+    repo.add_many(Row('2023-01-01', i) for i in range(1000))
+    checked = []
+    import bookkeeper.repository.memory_repository as module
+    def predicate(where):
+        return lambda obj: checked.append(obj) or True
+    monkeypatch.setattr(module, 'compile_predicate', predicate)
+    top = repo.get_all(order_by='-amount', limit=3)
+    assert [o.amount for o in top] == [999, 998, 997]
+    assert len(checked) == 3
+
+
+def test_cannot_index_field_twice():
+    with pytest.raises(ValueError):
+        MemoryRepository(indexes=['a'], sorted_indexes=['a'])
+
+
+def test_snapshot_round_trip(tmp_path):
+    from bookkeeper.models.expense import Expense
+    from bookkeeper.models.category import Category
+    path = str(tmp_path / 'expenses.snap')
+    repo = MemoryRepository()
+    objs = [Expense(amount=i + 0.5, category=i % 3, comment=f'комментарий {i % 2}',
+                    expense_date=f'2023-01-{1 + i:02}') for i in range(10)]
+    repo.add_many(objs)
+    repo.delete(objs[9].pk)
+    repo.save_snapshot(path)
+
+    loaded = MemoryRepository.load_snapshot(path)
+    assert loaded.get_all() == objs[:9]
+    assert loaded.get(objs[3].pk) == objs[3]
+    assert loaded.get(objs[9].pk) is None
+    assert loaded.get_all({'category': 1}, order_by='-amount') == objs[7:0:-3]
+    # pk of deleted object is not reused
+    assert loaded.add(Expense(amount=1, category=1)) == 11
+
+    ctg_path = str(tmp_path / 'categories.snap')
+    ctg_repo = MemoryRepository()
+    ctg_repo.add_many([Category('a'), Category('b', parent=1)])
+    ctg_repo.save_snapshot(ctg_path)
+    assert MemoryRepository.load_snapshot(ctg_path).get_all() == ctg_repo.get_all()
+
+
+def test_snapshot_lazy_changes(tmp_path):
+    from bookkeeper.models.expense import Expense
+    path = str(tmp_path / 'expenses.snap')
+    repo = MemoryRepository()
+    repo.add_many(Expense(amount=float(i), category=i) for i in range(5))
+    repo.save_snapshot(path)
+
+    loaded = MemoryRepository.load_snapshot(path, Expense)
+    assert len(loaded._container._decoded) == 0  # nothing is decoded yet
+    obj = loaded.get(2)
+    assert loaded.get(2) is obj
+    assert len(loaded._container._decoded) == 1
+    # full iteration does not keep decoded objects, live ones are reused
+    all_objs = loaded.get_all()
+    assert all_objs[1] is obj
+    assert len(loaded._container._decoded) == 1
+    obj.amount = 100
+    loaded.update(obj)
+    loaded.delete(3)
+    new = Expense(amount=7, category=7)
+    loaded.add(new)
+    assert [o.pk for o in loaded.get_all()] == [1, 2, 4, 5, 6]
+    assert loaded.get(2).amount == 100
+    with pytest.raises(KeyError):
+        loaded.delete(3)
+
+    # snapshot of loaded repository
+    path2 = str(tmp_path / 'expenses2.snap')
+    loaded.save_snapshot(path2)
+    assert MemoryRepository.load_snapshot(path2).get_all() == loaded.get_all()
+
+
+def test_snapshot_cache_is_bounded(tmp_path, monkeypatch):
+    from bookkeeper.models.expense import Expense
+    from bookkeeper.repository import snapshot
+    monkeypatch.setattr(snapshot, '_CACHED_OBJECTS', 2)
+    path = str(tmp_path / 'expenses.snap')
+    repo = MemoryRepository()
+    repo.add_many(Expense(amount=float(i), category=i) for i in range(5))
+    repo.save_snapshot(path)
+
+    loaded = MemoryRepository.load_snapshot(path, Expense)
+    first = loaded.get(1)
+    loaded.get(2)
+    assert loaded.get(1) is first  # 1 becomes the most recent
+    loaded.get(3)
+    assert list(loaded._container._decoded) == [1, 3]
+    assert loaded.get(1) is first and loaded.get(2) == repo.get(2)
+
+
+def test_snapshot_saved_over_loaded_file(tmp_path):
+    from bookkeeper.models.expense import Expense
+    path = str(tmp_path / 'expenses.snap')
+    repo = MemoryRepository()
+    repo.add_many(Expense(amount=float(i), category=i, comment=f'c{i}') for i in range(2000))
+    repo.save_snapshot(path)
+
+    loaded = MemoryRepository.load_snapshot(path, Expense)
+    loaded.delete_many(range(1, 1901))
+    loaded.save_snapshot(path)  # the file is still mapped by the loaded repository
+    assert MemoryRepository.load_snapshot(path).get_all() == loaded.get_all()
+    assert os.listdir(tmp_path) == ['expenses.snap']
+
+
+def test_snapshot_reader_close(tmp_path):
+    from bookkeeper.models.expense import Expense
+    from bookkeeper.repository.snapshot import SnapshotReader
+    path = str(tmp_path / 'expenses.snap')
+    repo = MemoryRepository()
+    repo.add_many(Expense(amount=float(i), category=i) for i in range(5))
+    repo.save_snapshot(path)
+    with SnapshotReader(path, Expense) as reader:
+        assert reader.build(reader.row_of(3)) == repo.get(3)
+        assert len(list(reader.values_many(0, 5))) == 5
+    with pytest.raises(ValueError):
+        reader.build(0)
+    reader.close()
+
+
+def test_snapshot_with_indexes(tmp_path):
+    from bookkeeper.models.expense import Expense
+    path = str(tmp_path / 'expenses.snap')
+    repo = MemoryRepository()
+    repo.add_many(Expense(amount=float(i), category=i % 2) for i in range(6))
+    repo.save_snapshot(path)
+    loaded = MemoryRepository.load_snapshot(path, indexes=['category'],
+                                            sorted_indexes=['amount'])
+    assert [o.pk for o in loaded.get_all({'category': 0}, order_by='-amount', limit=2)] == [5, 3]
+
+
+def test_snapshot_errors(tmp_path):
+    with pytest.raises(ValueError):
+        MemoryRepository().save_snapshot(str(tmp_path / 'empty.snap'))
+    path = tmp_path / 'bad.snap'
+    path.write_bytes(b'not a snapshot file')
+    with pytest.raises(ValueError):
+        MemoryRepository.load_snapshot(str(path))
+
+
+def test_sorted_keys_blocks():
+    import random
+    from bookkeeper.repository.memory_indexes import SortedKeys
+    keys = SortedKeys(load=4)
+    expected = []
+    rnd = random.Random(1)
+    for i in range(300):
+        key = (rnd.randint(0, 50), i)
+        keys.insert(key)
+        expected.append(key)
+        if i % 3 == 0:
+            removed = expected.pop(rnd.randrange(len(expected)))
+            keys.remove(removed)
+    expected.sort()
+    assert len(keys) == len(expected)
+    assert len(keys.blocks) > 1 and all(len(b) <= 8 for b in keys.blocks)
+    assert list(keys.between(keys.start(), keys.end())) == expected
+    start, stop = keys.bisect_left((10,)), keys.bisect_right((20, float('inf')))
+    assert list(keys.between(start, stop)) == [k for k in expected if 10 <= k[0] <= 20]
+    assert list(keys.between(start, stop, reverse=True)) == \
+        [k for k in reversed(expected) if 10 <= k[0] <= 20]
+    for key in expected:
+        keys.remove(key)
+    assert len(keys) == 0 and list(keys.between(keys.start(), keys.end())) == []
+
+
+@pytest.mark.parametrize('from_snapshot', [False, True])
+def test_frozen_values(tmp_path, from_snapshot):
+    from bookkeeper.models.expense import Expense
+    repo = MemoryRepository(indexes=['category'])
+    repo.add_many(Expense(amount=float(i), category=i % 2) for i in range(6))
+    if from_snapshot:
+        path = str(tmp_path / 'expenses.snap')
+        repo.save_snapshot(path)
+        repo = MemoryRepository.load_snapshot(path, indexes=['category'])
+    state = repo.get_all()
+    container = repo._container
+
+    frozen = repo.frozen_values()
+    repo.update(Expense(amount=100, category=1, pk=2))
+    repo.delete(3)
+    new = Expense(amount=7, category=0)
+    repo.add(new)
+    repo.delete(new.pk)
+    repo.add(Expense(amount=8, category=0))
+    with pytest.raises(RuntimeError):
+        repo.frozen_values()
+    assert sorted(frozen, key=lambda o: o.pk) == state
+    current = [o for o in state if o.pk not in (2, 3)] + [
+        Expense(amount=100, category=1, pk=2), Expense(amount=8, category=0, pk=8)]
+    current.sort(key=lambda o: o.pk)
+    assert sorted(repo.get_all(), key=lambda o: o.pk) == current
+    assert repo.count() == 6 and repo.get(3) is None and repo.get(7) is None
+    assert [o.pk for o in repo.get_all({'category': 1})] == [2, 4, 6]
+
+    repo.thaw()
+    assert repo._container is container
+    assert sorted(repo.get_all(), key=lambda o: o.pk) == current
@@ -0,0 +1,265 @@
+from bookkeeper.repository.partitioned_repository import PartitionedRepository
+from bookkeeper.repository.raw_sqlite_repository import RawSQLiteRepository
+from bookkeeper.repository.query import Between, Ge, In, Lt, Prefix, as_condition
+from bookkeeper.models.expense import Expense
+
+import sqlite3
+import pytest
+from pony.orm import ObjectNotFound
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path):
+    RawSQLiteRepository.bind_database(str(tmp_path / 'partitioned.db'))
+
+
+@pytest.fixture
+def repo():
+    return PartitionedRepository[Expense](Expense, Expense.__name__)
+
+
+def expenses():
+    return [Expense(amount=float(i), category=i % 3, comment=f'c{i}',
+                    expense_date=f'{2020 + i % 4}-{1 + i % 12:02}-{1 + i % 28:02}')
+            for i in range(40)]
+
+
+def tables():
+    con = RawSQLiteRepository._get_connection()
+    return {name for name, in con.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+
+
+def trace_partitions(executed):
+    """ Record statements reading partitions, reads of the registry are skipped """
+    RawSQLiteRepository._get_connection().set_trace_callback(
+        lambda sql: '__partitions' in sql or executed.append(sql))
+
+
+def test_crud(repo):
+    obj = Expense(amount=10.5, category=2, expense_date='2023-03-01', comment='abc')
+    pk = repo.add(obj)
+    assert obj.pk == pk
+    assert repo.get(pk) == obj
+    obj2 = Expense(amount=20, category=3, expense_date='2023-05-01', comment='def', pk=pk)
+    repo.update(obj2)
+    assert repo.get(pk) == obj2
+    repo.delete(pk)
+    assert repo.get(pk) is None
+    repo.delete(pk)  # no error for missing record
+    with pytest.raises(ValueError):
+        repo.add(Expense(amount=1, category=1, pk=1))
+
+
+def test_rows_are_split_by_year(repo):
+    objs = expenses()
+    pks = repo.add_many(objs)
+    assert pks == list(range(1, 41))
+    assert list(repo.partitions()) == ['2020', '2021', '2022', '2023']
+    assert {'Expense_2020', 'Expense_2023'} <= tables()
+    con = RawSQLiteRepository._get_connection()
+    assert con.execute('SELECT COUNT(*) FROM "Expense_2021"').fetchone()[0] == 10
+    assert repo.get_all() == objs
+    assert repo.get_all({'category': 1}, order_by='-amount') == sorted(
+        (o for o in objs if o.category == 1), key=lambda o: -o.amount)
+
+
+def test_by_month():
+    repo = PartitionedRepository[Expense](Expense, 'Monthly', period='month')
+    objs = expenses()
+    repo.add_many(objs)
+    assert '2020-01' in repo.partitions()
+    assert repo.get_all({'expense_date': Prefix('2020-05')}) == [
+        o for o in objs if o.expense_date.startswith('2020-05')]
+    with pytest.raises(ValueError):
+        PartitionedRepository[Expense](Expense, 'Weekly', period='week')
+
+
+def test_date_conditions_skip_partitions(repo):
+    objs = expenses()
+    repo.add_many(objs)
+    executed = []
+    trace_partitions(executed)
+    conditions = [
+        ('2022-03-03', {'2022'}),
+        (Between('2021-06-01', '2022-02-01'), {'2021', '2022'}),
+        (Ge('2022-12-01'), {'2022', '2023'}),
+        (Lt('2021'), {'2020'}),
+        (In(['2020-01-01', '2023-04-04']), {'2020', '2023'}),
+        (Prefix('2021-1'), {'2021'}),
+    ]
+    for cond, partitions in conditions:
+        executed.clear()
+        assert repo.get_all({'expense_date': cond}) == [
+            o for o in objs if as_condition(cond).predicate()(o.expense_date)]
+        touched = {year for year in repo.partitions()
+                   if any(f'"Expense_{year}"' in sql for sql in executed)}
+        assert touched == partitions
+
+
+def test_undated_partition(repo):
+    undated = Expense(amount=1, category=1, expense_date='')
+    dated = Expense(amount=2, category=1, expense_date='2023-01-01')
+    repo.add_many([undated, dated])
+    assert repo.partitions() == {'': False, '2023': False}
+    assert repo.get_all({'expense_date': ''}) == [undated]
+    assert repo.get_all({'expense_date': Ge('2000-01-01')}) == [dated]
+    assert repo.get_all(order_by='expense_date', limit=1) == [undated]
+    assert repo.get_all(order_by='-expense_date', limit=1) == [dated]
+
+
+def test_ordered_page_reads_latest_partitions_first(repo):
+    objs = expenses()
+    repo.add_many(objs)
+    expected = sorted(objs, key=lambda o: (o.expense_date, o.pk), reverse=True)
+    executed = []
+    trace_partitions(executed)
+    assert repo.get_all(order_by=['-expense_date', '-pk'], limit=5) == expected[:5]
+    assert not any('"Expense_2020"' in sql for sql in executed)
+    assert repo.get_all(order_by=['-expense_date', '-pk'], limit=7, offset=8) == expected[8:15]
+    assert repo.get_all(order_by='expense_date', limit=100) == sorted(
+        objs, key=lambda o: (o.expense_date, o.pk))
+
+
+def test_update_moves_row_between_partitions(repo):
+    obj = Expense(amount=1, category=1, expense_date='2021-01-01')
+    repo.add(obj)
+    obj.expense_date = '2023-01-01'
+    repo.update(obj)
+    assert repo.get(obj.pk) == obj
+    assert repo.get_all({'expense_date': Prefix('2021')}) == []
+    assert repo.get_all({'expense_date': Prefix('2023')}) == [obj]
+    with pytest.raises(ObjectNotFound):
+        repo.update(Expense(amount=1, category=1, pk=100))
+    repo.update_many([Expense(amount=1, category=1, pk=100)])  # missing rows are skipped
+
+
+def test_read_only_partition(repo):
+    objs = expenses()
+    repo.add_many(objs)
+    repo.set_read_only('2020')
+    assert repo.partitions()['2020'] is True
+    old = objs[0]
+    with pytest.raises(PermissionError):
+        repo.add(Expense(amount=1, category=1, expense_date='2020-05-05'))
+    with pytest.raises(PermissionError):
+        repo.delete(old.pk)
+    with pytest.raises(PermissionError):
+        repo.update(old)
+    moved = objs[1]
+    moved.expense_date = '2020-02-02'
+    with pytest.raises(PermissionError):
+        repo.update(moved)
+    con = RawSQLiteRepository._get_connection()
+    with pytest.raises(sqlite3.IntegrityError):
+        con.execute('DELETE FROM "Expense_2020"')
+    assert repo.get(old.pk) == old  # reading is allowed
+
+    reopened = PartitionedRepository[Expense](Expense, Expense.__name__)
+    assert reopened.partitions()['2020'] is True
+    reopened.set_read_only('2020', False)
+    reopened.delete(old.pk)
+    assert reopened.get(old.pk) is None
+    with pytest.raises(KeyError):
+        reopened.set_read_only('1999')
+
+
+def test_partitions_of_other_repository_are_seen(repo):
+    other = PartitionedRepository[Expense](Expense, Expense.__name__)
+    repo.add(Expense(amount=1, category=1, expense_date='2022-01-01'))
+    assert other.count() == 1
+    obj = Expense(amount=2, category=2, expense_date='2023-01-01')
+    repo.add(obj)
+    assert other.count() == 2
+    assert other.get_all({'expense_date': Ge('2023-01-01')}) == [obj]
+    other.set_read_only('2023')
+    with pytest.raises(PermissionError):
+        repo.delete(obj.pk)
+    assert repo.partitions() == {'2022': False, '2023': True}
+
+
+def test_failed_add_is_rolled_back(repo):
+    repo.add(Expense(amount=1, category=1, expense_date='2020-01-01'))
+    repo.set_read_only('2020')
+    con = RawSQLiteRepository._get_connection()
+    con.execute('DROP TRIGGER "Expense_2020__read_only_insert"')
+    con.execute('CREATE TRIGGER "fail" BEFORE INSERT ON "Expense__pk" '
+                'WHEN NEW."partition" = \'2019\' BEGIN SELECT RAISE(ABORT, \'fail\'); END')
+    objs = [Expense(amount=1, category=1, expense_date='2018-01-01'),
+            Expense(amount=1, category=1, expense_date='2019-01-01')]
+    with pytest.raises(sqlite3.IntegrityError):
+        repo.add_many(objs)
+    assert [obj.pk for obj in objs] == [0, 0]
+    assert '2018' not in repo.partitions()
+    assert len(repo.get_all()) == 1
+
+
+def test_aggregate_reads_matching_partitions(repo):
+    objs = expenses()
+    repo.add_many(objs)
+    executed = []
+    trace_partitions(executed)
+    rows = repo.aggregate('amount', 'expense_date:month',
+                          {'expense_date': Between('2021-01-01', '2021-12-31')},
+                          ('sum', 'count'))
+    expected = {}
+    for o in objs:
+        if o.expense_date.startswith('2021'):
+            total, count = expected.get(o.expense_date[:7], (0, 0))
+            expected[o.expense_date[:7]] = (total + o.amount, count + 1)
+    assert rows == [(month, *value) for month, value in sorted(expected.items())]
+    assert len(executed) == 1 and '"Expense_2021"' in executed[0]
+    assert '"Expense_2022"' not in executed[0]
+    assert repo.aggregate('amount', functions=('sum', 'count')) == [
+        (sum(o.amount for o in objs), 40)]
+    assert repo.aggregate('amount', where={'expense_date': '1999-01-01'},
+                          functions=('sum', 'count')) == [(None, 0)]
+
+
+def test_count_and_exists(repo):
+    assert repo.count() == 0
+    assert not repo.exists()
+    repo.add_many(expenses())
+    assert repo.count() == 40
+    assert repo.count({'expense_date': Prefix('2021'), 'category': 0}) == 3
+    executed = []
+    trace_partitions(executed)
+    assert repo.exists({'category': 2})
+    assert len(executed) == 1 and '"Expense_2023"' in executed[0]
+    assert not repo.exists({'expense_date': Prefix('2024')})
+    assert not repo.exists({'category': 7})
+
+
+def test_iter_all_reads_partitions_in_order(repo):
+    objs = expenses()
+    repo.add_many(objs)
+    executed = []
+    trace_partitions(executed)
+    found = repo.iter_all(order_by=['-expense_date', '-pk'], batch_size=3)
+    expected = sorted(objs, key=lambda o: (o.expense_date, o.pk), reverse=True)
+    assert [next(found) for _ in range(4)] == expected[:4]
+    assert all('"Expense_2023"' in sql for sql in executed)
+    assert list(found) == expected[4:]
+    assert list(repo.iter_all({'category': 1}, '-amount', batch_size=4)) == \
+        repo.get_all({'category': 1}, '-amount')
+    assert list(repo.iter_all({'expense_date': Prefix('1999')})) == []
+
+
+def test_get_columns(repo):
+    objs = expenses()
+    repo.add_many(objs)
+    assert repo.get_columns(['amount'], {'category': 2}, order_by='-pk') == [
+        (o.amount,) for o in reversed(objs) if o.category == 2]
+    expected = sorted(objs, key=lambda o: (o.expense_date, o.pk), reverse=True)
+    assert repo.get_columns(['pk', 'comment'], order_by=['-expense_date', '-pk'],
+                            limit=3, offset=2) == [(o.pk, o.comment) for o in expected[2:5]]
+    assert repo.get_columns(['pk'], {'expense_date': Prefix('1999')}) == []
+
+
+def test_partition_indexes(repo):
+    repo.add_many(expenses())
+    con = RawSQLiteRepository._get_connection()
+    con.execute('DROP INDEX "idx_expense_2021__category"')
+    PartitionedRepository[Expense](Expense, Expense.__name__)
+    plan = con.execute('EXPLAIN QUERY PLAN SELECT * FROM "Expense_2021" '
+                       'WHERE "category" = 1').fetchall()
+    assert 'USING INDEX idx_expense_2021__category' in plan[0][3]
@@ -0,0 +1,166 @@
+from bookkeeper.repository.query import (
+    Eq, Gt, Ge, Lt, Le, Between, In, Prefix,
+    compile_select, compile_predicate, order_objects, slice_objects,
+    aggregate_objects, compile_aggregate, parse_group_by, keyset_key,
+    project_objects)
+
+import pytest
+
+
+class Obj():
+    def __init__(self, pk, value, name=None):
+        self.pk = pk
+        self.value = value
+        self.name = name
+
+
+def test_compile_select_plain_values():
+    sql, params = compile_select('T', {'a': 1, 'b': 'x'})
+    assert sql == 'SELECT * FROM "T" WHERE "a" = ? AND "b" = ? ORDER BY "pk"'
+    assert params == [1, 'x']
+
+
+def test_compile_select_operators():
+    sql, params = compile_select(
+        'T', {'a': Between(1, 5), 'b': In([1, 2, 3]), 'c': Prefix('ab')},
+        order_by=['-a', 'pk'], limit=10, offset=20)
+    assert sql == ('SELECT * FROM "T" WHERE "a" BETWEEN ? AND ? AND "b" IN (?, ?, ?) '
+                   'AND "c" >= ? AND "c" < ? ORDER BY "a" DESC, "pk" LIMIT ? OFFSET ?')
+    assert params == [1, 5, 1, 2, 3, 'ab', 'ac', 10, 20]
+
+
+def test_compile_select_offset_without_limit():
+    sql, params = compile_select('T', offset=3)
+    assert sql == 'SELECT * FROM "T" ORDER BY "pk" LIMIT -1 OFFSET ?'
+    assert params == [3]
+
+
+def test_compile_select_union_of_tables():
+    sql, params = compile_select(['T1', 'T2'], {'a': Gt(1)}, order_by='-a', limit=5,
+                                 columns=['pk', 'a'])
+    assert sql == ('SELECT "pk", "a" FROM "T1" WHERE "a" > ? UNION ALL '
+                   'SELECT "pk", "a" FROM "T2" WHERE "a" > ? ORDER BY "a" DESC, "pk" LIMIT ?')
+    assert params == [1, 1, 5]
+
+
+def test_compile_select_after_key():
+    sql, params = compile_select('T', {'a': 1}, order_by=['-d', '-pk'], limit=5,
+                                 after=('2023-01-01', 7))
+    assert sql == ('SELECT * FROM "T" WHERE "a" = ? AND ("d", "pk") < (?, ?) '
+                   'ORDER BY "d" DESC, "pk" DESC LIMIT ?')
+    assert params == [1, '2023-01-01', 7, 5]
+    sql, params = compile_select(['T1', 'T2'], order_by=['d', '-a'], after=('x', 2, 3))
+    condition = '("d" > ? OR "d" = ? AND ("a" < ? OR "a" = ? AND ("pk") > (?)))'
+    assert sql == (f'SELECT * FROM "T1" WHERE {condition} UNION ALL '
+                   f'SELECT * FROM "T2" WHERE {condition} ORDER BY "d", "a" DESC, "pk"')
+    assert params == ['x', 'x', 2, 2, 3] * 2
+    assert keyset_key(Obj(3, 2, 'x'), ['name', '-value']) == ('x', 2, 3)
+    assert keyset_key(Obj(3, 2), None) == (3,)
+
+
+def test_compile_select_union_orders_by_unselected_column():
+    sql, params = compile_select(['T1', 'T2'], {'a': 1}, order_by='b', columns=['a'])
+    assert sql == ('SELECT "a" FROM (SELECT * FROM "T1" WHERE "a" = ? UNION ALL '
+                   'SELECT * FROM "T2" WHERE "a" = ?) ORDER BY "b", "pk"')
+    assert params == [1, 1]
+
+
+def test_project_objects():
+    objs = [Obj(1, 10, 'a'), Obj(2, None, 'b')]
+    assert project_objects(objs, ['name', 'pk']) == [('a', 1), ('b', 2)]
+    assert project_objects(objs, ['value']) == [(10,), (None,)]
+    with pytest.raises(ValueError):
+        project_objects(objs, [])
+
+
+def test_compile_select_nullable_ranges_skip_none():
+    sql, params = compile_select('T', {'a': Lt(5), 'b': Lt(5), 'c': None},
+                                 nullable=['a', 'c'])
+    assert sql == ('SELECT * FROM "T" WHERE ("a" < ? AND "a" != -1000) AND "b" < ? '
+                   'AND "c" = ? ORDER BY "pk"')
+    assert params == [5, 5, None]
+    sql, _ = compile_select('T', {'a': Prefix('x')}, nullable=['a'])
+    assert sql == 'SELECT * FROM "T" WHERE ("a" >= ? AND "a" < ? AND "a" != -1000) ORDER BY "pk"'
+
+
+def test_compile_select_is_cached_by_shape():
+    sql1, _ = compile_select('T', {'a': Gt(1), 'b': In([1, 2])})
+    sql2, _ = compile_select('T', {'a': Gt(7), 'b': In([3, 4])})
+    assert sql1 is sql2
+
+
+@pytest.mark.parametrize('cond, expected', [
+    (Eq(3), [3]),
+    (Gt(3), [4, 5]),
+    (Ge(3), [3, 4, 5]),
+    (Lt(3), [1, 2]),
+    (Le(3), [1, 2, 3]),
+    (Between(2, 4), [2, 3, 4]),
+    (In([1, 5, 7]), [1, 5]),
+])
+def test_compile_predicate(cond, expected):
+    objs = [Obj(i, i) for i in [1, 2, 3, 4, 5, None]]
+    predicate = compile_predicate({'value': cond})
+    assert [o.value for o in objs if predicate(o)] == expected
+
+
+def test_compile_predicate_prefix():
+    objs = [Obj(1, 'abc'), Obj(2, 'abd'), Obj(3, 'xab'), Obj(4, None)]
+    assert [o.pk for o in objs if compile_predicate({'value': Prefix('ab')})(o)] == [1, 2]
+    assert [o.pk for o in objs if compile_predicate({'value': Prefix('')})(o)] == [1, 2, 3]
+
+
+def test_order_and_slice():
+    objs = [Obj(1, 2, 'b'), Obj(2, None, 'a'), Obj(3, 2, 'a'), Obj(4, 1, 'c')]
+    assert [o.pk for o in order_objects(list(objs), 'value')] == [2, 4, 1, 3]
+    assert [o.pk for o in order_objects(list(objs), '-value')] == [1, 3, 4, 2]
+    assert [o.pk for o in order_objects(list(objs), ['name', '-value'])] == [3, 2, 1, 4]
+    assert slice_objects(objs, 2, 1) == objs[1:3]
+    assert slice_objects(objs, None, 3) == objs[3:]
+
+
+def test_parse_group_by():
+    assert parse_group_by(None) == ()
+    assert parse_group_by('category') == (('category', None),)
+    assert parse_group_by(['category', 'date:week']) == (('category', None), ('date', 'week'))
+    with pytest.raises(ValueError):
+        parse_group_by('date:quarter')
+
+
+def test_compile_aggregate():
+    sql, params = compile_aggregate('T', 'a', ['b', 'd:month'], {'d': Ge('2023')},
+                                    ('sum', 'count', 'max'), nullable=['b'])
+    assert sql == ('SELECT NULLIF("b", -1000), substr("d", 1, 7), SUM("a"), COUNT(*), '
+                   'MAX("a") FROM "T" WHERE "d" >= ? GROUP BY 1, 2 ORDER BY 1, 2')
+    assert params == ['2023']
+    sql, params = compile_aggregate(['T1', 'T2'], 'a', where={'b': 1}, functions=('min',))
+    assert sql == ('SELECT MIN("a") FROM (SELECT * FROM "T1" WHERE "b" = ? '
+                   'UNION ALL SELECT * FROM "T2" WHERE "b" = ?)')
+    assert params == [1, 1]
+    with pytest.raises(ValueError):
+        compile_aggregate('T', 'a', functions=('median',))
+
+
+def test_aggregate_objects():
+    objs = [Obj(1, 5, '2023-03-13'), Obj(2, None, '2023-03-19'), Obj(3, 1, '2023-03-20'),
+            Obj(4, 2, None), Obj(5, 7, '2023-02-28')]
+    assert aggregate_objects(objs, 'value', 'name:week', ('sum', 'count', 'min', 'max')) == [
+        (None, 2, 1, 2, 2), ('2023-02-27', 7, 1, 7, 7), ('2023-03-13', 5, 2, 5, 5),
+        ('2023-03-20', 1, 1, 1, 1)]
+    assert aggregate_objects(objs, 'value', functions=('sum', 'count')) == [(15, 5)]
+    assert aggregate_objects([], 'value', functions=('sum', 'count')) == [(None, 0)]
+    assert aggregate_objects([], 'value', 'name') == []
+    assert aggregate_objects(objs, 'value', 'name:month', ('max',)) == [
+        (None, 2), ('2023-02', 7), ('2023-03', 5)]
+
+
+@pytest.mark.parametrize('prefix, upper', [
+    ('ab', 'ac'),
+    ('a\U0010ffff', 'b'),
+    ('\U0010ffff\U0010ffff', None),
+    ('a\ud7ff', 'a\ue000'),
+])
+def test_prefix_upper_bound(prefix, upper):
+    params = Prefix(prefix).params()
+    assert params == ((prefix, upper) if upper is not None else (prefix,))
+    assert all(p.encode() for p in params)
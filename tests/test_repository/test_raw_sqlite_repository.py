@@ -0,0 +1,226 @@
+from bookkeeper.repository.raw_sqlite_repository import RawSQLiteRepository
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.category import Category
+from bookkeeper.models.budget import Budget
+from bookkeeper.repository.columnar_repository import ColumnarRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Between, Ge, Gt, Le, Lt, In, Prefix
+
+import pytest
+from pony.orm import ObjectNotFound
+
+
+@pytest.fixture(autouse=True)
+def database(tmp_path):
+    RawSQLiteRepository.bind_database(str(tmp_path / 'raw.db'))
+
+
+@pytest.fixture
+def repo_expense():
+    return RawSQLiteRepository[Expense](Expense, Expense.__name__)
+
+
+@pytest.fixture
+def repo_category():
+    return RawSQLiteRepository[Category](Category, Category.__name__)
+
+
+def test_crud(repo_expense):
+    obj = Expense(amount=10.5, category=2, expense_date='2023-03-01', comment='abc')
+    pk = repo_expense.add(obj)
+    assert obj.pk == pk
+    assert repo_expense.get(pk) == obj
+    obj2 = Expense(amount=20, category=3, comment='def', pk=pk)
+    repo_expense.update(obj2)
+    assert repo_expense.get(pk) == obj2
+    repo_expense.delete(pk)
+    assert repo_expense.get(pk) is None
+    repo_expense.delete(pk)  # no error for missing record
+
+
+def test_cannot_add_with_pk(repo_expense):
+    with pytest.raises(ValueError):
+        repo_expense.add(Expense(amount=1, category=1, pk=1))
+
+
+def test_cannot_update_without_pk(repo_expense):
+    with pytest.raises(ValueError):
+        repo_expense.update(Expense(amount=1, category=1))
+
+
+def test_update_missing_row(repo_expense):
+    with pytest.raises(ObjectNotFound):
+        repo_expense.update(Expense(amount=1, category=1, pk=100))
+
+
+def test_none_values(repo_category):
+    parent = Category(name='parent')
+    repo_category.add(parent)
+    child = Category(name='child', parent=parent.pk)
+    repo_category.add(child)
+    assert repo_category.get(parent.pk).parent is None
+    assert repo_category.get_all({'parent': None}) == [parent]
+    assert repo_category.get_all({'parent': parent.pk}) == [child]
+
+
+def test_budget():
+    repo = RawSQLiteRepository[Budget](Budget, Budget.__name__)
+    b = Budget(period='Неделя', limit=100, spent=20)
+    repo.add(b)
+    assert repo.get_all() == [b]
+
+
+def test_batch(repo_expense):
+    objs = [Expense(amount=float(i), category=i % 3, comment=f'op{i}') for i in range(10)]
+    pks = repo_expense.add_many(objs)
+    assert pks == [o.pk for o in objs]
+    assert repo_expense.get_all() == objs
+    for o in objs:
+        o.amount += 100
+    repo_expense.update_many(objs)
+    assert repo_expense.get_all() == objs
+    repo_expense.delete_many(pks[:5])
+    assert repo_expense.get_all() == objs[5:]
+    assert repo_expense.add_many([]) == []
+
+
+def test_get_all_with_operators(repo_expense):
+    objs = [Expense(amount=float(i), category=30 + i % 3, comment=f'op{i}')
+            for i in range(10)]
+    repo_expense.add_many(objs)
+    mine = In([30, 31, 32])
+    assert repo_expense.get_all({'category': mine, 'amount': Between(2, 4)}) == objs[2:5]
+    assert repo_expense.get_all({'category': In([30, 31]), 'amount': Gt(5)}) == \
+        [objs[6], objs[7], objs[9]]
+    assert repo_expense.get_all({'comment': Prefix('op1')}) == [objs[1]]
+    assert repo_expense.get_all({'amount': Lt(3)}, order_by='-amount') == objs[2::-1]
+    assert repo_expense.get_all(order_by=['category', '-amount'],
+                                limit=2, offset=1) == [objs[6], objs[3]]
+
+
+def test_unknown_field(repo_expense):
+    with pytest.raises(ValueError):
+        repo_expense.get_all({'unknown': 1})
+    with pytest.raises(ValueError):
+        repo_expense.get_all(order_by='-unknown')
+
+
+def test_expense_date_index(repo_expense):
+    con = RawSQLiteRepository._get_connection()
+    plan = con.execute('EXPLAIN QUERY PLAN SELECT * FROM "Expense" '
+                       'WHERE "expense_date" BETWEEN ? AND ?', ('a', 'b')).fetchall()
+    assert any('idx_expense__expense_date' in str(row) for row in plan)
+
+
+def test_threads_use_own_connections(repo_expense):
+    import threading
+    objs = [Expense(amount=float(i), category=1) for i in range(100)]
+    errors = []
+    def write(chunk):
+        try:
+            repo_expense.add_many(chunk)
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=write, args=(objs[i::4],)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert sorted(o.pk for o in repo_expense.get_all()) == sorted(o.pk for o in objs)
+
+
+def test_aggregate(repo_expense, repo_category):
+    objs = [Expense(amount=float(i), category=i % 3,
+                    expense_date=f'2023-0{1 + i % 2}-{1 + i:02}') for i in range(12)]
+    repo_expense.add_many(objs)
+    assert repo_expense.aggregate('amount', ['category', 'expense_date:month'],
+                                  functions=('sum', 'count')) == [
+        (0, '2023-01', 6.0, 2), (0, '2023-02', 12.0, 2), (1, '2023-01', 14.0, 2),
+        (1, '2023-02', 8.0, 2), (2, '2023-01', 10.0, 2), (2, '2023-02', 16.0, 2)]
+    assert repo_expense.aggregate('amount', where={'expense_date': Prefix('2023-02')},
+                                  functions=('min', 'max')) == [(1.0, 11.0)]
+    parent = Category(name='p')
+    repo_category.add(parent)
+    repo_category.add(Category(name='c', parent=parent.pk))
+    assert repo_category.aggregate('parent', 'parent', functions=('count', 'max')) == [
+        (None, 1, None), (parent.pk, 1, parent.pk)]
+
+
+def test_count_and_exists(repo_expense):
+    assert repo_expense.count() == 0
+    assert not repo_expense.exists()
+    repo_expense.add_many(Expense(amount=float(i), category=i % 3) for i in range(10))
+    assert repo_expense.count() == 10
+    assert repo_expense.count({'category': 1, 'amount': Gt(3)}) == 2
+    assert repo_expense.exists({'category': 2})
+    assert not repo_expense.exists({'category': 5})
+    with pytest.raises(ValueError):
+        repo_expense.count({'unknown': 1})
+
+
+@pytest.mark.parametrize('order_by', [None, '-pk', ['-expense_date', '-pk'],
+                                      ['category', '-amount'], ['expense_date', 'comment']])
+@pytest.mark.parametrize('batch_size', [1, 4, 100])
+def test_iter_all_same_as_get_all(repo_expense, order_by, batch_size):
+    repo_expense.add_many(
+        Expense(amount=float(i % 5), category=i % 3, comment=f'c{i % 4}',
+                expense_date=f'2023-01-{1 + i % 6:02}') for i in range(30))
+    where = {'category': In([0, 2])}
+    assert list(repo_expense.iter_all(where, order_by, batch_size)) == \
+        repo_expense.get_all(where, order_by)
+    assert list(repo_expense.iter_all(order_by=order_by, batch_size=batch_size)) == \
+        repo_expense.get_all(order_by=order_by)
+
+
+def test_iter_all_reads_pages_without_offset(repo_expense, repo_category):
+    repo_expense.add_many(Expense(amount=1, category=1) for _ in range(10))
+    executed = []
+    RawSQLiteRepository._get_connection().set_trace_callback(executed.append)
+    objs = repo_expense.iter_all(order_by=['-expense_date', '-pk'], batch_size=4)
+    assert next(objs).pk == 10
+    assert len(executed) == 1
+    assert [obj.pk for obj in objs] == list(range(9, 0, -1))
+    assert len(executed) == 3 and not any('OFFSET' in sql for sql in executed)
+    with pytest.raises(ValueError):
+        repo_expense.iter_all(order_by='unknown')
+    parent = Category(name='parent')
+    repo_category.add(parent)
+    children = [Category(name='child', parent=parent.pk) for _ in range(3)]
+    repo_category.add_many(children)
+    assert list(repo_category.iter_all(order_by='parent', batch_size=1)) == \
+        [parent, *children]
+
+
+def test_get_columns(repo_expense, repo_category):
+    objs = [Expense(amount=float(i), category=i % 3, comment=f'c{i}',
+                    expense_date=f'2023-01-{1 + i:02}') for i in range(6)]
+    repo_expense.add_many(objs)
+    assert repo_expense.get_columns(['pk', 'amount'], {'category': 1}) == [
+        (objs[1].pk, 1.0), (objs[4].pk, 4.0)]
+    assert repo_expense.get_columns(['comment'], order_by='-expense_date', limit=2,
+                                    offset=1) == [('c4',), ('c3',)]
+    parent = Category(name='parent')
+    repo_category.add(parent)
+    repo_category.add(Category(name='child', parent=parent.pk))
+    assert repo_category.get_columns(['name', 'parent']) == [
+        ('parent', None), ('child', parent.pk)]
+    with pytest.raises(ValueError):
+        repo_expense.get_columns(['unknown'])
+    with pytest.raises(ValueError):
+        repo_expense.get_columns([])
+
+
+@pytest.mark.parametrize('where', [
+    {'parent': Lt(5)}, {'parent': Le(1)}, {'parent': Ge(-5000)}, {'parent': Gt(-5000)},
+    {'parent': Between(-5000, 5)}, {'parent': None}, {'parent': In([None, 1])},
+])
+def test_nullable_conditions_same_as_memory(repo_category, where):
+    cats = [Category('a'), Category('b', parent=1), Category('c', parent=7)]
+    memory, columnar = MemoryRepository[Category](), ColumnarRepository[Category](Category)
+    for repo in [memory, repo_category, columnar]:
+        repo.add_many(Category(c.name, c.parent) for c in cats)
+        assert [c.name for c in repo.get_all(where)] == \
+            [c.name for c in memory.get_all(where)]
+        assert repo.count(where) == memory.count(where)
+        assert repo.get_columns(['name'], where) == memory.get_columns(['name'], where)
@@ -0,0 +1,44 @@
+from bookkeeper.repository.row_codec import RowCodec
+from bookkeeper.models.expense import Expense
+from bookkeeper.models.category import Category
+
+from dataclasses import dataclass
+from datetime import date
+
+
+def test_encode_and_decode():
+    codec = RowCodec(Expense)
+    assert codec.columns == ['amount', 'category', 'expense_date', 'added_date', 'comment']
+    assert codec.fields == [*codec.columns, 'pk']
+    obj = Expense(amount=1.5, category=2, expense_date='2023-01-01',
+                  added_date='01-01-2023 10:00', comment='abc', pk=7)
+    assert tuple(codec.encode(obj)) == (1.5, 2, '2023-01-01', '01-01-2023 10:00', 'abc')
+    assert codec.decode([*codec.encode(obj), 7]) == obj
+
+
+def test_nullable_fields():
+    codec = RowCodec(Category)
+    assert list(codec.encode(Category('top'))) == ['top', -1000]
+    assert list(codec.encode(Category('child', 3))) == ['child', 3]
+    assert codec.decode(('top', -1000, 1)) == Category('top', None, 1)
+    assert codec.row_factory(None, ('child', 3, 2)) == Category('child', 3, 2)
+
+
+def test_other_types_are_stored_as_strings():
+    @dataclass
+    class Custom:
+        day: date
+        note: str | None = None
+        pk: int = 0
+
+    codec = RowCodec(Custom)
+    assert list(codec.encode(Custom(date(2023, 1, 2)))) == ['2023-01-02', -1000]
+
+
+def test_single_column():
+    @dataclass
+    class Single:
+        name: str
+        pk: int = 0
+
+    assert RowCodec(Single).encode(Single('x')) == ('x',)
@@ -0,0 +1,97 @@
+import sqlite3
+from dataclasses import dataclass, field
+
+import pytest
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.databases import migrate_database
+from bookkeeper.repository.schema import Index, TableSchema
+
+
+@dataclass
+class Tag:
+    name: str = field(metadata={'unique': True})
+    weight: int | None = None
+    pk: int = 0
+
+
+@pytest.fixture
+def con():
+    con = sqlite3.connect(':memory:')
+    yield con
+    con.close()
+
+
+def query_plan(con, sql):
+    return ' '.join(row[3] for row in con.execute('EXPLAIN QUERY PLAN ' + sql, [1]))
+
+
+def test_index_name():
+    assert Index('Expense', 'category').name == 'idx_expense__category'
+    assert Index('Tag', 'name', unique=True).name == 'unq_tag__name'
+
+
+def test_create_table_with_indexes(con):
+    schema = TableSchema(Expense, 'Expense')
+    assert [index.column for index in schema.indexes] == ['category', 'expense_date']
+    schema.migrate(con)
+    assert 'USING INDEX idx_expense__category' in \
+        query_plan(con, 'SELECT * FROM "Expense" WHERE "category" = ?')
+    assert 'USING INDEX idx_expense__expense_date' in \
+        query_plan(con, 'SELECT * FROM "Expense" WHERE "expense_date" > ?')
+    assert schema.migrate(con) == []
+
+
+def test_unique(con):
+    TableSchema(Tag, 'Tag').migrate(con)
+    con.execute('INSERT INTO "Tag" ("name", "weight") VALUES (\'a\', 1)')
+    with pytest.raises(sqlite3.IntegrityError):
+        con.execute('INSERT INTO "Tag" ("name", "weight") VALUES (\'a\', 2)')
+
+
+def test_migrate_old_table(con):
+    con.execute('CREATE TABLE "Tag" ("pk" INTEGER PRIMARY KEY, "name" TEXT, "old" TEXT)')
+    con.execute('CREATE INDEX "idx_tag__old" ON "Tag" ("old")')
+    con.execute('CREATE INDEX "by_hand" ON "Tag" ("old")')
+    con.execute('INSERT INTO "Tag" ("name") VALUES (\'a\')')
+    assert TableSchema(Tag, 'Tag').migrate(con) == [
+        'ALTER TABLE "Tag" ADD COLUMN "weight" INTEGER DEFAULT -1000',
+        'CREATE UNIQUE INDEX IF NOT EXISTS "unq_tag__name" ON "Tag" ("name")',
+    ]
+    assert con.execute('SELECT * FROM "Tag"').fetchall() == [(1, 'a', None, -1000)]
+    indexes = {row[1] for row in con.execute('PRAGMA index_list("Tag")')}
+    assert indexes == {'unq_tag__name', 'idx_tag__old', 'by_hand'}
+
+
+@dataclass
+class OldTag:
+    name: str = field(metadata={'unique': True})
+    weight: int | None = field(default=None, metadata={'index': True})
+    pk: int = 0
+
+
+def test_migrate_drops_only_generated_indexes(con):
+    TableSchema(OldTag, 'Tag').migrate(con)
+    con.execute('CREATE INDEX "idx_tag__by_hand" ON "Tag" ("name", "weight")')
+    assert TableSchema(Tag, 'Tag').migrate(con) == ['DROP INDEX "idx_tag__weight"']
+    indexes = {row[1] for row in con.execute('PRAGMA index_list("Tag")')}
+    assert indexes == {'unq_tag__name', 'idx_tag__by_hand'}
+    assert TableSchema(OldTag, 'Tag').migrate(con) == [
+        'CREATE INDEX IF NOT EXISTS "idx_tag__weight" ON "Tag" ("weight")']
+
+
+def test_migrate_database_adds_indexes(tmp_path):
+    filename = str(tmp_path / 'old.db')
+    con = sqlite3.connect(filename)
+    con.execute('CREATE TABLE "Expense" ("pk" INTEGER PRIMARY KEY AUTOINCREMENT, '
+                '"amount" REAL NOT NULL, "category" INTEGER NOT NULL, '
+                '"comment" VARCHAR(50) NOT NULL, "added_date" VARCHAR(30) NOT NULL, '
+                '"expense_date" VARCHAR(30) NOT NULL)')
+    con.close()
+    migrate_database(filename)
+    con = sqlite3.connect(filename)
+    assert 'USING INDEX idx_expense__category' in \
+        query_plan(con, 'SELECT * FROM "Expense" WHERE "category" = ?')
+    tables = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'Expense', 'Category', 'Budget'} <= tables
+    con.close()
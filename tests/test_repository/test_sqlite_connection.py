@@ -0,0 +1,57 @@
+from bookkeeper.repository.sqlite_connection import ConnectionPool, SQLiteTuning, NO_TUNING
+
+import threading
+import pytest
+
+
+def test_pragmas():
+    assert SQLiteTuning(cache_size=-100, mmap_size=None).pragmas() == [
+        'PRAGMA journal_mode = WAL', 'PRAGMA synchronous = NORMAL',
+        'PRAGMA cache_size = -100', 'PRAGMA temp_store = MEMORY',
+        'PRAGMA busy_timeout = 5000']
+    assert NO_TUNING.pragmas() == []
+
+
+def in_thread(func):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_connection_per_thread(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'))
+    con = pool.connection()
+    assert pool.connection() is con
+    assert in_thread(pool.connection) is not con
+    assert con.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert con.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+    pool.close_all()
+    assert pool.connection() is not con
+
+
+def test_reader_not_blocked_by_writer(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'))
+    con = pool.connection()
+    with con:
+        con.execute('CREATE TABLE t (x INTEGER)')
+        con.execute('INSERT INTO t VALUES (1)')
+    con.execute('BEGIN IMMEDIATE')
+    con.execute('INSERT INTO t VALUES (2)')
+    # uncommitted write is not visible to another thread, which is not blocked
+    assert in_thread(lambda: pool.connection().execute('SELECT x FROM t').fetchall()) == [(1,)]
+    con.commit()
+    assert in_thread(lambda: pool.connection().execute('SELECT x FROM t').fetchall()) == \
+        [(1,), (2,)]
+    pool.close_all()
+
+
+def test_memory_database_is_shared():
+    pool = ConnectionPool(':memory:', NO_TUNING)
+    con = pool.connection()
+    with con:
+        con.execute('CREATE TABLE t (x INTEGER)')
+        con.execute('INSERT INTO t VALUES (1)')
+    assert in_thread(lambda: pool.connection().execute('SELECT x FROM t').fetchall()) == [(1,)]
+    pool.close_all()
@@ -2,6 +2,7 @@ from bookkeeper.repository.sqlite_repository import SQLiteRepository
 from bookkeeper.models.expense import Expense
 from bookkeeper.models.category import Category
 from bookkeeper.models.budget import Budget
+from bookkeeper.repository.query import Between, Gt, Lt, In, Prefix
 
 import pytest
 
@@ -166,3 +167,216 @@ def test_get_all_with_condition(repo_expense):
         objs.append(p)
     assert repo_expense.get_all({'comment': '0', 'category': 10}) == [objs[0]]
     assert repo_expense.get_all({'category': 10}) == objs
+
+def test_batch_crud(repo_expense):
+    objs = [Expense(amount=float(i), category=20, comment=str(i)) for i in range(100)]
+    pks = repo_expense.add_many(iter(objs))
+    assert len(set(pks)) == len(objs)
+    assert [obj.pk for obj in objs] == pks
+    assert repo_expense.get_all({'category': 20}) == objs
+
+    for obj in objs:
+        obj.amount = 1000
+    repo_expense.update_many(objs)
+    assert all(repo_expense.get(pk).amount == 1000 for pk in pks)
+
+    repo_expense.delete_many(pks + [34589])
+    assert repo_expense.get_all({'category': 20}) == []
+    assert repo_expense.add_many([]) == []
+
+def test_cannot_add_many_with_pk(repo_expense):
+    objs = [Expense(amount=1, category=21) for i in range(3)]
+    objs[1].pk = 1
+    with pytest.raises(ValueError):
+        repo_expense.add_many(objs)
+    assert repo_expense.get_all({'category': 21}) == []
+
+def test_get_all_with_all_conditions_in_sql(repo_category):
+    cats = [Category(name='sql_cond', parent=None),
+            Category(name='sql_cond', parent=5),
+            Category(name='sql_cond_2', parent=None)]
+    repo_category.add_many(cats)
+    assert repo_category.get_all({'name': 'sql_cond', 'parent': None}) == [cats[0]]
+    assert repo_category.get_all({'parent': 5, 'name': 'sql_cond'}) == [cats[1]]
+    assert repo_category.get_all({'name': 'sql_cond', 'pk': cats[2].pk}) == []
+    assert repo_category.get_all({'name': 'sql_cond'}) == cats[:2]
+    repo_category.delete_many(c.pk for c in cats)
+
+def test_get_all_unknown_field(repo_category):
+    with pytest.raises(ValueError):
+        repo_category.get_all({'unknown': 1})
+
+def test_get_all_with_operators(repo_expense):
+    objs = [Expense(amount=float(i), category=30 + i % 3, comment=f'op{i}')
+            for i in range(10)]
+    repo_expense.add_many(objs)
+    mine = In([30, 31, 32])
+    assert repo_expense.get_all({'category': mine, 'amount': Between(2, 4)}) == objs[2:5]
+    assert repo_expense.get_all({'category': In([30, 31]), 'amount': Gt(5)}) == \
+        [objs[6], objs[7], objs[9]]
+    assert repo_expense.get_all({'comment': Prefix('op1')}) == [objs[1]]
+    assert repo_expense.get_all({'category': mine, 'amount': Lt(3)},
+                                order_by='-amount') == objs[2::-1]
+    assert repo_expense.get_all({'category': mine}, order_by=['category', '-amount'],
+                                limit=2, offset=1) == [objs[6], objs[3]]
+    assert repo_expense.get_all({'category': mine}, offset=8) == objs[8:]
+    repo_expense.delete_many(o.pk for o in objs)
+
+def test_get_all_unknown_order_field(repo_expense):
+    with pytest.raises(ValueError):
+        repo_expense.get_all(order_by='-unknown')
+
+def test_expense_date_range_uses_index(repo_expense):
+    from pony import orm
+    import bookkeeper.repository.databases as my_dbs
+    with orm.db_session:
+        plan = my_dbs.db.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM "Expense" '
+            'WHERE "expense_date" BETWEEN \'2023-01-01\' AND \'2023-01-31\'').fetchall()
+    assert any('idx_expense__expense_date' in str(row) for row in plan)
+
+def test_async_adapter(repo_category):
+    import asyncio
+    from bookkeeper.repository.async_repository import ExecutorRepository
+
+    async_repo = ExecutorRepository(repo_category, max_workers=4)
+
+    async def add_and_get(i):
+        ctg = Category(name=f'async{i}')
+        pk = await async_repo.add(ctg)
+        assert await async_repo.get(pk) == ctg
+        return ctg
+
+    async def run():
+        ctgs = await asyncio.gather(*(add_and_get(i) for i in range(20)))
+        found = await async_repo.get_all({'name': Prefix('async')})
+        assert sorted(c.pk for c in found) == sorted(c.pk for c in ctgs)
+        await async_repo.delete_many(c.pk for c in ctgs)
+        assert await async_repo.get_all({'name': Prefix('async')}) == []
+
+    asyncio.run(run())
+    async_repo.close()
+
+def test_connection_tuning(repo_category):
+    from pony import orm
+    import bookkeeper.repository.databases as my_dbs
+    with orm.db_session:
+        assert my_dbs.db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert my_dbs.db.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+
+def test_tuning_hook_registered_once():
+    import bookkeeper.repository.databases as my_dbs
+    from pony import orm
+    with pytest.raises(orm.BindingError):  # pony db is already bound
+        SQLiteRepository.bind_database(':memory:', SQLiteRepository.tuning)
+    hooks = [func for func, _ in my_dbs.db._on_connect_funcs]
+    assert len(hooks) == 1
+
+def test_aggregate(repo_expense, repo_category):
+    from bookkeeper.repository.memory_repository import MemoryRepository
+    objs = [Expense(amount=float(i), category=70 + i % 3,
+                    expense_date=f'2023-0{1 + i % 2}-{1 + i:02}') for i in range(12)]
+    repo_expense.add_many(objs)
+    memory = MemoryRepository[Expense]()
+    memory.add_many(Expense(amount=o.amount, category=o.category,
+                            expense_date=o.expense_date) for o in objs)
+    mine = {'category': In([70, 71, 72])}
+    for by in [None, 'category', ['category', 'expense_date:month'], 'expense_date:week']:
+        assert repo_expense.aggregate('amount', by, mine, ('sum', 'count', 'min', 'max')) \
+            == memory.aggregate('amount', by, None, ('sum', 'count', 'min', 'max'))
+    assert repo_expense.aggregate('amount', 'expense_date:month',
+                                  {**mine, 'expense_date': Between('2023-01-01', '2023-01-31')},
+                                  ('sum',)) == [('2023-01', 30.0)]
+    # None in group field is read back as None
+    cats = [Category(name='agg', parent=None), Category(name='agg', parent=1)]
+    repo_category.add_many(cats)
+    assert repo_category.aggregate('pk', 'parent', {'name': 'agg'}, ('count',)) == \
+        [(None, 1), (1, 1)]
+    with pytest.raises(ValueError):
+        repo_expense.aggregate('amount', 'unknown')
+    with pytest.raises(ValueError):
+        repo_expense.aggregate('amount', functions=('avg',))
+    repo_expense.delete_many(o.pk for o in objs)
+    repo_category.delete_many(c.pk for c in cats)
+
+def test_count_and_exists(repo_expense):
+    objs = [Expense(amount=float(i), category=80 + i % 3) for i in range(10)]
+    repo_expense.add_many(objs)
+    assert repo_expense.count() >= 10
+    assert repo_expense.exists()
+    assert repo_expense.count({'category': 81}) == 3
+    assert repo_expense.count({'category': In([80, 82]), 'amount': Lt(5)}) == 3
+    assert repo_expense.exists({'category': 82})
+    assert not repo_expense.exists({'category': 83})
+    with pytest.raises(ValueError):
+        repo_expense.exists({'unknown': 1})
+    repo_expense.delete_many(o.pk for o in objs)
+    assert repo_expense.count({'category': 81}) == 0
+
+def test_iter_all(repo_expense):
+    objs = [Expense(amount=float(i % 4), category=90 + i % 3,
+                    expense_date=f'2023-02-{1 + i % 5:02}') for i in range(20)]
+    repo_expense.add_many(objs)
+    mine = {'category': In([90, 91, 92])}
+    for order_by in [None, ['-expense_date', '-pk'], ['category', '-amount']]:
+        for batch_size in [1, 3, 50]:
+            assert list(repo_expense.iter_all(mine, order_by, batch_size)) == \
+                repo_expense.get_all(mine, order_by)
+    with pytest.raises(ValueError):
+        repo_expense.iter_all(mine, batch_size=0)
+    repo_expense.delete_many(o.pk for o in objs)
+
+def test_get_columns(repo_expense, repo_category):
+    objs = [Expense(amount=float(i), category=95 + i % 2, comment=f'g{i}') for i in range(6)]
+    repo_expense.add_many(objs)
+    assert repo_expense.get_columns(['pk', 'comment'], {'category': 96}, order_by='-pk') == [
+        (o.pk, o.comment) for o in reversed(objs) if o.category == 96]
+    cats = [Category(name='columns', parent=None), Category(name='columns', parent=1)]
+    repo_category.add_many(cats)
+    assert repo_category.get_columns(['parent'], {'name': 'columns'}) == [(None,), (1,)]
+    with pytest.raises(ValueError):
+        repo_expense.get_columns(['unknown'])
+    repo_expense.delete_many(o.pk for o in objs)
+    repo_category.delete_many(c.pk for c in cats)
+
+def test_update_missing_row(repo_category):
+    from pony.orm import ObjectNotFound
+    with pytest.raises(ObjectNotFound):
+        repo_category.update(Category(name='missing', pk=10 ** 6))
+
+def test_nullable_range_conditions(repo_category):
+    from bookkeeper.repository.memory_repository import MemoryRepository
+    cats = [Category(name='null_range', parent=None), Category(name='null_range', parent=1)]
+    repo_category.add_many(cats)
+    memory = MemoryRepository[Category]()
+    memory.add_many(Category(c.name, c.parent) for c in cats)
+    for where in [{'parent': Lt(5)}, {'parent': Between(-5000, 5)}, {'parent': None}]:
+        where = {**where, 'name': 'null_range'}
+        assert [c.parent for c in repo_category.get_all(where)] == \
+            [c.parent for c in memory.get_all(where)]
+        assert repo_category.count(where) == memory.count(where)
+    repo_category.delete_many(c.pk for c in cats)
+
+def test_reads_do_not_wait_for_other_sessions(repo_category):
+    import threading
+    from pony import orm
+    ctg = Category(name='session_read')
+    repo_category.add(ctg)
+    started, finished = threading.Event(), threading.Event()
+
+    def read_in_session():
+        with orm.db_session:
+            repo_category.get_all()
+            started.set()
+            finished.wait(2)
+
+    thread = threading.Thread(target=read_in_session)
+    thread.start()
+    started.wait(2)
+    assert repo_category.get_all({'name': 'session_read'}) == [ctg]
+    assert repo_category.count({'name': 'session_read'}) == 1
+    assert thread.is_alive()  # the session of the other thread is still open
+    finished.set()
+    thread.join()
+    repo_category.delete(ctg.pk)
+    assert repo_category.get(ctg.pk) is None
@@ -156,3 +156,24 @@ def test_edit_mcw(qtbot):
 
     window.edit_window.close()
 
+
+def test_add_remove_category_mcw(qtbot):
+    widget = MainCategoryWidget()
+    qtbot.addWidget(widget)
+    widget.set_data([['1', 'B'], ['2', 'D']])
+    widget.register_add_callback(lambda name: None)
+    widget.register_del_callback(lambda pk: None)
+    widget._on_clicked_edit_button()
+
+    widget.add_category(['3', 'C'])
+    assert widget.user_data == [['1', 'B'], ['3', 'C'], ['2', 'D']]
+    assert widget.edit_window.ctgs_lst == ['B', 'D', 'C']
+    assert widget.edit_window.ctg_lst_widget.count() == 3
+    assert widget.edit_window.del_input.count() == 3
+
+    widget.remove_category('1')
+    assert widget.user_data == [['3', 'C'], ['2', 'D']]
+    assert widget.edit_window.ctgs_lst == ['D', 'C']
+    assert widget.edit_window.ctg_lst_widget.item(0).text() == 'D'
+    assert widget.edit_window.del_input.itemText(1) == 'C'
+    widget.edit_window.close()
@@ -110,17 +110,64 @@ def test_table_mtg(qtbot):
 
     w.set_data(user_data)
 
-    assert w.table.columnCount() == 4
-    assert w.table.rowCount() == len(user_data)
+    assert w.model.columnCount() == 4
+    assert w.model.rowCount() == len(user_data)
 
     for row in range(len(user_data)):
         for col in range(4):
-            item = QtWidgets.QTableWidgetItem(w.table.item(row, col))
+            index = w.model.index(row, col)
 
-            assert item.text() == user_data[row][col+1]
+            assert index.data() == user_data[row][col+1]
 
-            assert item.flags() == (QtCore.Qt.ItemFlag.ItemIsSelectable |
-                                        QtCore.Qt.ItemFlag.ItemIsEnabled)
+            assert w.model.flags(index) == (QtCore.Qt.ItemFlag.ItemIsSelectable |
+                                            QtCore.Qt.ItemFlag.ItemIsEnabled)
+
+    w.close()
+
+def test_fetch_pages_mtg(qtbot):
+    all_rows = [[str(i), '01-01-2022', f'{i}.0', 'cat1', ''] for i in range(25)]
+    requests = []
+
+    def fetch(offset, limit):
+        requests.append((offset, limit))
+        return all_rows[offset:offset + limit]
+
+    w = MainTableWidget(None)
+    qtbot.addWidget(w)
+    w.model.page_size = 10
+    w.register_fetch_callback(fetch)
+
+    w.reload_data()
+    assert w.user_data == all_rows[:10]
+    assert w.model.canFetchMore()
+
+    while w.model.canFetchMore():
+        w.model.fetchMore()
+    assert w.user_data == all_rows
+    assert requests == [(0, 10), (10, 10), (20, 10)]
+
+    w.set_data(user_data)
+    assert not w.model.canFetchMore()
+
+    w.close()
+
+def test_row_changes_mtg(qtbot):
+    w = MainTableWidget(None)
+    qtbot.addWidget(w)
+    w.set_data([list(row) for row in user_data])
+
+    new_row = ['3', '03-01-2022', '10.0', 'cat1', '']
+    with qtbot.waitSignal(w.model.rowsInserted):
+        w.model.insert_row(1, new_row)
+    assert w.user_data == [user_data[0], new_row, user_data[1]]
+
+    with qtbot.waitSignal(w.model.dataChanged):
+        w.model.update_row(0, user_data[1])
+    assert w.model.index(0, 0).data() == user_data[1][1]
+
+    with qtbot.waitSignal(w.model.rowsRemoved):
+        w.model.remove_row(0)
+    assert w.user_data == [new_row, user_data[1]]
 
     w.close()
 
@@ -253,3 +300,43 @@ def test_del_callback_mtg(qtbot, monkeypatch):
 
     w.close()
 
+
+def test_sorted_row_changes_mtg(qtbot):
+    rows = [['5', '03-02-2022', '1.0', 'cat1', ''],
+            ['4', '01-02-2022', '1.0', 'cat1', ''],
+            ['3', '01-02-2022', '1.0', 'cat1', ''],
+            ['1', '31-12-2021', '1.0', 'cat1', '']]
+    w = MainTableWidget(None)
+    qtbot.addWidget(w)
+    w.set_data([list(row) for row in rows])
+
+    w.add_row(['6', '02-02-2022', '2.0', 'cat2', ''])
+    w.add_row(['7', '01-01-2023', '2.0', 'cat2', ''])
+    w.add_row(['2', '01-01-2020', '2.0', 'cat2', ''])
+    assert [row[0] for row in w.user_data] == ['7', '5', '6', '4', '3', '1', '2']
+
+    w.update_row(['4', '01-02-2022', '10.0', 'cat2', 'new'])
+    assert w.user_data[3] == ['4', '01-02-2022', '10.0', 'cat2', 'new']
+    w.update_row(['1', '01-03-2022', '1.0', 'cat1', ''])
+    assert [row[0] for row in w.user_data] == ['7', '1', '5', '6', '4', '3', '2']
+
+    w.remove_rows(['5', '2', '100'])
+    assert [row[0] for row in w.user_data] == ['7', '1', '6', '4', '3']
+
+    w.close()
+
+def test_add_row_after_loaded_mtg(qtbot):
+    all_rows = [[str(i), '01-01-2022', '1.0', 'cat1', ''] for i in range(20, 0, -1)]
+    w = MainTableWidget(None)
+    qtbot.addWidget(w)
+    w.model.page_size = 10
+    w.register_fetch_callback(lambda offset, limit: all_rows[offset:offset + limit])
+    w.reload_data()
+
+    # belongs to not loaded rows, comes with the next page
+    w.add_row(['0', '01-01-2021', '1.0', 'cat1', ''])
+    assert len(w.user_data) == 10
+    w.add_row(['21', '01-01-2022', '1.0', 'cat1', ''])
+    assert len(w.user_data) == 11 and w.user_data[0][0] == '21'
+
+    w.close()